@@ -0,0 +1,69 @@
+"""
+Admin accounts.
+
+Access to /api/admin/* comes from users.is_admin, which only this script
+changes. It needs database access, so only operators can run it; nothing a
+user can do through the API (such as registering a particular email
+address) makes them an admin. The account must already exist.
+
+    python admins.py list
+    python admins.py grant ops@example.com
+    python admins.py revoke ops@example.com
+"""
+import argparse
+import sys
+from typing import Callable, List
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+
+def set_admin(email: str, is_admin: bool, session_factory: Callable[[], Session] = SessionLocal) -> bool:
+    """Flag or unflag an existing account; False if there is no account with that email."""
+    db = session_factory()
+    try:
+        user = db.query(models.User).filter(models.User.email == email.strip()).first()
+        if user is None:
+            return False
+        user.is_admin = is_admin
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
+def list_admins(session_factory: Callable[[], Session] = SessionLocal) -> List[str]:
+    db = session_factory()
+    try:
+        return [e for (e,) in db.query(models.User.email).filter(models.User.is_admin.is_(True)).order_by(models.User.email)]
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="print the admin accounts")
+    for name, help_text in (("grant", "make an account an admin"), ("revoke", "remove an account's admin rights")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("email")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for email in list_admins():
+            print(email)
+        return 0
+    if not set_admin(args.email, args.command == "grant"):
+        print(f"No account with email {args.email}.")
+        return 1
+    print(f"{args.email} is {'now' if args.command == 'grant' else 'no longer'} an admin.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""
+Micro-benchmarks for the pure CPU-side helpers in main.py.
+
+Usage:
+    python benchmark.py                  # run everything, compare with bench_baseline.json
+    python benchmark.py --quick          # skip the largest corpus sizes
+    python benchmark.py --filter match   # only benchmarks whose name contains "match"
+    python benchmark.py --save-baseline  # store the current results as the new baseline
+    python benchmark.py --import-time    # cold-import report for main.py (startup cost)
+
+Each benchmark reports ops/s (one op = one call of the function on the given
+input) and the peak memory allocated during a single call. When a baseline is
+present, any benchmark whose ops/s dropped or whose peak allocation grew by more
+than --threshold is flagged and the script exits with status 1.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import catalog
+from main import (
+    Question,
+    match_topics_from_text,
+    distribute_topics,
+    dedupe_questions,
+    _mcq_options_fingerprint,
+    fallback_questions,
+    _strip_code_fences,
+    extract_text_from_pdf_bytes,
+    extract_topics_from_pdf,
+)
+
+_CATALOG = catalog.current()
+ALL_TOPICS = _CATALOG.all_topics
+_ALIASES = _CATALOG.aliases
+
+# Free-text subjects as users type them: exact, respelled, versioned, misspelled, unknown.
+SUBJECT_SAMPLES = [
+    "React", "kubernets", "postgress", "next js 14", "Nextjs", "tailwind css", "k8s", "graphQL",
+    "terraform 1.6", "promethius", "Elixir", "machine learning", "micro services", "rabit mq",
+]
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+DOC_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+QUESTION_COUNTS = [10, 100, 1_000, 10_000]
+PDF_PAGE_COUNTS = [1, 10, 50]
+
+QUICK_MAX_DOC = 100_000
+QUICK_MAX_QUESTIONS = 1_000
+QUICK_MAX_PAGES = 10
+
+_FILLER = (
+    "the team service request latency incident review owner deploy release customer "
+    "budget quarter policy handbook onboarding process reliability engineer platform "
+    "roadmap backlog sprint meeting stakeholder document guideline access account"
+).split()
+
+
+# -----------------------------
+# Corpus generation
+# -----------------------------
+def make_document(size: int, seed: int = 0) -> str:
+    """Synthetic handbook text: mostly filler with catalog topics and aliases sprinkled in."""
+    rng = random.Random(seed)
+    vocab = _FILLER * 6 + list(ALL_TOPICS) + list(_ALIASES.keys())
+    words: List[str] = []
+    length = 0
+    while length < size:
+        w = rng.choice(vocab)
+        words.append(w)
+        length += len(w) + 1
+        if rng.random() < 0.08:
+            words.append(".\n")
+    return " ".join(words)[:size]
+
+
+def make_questions(n: int, seed: int = 0, dup_ratio: float = 0.1) -> List[Question]:
+    rng = random.Random(seed)
+    out: List[Question] = []
+    for i in range(n):
+        j = rng.randrange(max(1, i)) if i and rng.random() < dup_ratio else i
+        topic = ALL_TOPICS[j % len(ALL_TOPICS)]
+        out.append(Question(
+            type="MCQ",
+            scenario=f"(Topic: {topic}) Scenario #{j}: the {topic} rollout is failing under load. What should you do?",
+            options=[f"Option {j} A", f"Option {j}  B ", f"option {j} c", f"Option {j} D"],
+            correctIndex=j % 4,
+            hint="Think about it.",
+            reason="Because.",
+        ))
+    return out
+
+
+def make_llm_response(questions: List[Question]) -> str:
+    body = json.dumps([q.model_dump(exclude_none=True) for q in questions], indent=2)
+    return "```json\n" + body + "\n```"
+
+
+def _pdf_bytes(objects: List[bytes]) -> bytes:
+    """Assemble numbered PDF objects (1-based, object 1 is the catalog) with a valid xref table."""
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def make_pdf(pages: int, with_text: bool = True, seed: int = 0) -> bytes:
+    """
+    Minimal multi-page PDF. With a text layer each page carries ~2 KB of handbook text;
+    without one each page is a single grey image, like a scanned document.
+    """
+    # 1 = catalog, 2 = pages, 3 = font, then (page, content[, image]) per page
+    per_page = 2 if with_text else 3
+    kids = [4 + i * per_page for i in range(pages)]
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) + b"] /Count %d >>" % pages,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i in range(pages):
+        page_no = kids[i]
+        if with_text:
+            lines = make_document(2_000, seed=seed + i).replace("(", "").replace(")", "").replace("\\", "").split("\n")
+            ops = [b"BT /F1 10 Tf 12 TL 40 800 Td"]
+            ops += [b"(" + ln.strip().encode("latin-1", "ignore") + b") '" for ln in lines]
+            ops.append(b"ET")
+            stream = b"\n".join(ops)
+            resources = b"<< /Font << /F1 3 0 R >> >>"
+        else:
+            w, h = 200, 280
+            img = zlib.compress(bytes([200]) * (w * h))
+            objects_img = (
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n" % (w, h, len(img))
+                + img + b"\nendstream"
+            )
+            stream = b"q 595 0 0 842 0 0 cm /Im0 Do Q"
+            resources = b"<< /XObject << /Im0 %d 0 R >> >>" % (page_no + 2)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources " + resources
+            + b" /Contents %d 0 R >>" % (page_no + 1)
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        if not with_text:
+            objects.append(objects_img)
+    return _pdf_bytes(objects)
+
+
+# -----------------------------
+# Harness
+# -----------------------------
+def _measure(fn: Callable[[], Any], min_time: float) -> Tuple[float, int]:
+    """Return (ops/s, peak bytes allocated by one call)."""
+    # The helpers print diagnostics (e.g. missing OCR libraries); keep them out of the report.
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _measure_quiet(fn, min_time)
+
+
+def _measure_quiet(fn: Callable[[], Any], min_time: float) -> Tuple[float, int]:
+    fn()  # warm-up (regex cache, lazy imports)
+
+    gc.collect()
+    runs = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time or runs < 3:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+    ops = runs / elapsed
+
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ops, max(0, peak - base)
+
+
+def build_benchmarks(quick: bool) -> List[Tuple[str, Callable[[], Any]]]:
+    doc_sizes = [s for s in DOC_SIZES if not quick or s <= QUICK_MAX_DOC]
+    q_counts = [n for n in QUESTION_COUNTS if not quick or n <= QUICK_MAX_QUESTIONS]
+    page_counts = [p for p in PDF_PAGE_COUNTS if not quick or p <= QUICK_MAX_PAGES]
+
+    benches: List[Tuple[str, Callable[[], Any]]] = []
+
+    for size in doc_sizes:
+        doc = make_document(size, seed=size)
+        benches.append((f"match_topics_from_text[{_fmt_size(size)}]", lambda d=doc: match_topics_from_text(d)))
+
+    def canonicalize_cold() -> List[Any]:
+        _CATALOG._canonical_cache.clear()
+        return [_CATALOG.canonicalize(s) for s in SUBJECT_SAMPLES]
+
+    benches.append((f"canonicalize[{len(SUBJECT_SAMPLES)},cold]", canonicalize_cold))
+
+    subjects = ALL_TOPICS[:12]
+    for n in q_counts:
+        benches.append((f"distribute_topics[{n}]", lambda n=n: distribute_topics(subjects, n)))
+        benches.append((f"distribute_topics_grouped[{n}]", lambda n=n: distribute_topics(ALL_TOPICS, max(1, n // 100))))
+
+    for n in q_counts:
+        qs = make_questions(n, seed=n)
+        raw = make_llm_response(qs)
+        benches.append((f"dedupe_questions[{n}]", lambda qs=qs: dedupe_questions(qs)))
+        benches.append((f"_mcq_options_fingerprint[{n}]", lambda qs=qs: [_mcq_options_fingerprint(q) for q in qs]))
+        benches.append((f"fallback_questions[{n}]", lambda n=n: fallback_questions(subjects, n)))
+        benches.append((f"fallback_questions_coding[{n}]", lambda n=n: fallback_questions(subjects, n, "Coding")))
+        benches.append((f"_strip_code_fences[{n}]", lambda raw=raw: _strip_code_fences(raw)))
+
+    for pages in page_counts:
+        for with_text in (True, False):
+            pdf = make_pdf(pages, with_text=with_text, seed=pages)
+            label = "text" if with_text else "scanned"
+            benches.append((f"extract_text_from_pdf_bytes[{label},{pages}p]", lambda b=pdf: extract_text_from_pdf_bytes(b)))
+            if with_text:
+                benches.append((f"extract_topics_from_pdf[{pages}p]", lambda b=pdf: extract_topics_from_pdf(b)))
+
+    return benches
+
+
+def _fmt_size(n: int) -> str:
+    for unit, div in (("MB", 1_000_000), ("KB", 1_000)):
+        if n >= div:
+            return f"{n // div}{unit}"
+    return f"{n}B"
+
+
+def import_time_report(runs: int = 5, top: int = 12) -> None:
+    """Cold-import main.py in fresh interpreters and show where the startup time goes."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    snippet = "import time; t = time.perf_counter(); import main; print((time.perf_counter() - t) * 1000)"
+    walls: List[float] = []
+    cumulative: Dict[str, List[int]] = {}
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", snippet],
+            cwd=here, capture_output=True, text=True, check=True,
+        )
+        walls.append(float(proc.stdout.strip().splitlines()[-1]))
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cum, name = line.split("|", 2)
+            name = name.strip()
+            if cum.strip().isdigit() and "." not in name:
+                cumulative.setdefault(name, []).append(int(cum))
+
+    print(f"import main: median {statistics.median(walls):.0f} ms over {runs} runs "
+          f"(min {min(walls):.0f} ms, max {max(walls):.0f} ms)\n")
+    print(f"{'top-level module':<32} {'cumulative ms':>14}")
+    print("-" * 47)
+    ranked = sorted(cumulative.items(), key=lambda kv: statistics.median(kv[1]), reverse=True)
+    for name, values in ranked[:top]:
+        print(f"{name:<32} {statistics.median(values) / 1000:>14.1f}")
+    heavy = [m for m in ("groq", "pdfminer", "PyPDF2", "fitz", "pdfplumber", "pytesseract", "PIL") if m in cumulative]
+    print(f"\nLazy dependencies loaded at import: {', '.join(heavy) if heavy else 'none'}")
+
+
+def load_baseline(path: str) -> Dict[str, Dict[str, float]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(name: str, ops: float, peak: int, baseline: Dict[str, Dict[str, float]], threshold: float) -> Optional[str]:
+    ref = baseline.get(name)
+    if not ref:
+        return None
+    problems = []
+    if ref.get("ops_per_sec") and ops < ref["ops_per_sec"] * (1 - threshold):
+        problems.append(f"ops/s {ref['ops_per_sec']:.1f} -> {ops:.1f}")
+    if ref.get("peak_bytes") and peak > ref["peak_bytes"] * (1 + threshold) and peak - ref["peak_bytes"] > 4096:
+        problems.append(f"peak {ref['peak_bytes'] / 1024:.1f}KiB -> {peak / 1024:.1f}KiB")
+    return "; ".join(problems) or None
+
+
+def main_cli(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="skip 1MB+ documents, 10k question lists and 50-page PDFs")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to spend timing each benchmark")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="write results to the baseline file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown/growth flagged as regression")
+    parser.add_argument("--import-time", action="store_true", help="report cold-import time of main.py and exit")
+    args = parser.parse_args(argv)
+
+    if args.import_time:
+        import_time_report()
+        return 0
+
+    baseline = {} if args.save_baseline else load_baseline(args.baseline)
+    results: Dict[str, Dict[str, float]] = {}
+    regressions: List[Tuple[str, str]] = []
+
+    random.seed(0)
+    print(f"{'benchmark':<52} {'ops/s':>12} {'peak alloc':>12}")
+    print("-" * 78)
+    for name, fn in build_benchmarks(args.quick):
+        if args.filter and args.filter not in name:
+            continue
+        ops, peak = _measure(fn, args.min_time)
+        results[name] = {"ops_per_sec": ops, "peak_bytes": peak}
+        problem = compare(name, ops, peak, baseline, args.threshold)
+        flag = "  REGRESSION" if problem else ""
+        print(f"{name:<52} {ops:>12.1f} {peak / 1024:>10.1f}KiB{flag}")
+        if problem:
+            regressions.append((name, problem))
+
+    if args.save_baseline:
+        existing = load_baseline(args.baseline)
+        existing.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(existing, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+    elif not baseline:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+        for name, problem in regressions:
+            print(f"  {name}: {problem}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
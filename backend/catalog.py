@@ -0,0 +1,250 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Pattern, Tuple
+
+# -----------------------------
+# Topic catalog
+#
+# Categories, topics, aliases and spellings live in catalog.json (topics must
+# match the frontend SUBJECTS exactly). Aliases map related terms onto the
+# topic they're filed under ("machine learning" -> "Model Training") for
+# matching PDFs and picking fallback categories; spellings are only other ways
+# of writing a topic's own name ("nextjs", "k8s") and are all that free-text
+# subjects are canonicalised through, so a subject is never swapped for a
+# different one. The file is loaded into an immutable snapshot with everything
+# derived from it precomputed: the topic matcher's patterns, the topic ->
+# category map and a fuzzy index over topics and spellings, and the
+# /api/catalog body, serialised and compressed once. current()
+# reloads the snapshot when the file's mtime changes, so edits go live without
+# a restart; a broken file keeps the previous snapshot.
+# -----------------------------
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog.json"))
+CATALOG_CHECK_SECONDS = float(os.getenv("CATALOG_CHECK_SECONDS", "2"))
+
+# Fuzzy matches must share at least this share of the query's trigrams with a key.
+MIN_TRIGRAM_OVERLAP = 0.3
+FUZZY_CANDIDATES = 8
+CANONICAL_CACHE_SIZE = 4096
+
+_WS = re.compile(r"\s+")
+# Standalone version numbers: "next js 14", "python 3.12", "vue v3".
+_VERSION = re.compile(r"(?<!\S)v?\d+(?:\.\d+)*x?(?!\S)")
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def _normalize(subject: str) -> str:
+    return _WS.sub(" ", _VERSION.sub(" ", subject.lower())).strip()
+
+
+def _compact(key: str) -> str:
+    """'Next.js', 'next js' and 'nextjs' all compact to 'nextjs'."""
+    return _NON_ALNUM.sub("", key)
+
+
+def _trigrams(key: str) -> List[str]:
+    padded = f"^{key}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def _max_edits(key: str) -> int:
+    if len(key) <= 4:
+        return 0
+    if len(key) <= 8:
+        return 1
+    return 2
+
+
+def _brotli(data: bytes) -> Optional[bytes]:
+    try:
+        import brotli  # type: ignore
+    except ImportError:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, or limit + 1 as soon as it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return min(prev[-1], limit + 1)
+
+
+class Catalog:
+    """One immutable load of catalog.json."""
+
+    def __init__(
+        self,
+        categories: Dict[str, List[str]],
+        aliases: Dict[str, str],
+        mtime: float = 0.0,
+        spellings: Optional[Dict[str, str]] = None,
+    ):
+        self.categories = categories
+        self.aliases = aliases
+        self.spellings = spellings or {}
+        self.mtime = mtime
+        self.all_topics: List[str] = sorted({t for items in categories.values() for t in items})
+        self.topic_set = frozenset(self.all_topics)
+        self.topics_json = json.dumps(self.all_topics)
+        self.topic_category: Dict[str, str] = {t: cat for cat, items in categories.items() for t in items}
+        self.max_term_len = max(len(t) for t in [*self.all_topics, *aliases])
+
+        # Topic matcher: longer terms are substring checks; short ones ("Go", "ts", "k8s")
+        # need word boundaries. Each is its own precompiled search, which stops at the
+        # first hit and so beats one alternation scanned over the whole text.
+        self.substring_terms: List[Tuple[str, str]] = []
+        self.boundary_terms: List[Tuple[Pattern[str], str]] = []
+        for term, topic in [*((t, t) for t in self.all_topics), *aliases.items()]:
+            if len(term) <= 3:
+                self.boundary_terms.append((re.compile(r"\b" + re.escape(term.lower()) + r"\b"), topic))
+            else:
+                self.substring_terms.append((term.lower(), topic))
+
+        # Subject index: exact lookups on normalised and compacted keys, then a
+        # trigram inverted index over compacted keys for typo-tolerant matches.
+        self._exact: Dict[str, str] = {}
+        for key, canonical in [*((t, t) for t in self.all_topics), *self.spellings.items()]:
+            norm = _normalize(key)
+            self._exact.setdefault(norm, canonical)
+            self._exact.setdefault(_compact(norm), canonical)
+        self._keys: List[Tuple[str, str]] = sorted({(k, c) for k, c in self._exact.items() if k == _compact(k)})
+        self._postings: Dict[str, List[int]] = {}
+        for i, (key, _) in enumerate(self._keys):
+            for g in set(_trigrams(key)):
+                self._postings.setdefault(g, []).append(i)
+        self._canonical_cache: Dict[str, Optional[str]] = {}
+
+        # /api/catalog: the same shape as the frontend's SUBJECTS, plus aliases. The
+        # version is a digest of the content, so it only changes when the catalog does.
+        content = {"categories": [{"name": n, "items": items} for n, items in categories.items()], "aliases": aliases}
+        self.version = hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()[:20]
+        body = json.dumps({"version": self.version, **content}, separators=(",", ":"), ensure_ascii=False).encode()
+        self.encoded: Dict[str, bytes] = {"identity": body, "gzip": gzip.compress(body, 9, mtime=0)}
+        br = _brotli(body)
+        if br is not None:
+            self.encoded["br"] = br
+
+    @classmethod
+    def load(cls, path: str = CATALOG_PATH) -> "Catalog":
+        mtime = os.stat(path).st_mtime
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        categories = data.get("categories")
+        aliases = data.get("aliases") or {}
+        spellings = data.get("spellings") or {}
+        if not isinstance(categories, dict) or not categories:
+            raise ValueError(f"{path}: 'categories' must be a non-empty object")
+        for kind, table in (("alias", aliases), ("spelling", spellings)):
+            for alias, canonical in table.items():
+                if not any(canonical in items for items in categories.values()):
+                    raise ValueError(f"{path}: {kind} {alias!r} points at unknown topic {canonical!r}")
+        return cls(
+            categories,
+            {k.lower(): v for k, v in aliases.items()},
+            mtime,
+            {k.lower(): v for k, v in spellings.items()},
+        )
+
+    def match_topics(self, text: str) -> List[str]:
+        text_lower = text.lower()
+        matched = {topic for term, topic in self.substring_terms if term in text_lower}
+        matched.update(
+            topic for pattern, topic in self.boundary_terms
+            if topic not in matched and pattern.search(text_lower)
+        )
+        return sorted(matched)
+
+    def canonicalize(self, subject: str) -> Optional[str]:
+        """
+        Map a free-text subject onto the catalog topic it spells, or None if nothing is close.
+
+        Tries, in order: the normalised text (version numbers dropped), its
+        compacted form, then the nearest compacted key within a small edit
+        distance among the keys sharing the most trigrams with it. Keys of
+        four characters or fewer only match exactly.
+        """
+        cached = self._canonical_cache.get(subject)
+        if cached is not None or subject in self._canonical_cache:
+            return cached
+
+        norm = _normalize(subject)
+        key = _compact(norm)
+        result = self._exact.get(norm) or self._exact.get(key)
+        if result is None and key:
+            result = self._fuzzy(key)
+
+        if len(self._canonical_cache) >= CANONICAL_CACHE_SIZE:
+            self._canonical_cache.clear()
+        self._canonical_cache[subject] = result
+        return result
+
+    def _fuzzy(self, key: str) -> Optional[str]:
+        limit = _max_edits(key)
+        if limit == 0:
+            return None
+        grams = set(_trigrams(key))
+        hits = Counter(i for g in grams for i in self._postings.get(g, ()))
+        min_shared = max(1, int(len(grams) * MIN_TRIGRAM_OVERLAP))
+        best: Optional[Tuple[int, int, str]] = None
+        for i, shared in hits.most_common(FUZZY_CANDIDATES):
+            if shared < min_shared:
+                break
+            candidate, canonical = self._keys[i]
+            # Typos rarely hit the first letter; requiring it keeps "nesting" away from "testing".
+            if candidate[0] != key[0]:
+                continue
+            d = edit_distance(key, candidate, limit)
+            if d <= limit and (best is None or (d, -shared) < best[:2]):
+                best = (d, -shared, canonical)
+        return best[2] if best else None
+
+
+_current: Optional[Catalog] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def current() -> Catalog:
+    """The live catalog snapshot, reloaded if catalog.json changed (checked every CATALOG_CHECK_SECONDS)."""
+    global _current, _checked_at
+    now = time.monotonic()
+    snapshot = _current
+    if snapshot is not None and now - _checked_at < CATALOG_CHECK_SECONDS:
+        return snapshot
+    with _lock:
+        if _current is not None and now - _checked_at < CATALOG_CHECK_SECONDS:
+            return _current
+        _checked_at = now
+        try:
+            if _current is None or os.stat(CATALOG_PATH).st_mtime != _current.mtime:
+                _current = Catalog.load(CATALOG_PATH)
+        except (OSError, ValueError) as e:
+            if _current is None:
+                raise
+            print(f"Catalog reload failed, keeping the previous version: {e}")
+        return _current
+
+
+def canonicalize_subjects(subjects: List[str]) -> List[str]:
+    """Catalog spelling of known subjects, trimmed originals for the rest, without duplicates."""
+    snapshot = current()
+    out: Dict[str, None] = {}
+    for s in subjects:
+        s = (s or "").strip()
+        if s:
+            out[snapshot.canonicalize(s) or s] = None
+    return list(out)
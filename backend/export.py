@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Query, Session
+
+import models
+from database import SessionLocal
+
+# -----------------------------
+# Bulk exports
+#
+# Exports stream from a server-side cursor (stream_results + yield_per) in
+# EXPORT_BATCH_ROWS batches. Each batch is encoded into one NDJSON or CSV
+# chunk, so memory stays at one batch however many rows match. Generators open
+# their own session: the request's session is closed before the body streams.
+# -----------------------------
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "2000"))
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+ACTIVITY_FIELDS = ["id", "user_id", "email", "full_name", "exp", "topic", "title", "status", "timestamp", "archived"]
+USER_FIELDS = ["id", "email", "full_name", "exp", "created_at"]
+
+
+def _value(v: Any) -> Any:
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
+def _encode(rows: List[Sequence[Any]], fields: List[str], fmt: str) -> str:
+    if fmt == "csv":
+        buf = io.StringIO()
+        csv.writer(buf).writerows([[_value(v) for v in row] for row in rows])
+        return buf.getvalue()
+    return "".join(json.dumps(dict(zip(fields, map(_value, row))), ensure_ascii=False) + "\n" for row in rows)
+
+
+# Each query comes with constant values appended to every row it yields.
+Queries = Callable[[Session], List[Tuple[Query, Tuple[Any, ...]]]]
+
+
+def _stream(queries: Queries, fields: List[str], fmt: str) -> Iterator[str]:
+    if fmt == "csv":
+        buf = io.StringIO()
+        csv.writer(buf).writerow(fields)
+        yield buf.getvalue()
+    db = SessionLocal()
+    try:
+        for query, extra in queries(db):
+            batch: List[Sequence[Any]] = []
+            for row in query.execution_options(stream_results=True, yield_per=EXPORT_BATCH_ROWS):
+                batch.append((*row, *extra))
+                if len(batch) >= EXPORT_BATCH_ROWS:
+                    yield _encode(batch, fields, fmt)
+                    batch = []
+            if batch:
+                yield _encode(batch, fields, fmt)
+    finally:
+        db.close()
+
+
+def activities(
+    fmt: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    topic: Optional[str] = None,
+    status: Optional[str] = None,
+    include_archive: bool = False,
+) -> Iterator[str]:
+    """Activities with their user's email, name and EXP, oldest first; `end` is exclusive."""
+
+    def queries(db: Session) -> List[Tuple[Query, Tuple[Any, ...]]]:
+        tables = [models.UserActivityArchive, models.UserActivity] if include_archive else [models.UserActivity]
+        out = []
+        for table in tables:
+            q = db.query(
+                table.id, table.user_id, models.User.email, models.User.full_name, models.User.exp,
+                table.topic, table.title, table.status, table.timestamp,
+            ).join(models.User, models.User.id == table.user_id)
+            if start is not None:
+                q = q.filter(table.timestamp >= start)
+            if end is not None:
+                q = q.filter(table.timestamp < end)
+            if topic:
+                q = q.filter(table.topic == topic)
+            if status:
+                q = q.filter(table.status == status)
+            out.append((q.order_by(table.id), (table is models.UserActivityArchive,)))
+        return out
+
+    return _stream(queries, ACTIVITY_FIELDS, fmt)
+
+
+def users(fmt: str) -> Iterator[str]:
+    """Every user's EXP, in id order."""
+    return _stream(
+        lambda db: [(db.query(
+            models.User.id, models.User.email, models.User.full_name, models.User.exp, models.User.created_at
+        ).order_by(models.User.id), ())],
+        USER_FIELDS,
+        fmt,
+    )
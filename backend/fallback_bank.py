@@ -0,0 +1,251 @@
+from typing import Dict, List
+
+# -----------------------------
+# Offline question bank used when the LLM is unavailable.
+#
+# Organised by CATALOG category. Every template is a generic "which practice"
+# stem so it pairs sensibly with any option set of the same category; option
+# sets always list the correct answer first (it is shuffled at build time).
+# "General" is used for topics outside the catalog and as overflow once a
+# category's (template, option set) pairs are exhausted.
+# -----------------------------
+FALLBACK_BANK: Dict[str, Dict[str, List]] = {
+    "Frontend": {
+        "templates": [
+            "(Topic: {topic}) Users report the {topic} part of the UI feels sluggish on mid-range phones. Which change should you make first?",
+            "(Topic: {topic}) A code review flags the way {topic} is used across several pages. Which practice should the team adopt?",
+            "(Topic: {topic}) After a release touching {topic}, Core Web Vitals dropped. What is the most appropriate fix?",
+            "(Topic: {topic}) You are writing the frontend guidelines section on {topic}. Which recommendation belongs there?",
+            "(Topic: {topic}) A junior developer's {topic} change causes intermittent UI bugs. What should they do instead?",
+            "(Topic: {topic}) The design system team wants {topic} to scale across many product squads. Which approach fits best?",
+            "(Topic: {topic}) A bug bash uncovered inconsistent behaviour in {topic} between browsers. How should you address it?",
+            "(Topic: {topic}) You are migrating a legacy page to modern {topic} patterns. Which step is most important?",
+            "(Topic: {topic}) The bundle analyzer shows {topic}-related code dominating the initial load. What do you do?",
+            "(Topic: {topic}) Accessibility audits keep failing around {topic}. Which change best resolves it?",
+        ],
+        "options": [
+            ["Profile re-renders and memoize only the hot components", "Wrap every component in React.memo", "Move all state into a single global store", "Disable React strict mode"],
+            ["Lazy-load the route with dynamic import and a suspense fallback", "Inline every dependency into the main bundle", "Ship both ESM and CommonJS builds to all browsers", "Increase the CDN cache TTL to fix parse time"],
+            ["Colocate state with the components that use it", "Lift all state to the root component", "Store UI state in localStorage on every keystroke", "Use global variables on window"],
+            ["Use semantic HTML elements and proper ARIA labels", "Replace buttons with clickable divs", "Hide focus outlines globally", "Rely on colour alone to convey state"],
+            ["Derive values during render instead of syncing them with effects", "Add a useEffect for every prop change", "Call setState inside render", "Mutate state objects in place"],
+            ["Add stable keys based on item identity to list rendering", "Use the array index as key everywhere", "Use Math.random() as the key", "Omit keys to silence the warning"],
+            ["Test behaviour through the rendered UI with Testing Library queries", "Snapshot every component and never review diffs", "Test private implementation details", "Skip tests for UI code"],
+            ["Serve responsive images with explicit width and height", "Load full-resolution images and scale with CSS", "Convert all images to base64 inline strings", "Disable image caching"],
+            ["Cache server state with a query library and invalidate on mutation", "Refetch everything on every render", "Copy server data into Redux and never refresh it", "Poll every API every second"],
+            ["Use design tokens and shared components for consistent styling", "Copy-paste styles between components", "Use !important to resolve conflicts", "Inline styles for every element"],
+            ["Debounce expensive handlers and use passive event listeners", "Attach a new listener on every render", "Do layout reads and writes in the same loop", "Block the main thread with synchronous XHR"],
+            ["Stream server-rendered HTML and hydrate interactive islands", "Render everything client-side behind a spinner", "Hydrate the whole page twice to be safe", "Disable JavaScript for faster loads"],
+        ],
+    },
+    "Backend": {
+        "templates": [
+            "(Topic: {topic}) The {topic} service starts timing out under peak traffic. What is the most appropriate first step?",
+            "(Topic: {topic}) A postmortem about {topic} identified a systemic weakness. Which practice should be adopted?",
+            "(Topic: {topic}) You are reviewing a pull request that changes {topic}. Which pattern should you ask for?",
+            "(Topic: {topic}) Clients retry requests against {topic} and occasionally create duplicates. How do you fix it?",
+            "(Topic: {topic}) The on-call engineer cannot tell why {topic} is slow in production. What should the team add?",
+            "(Topic: {topic}) A new partner integration will triple the load on {topic}. Which design choice helps most?",
+            "(Topic: {topic}) Data inconsistencies appear after failures in {topic}. What is the best remedy?",
+            "(Topic: {topic}) You are documenting backend best practices for {topic}. Which recommendation belongs in it?",
+            "(Topic: {topic}) Latency of {topic} regressed after the last deploy. What should you do?",
+            "(Topic: {topic}) Security review flagged how {topic} handles requests. Which change is most appropriate?",
+        ],
+        "options": [
+            ["Add proper indexes and reduce lock scope", "Remove all transactions", "Increase the connection pool to 10000", "Switch to a NoSQL database blindly"],
+            ["Require idempotency keys for retried writes", "Retry writes without any deduplication", "Disable client retries entirely", "Return 200 before persisting"],
+            ["Introduce circuit breakers with timeouts and fallbacks", "Retry downstream calls forever", "Remove timeouts so calls eventually succeed", "Restart the service on every error"],
+            ["Add structured logs, metrics and distributed traces", "Log full request bodies at debug level in production", "Rely on users to report errors", "Print stack traces to stdout only"],
+            ["Cache hot reads with explicit TTL and invalidation", "Cache every response forever", "Disable caching to keep data fresh", "Cache per-user data under a shared key"],
+            ["Use cursor-based pagination for large result sets", "Return all rows in one response", "Use OFFSET with very large page numbers", "Let clients download the table export"],
+            ["Move slow work to a queue processed by background workers", "Do all work synchronously in the request", "Spawn a thread per request without limits", "Increase the HTTP timeout to ten minutes"],
+            ["Run backwards-compatible schema migrations in small steps", "Drop and recreate tables during deploys", "Edit production schemas manually", "Skip migrations and patch data by hand"],
+            ["Validate and authorise every request at the API boundary", "Trust client-supplied user IDs", "Validate only in the frontend", "Disable auth for internal endpoints"],
+            ["Apply per-client rate limits with clear 429 responses", "Let every client send unlimited requests", "Block all traffic during spikes", "Silently drop random requests"],
+            ["Use the outbox pattern to publish events reliably", "Publish events before committing the transaction", "Publish events from a cron job scraping tables", "Ignore failed event publishes"],
+            ["Version the API and deprecate fields gradually", "Change response shapes without notice", "Create a new endpoint for every client", "Remove old fields immediately"],
+        ],
+    },
+    "DevOps": {
+        "templates": [
+            "(Topic: {topic}) Pods running {topic} workloads restart repeatedly after a deploy. What should you check first?",
+            "(Topic: {topic}) Your platform team wants to standardise {topic} across environments. Which practice fits best?",
+            "(Topic: {topic}) A failed rollout involving {topic} caused downtime. What would have prevented it?",
+            "(Topic: {topic}) The cloud bill spiked after enabling {topic}. Which action is most appropriate?",
+            "(Topic: {topic}) An auditor asks how {topic} configuration changes are controlled. What should you implement?",
+            "(Topic: {topic}) Builds and deploys using {topic} are slow and flaky. What do you improve first?",
+            "(Topic: {topic}) A new service must be onboarded onto {topic}. Which recommendation do you give?",
+            "(Topic: {topic}) Incident responders lack visibility into {topic}. What should be added?",
+            "(Topic: {topic}) Secrets used by {topic} were found in a repository. What is the right remediation?",
+            "(Topic: {topic}) Traffic to {topic} is expected to grow tenfold. How should the platform prepare?",
+        ],
+        "options": [
+            ["Check resource limits, requests and liveness probes", "Delete and recreate the cluster", "Ignore pod restarts", "Disable autoscaling"],
+            ["Manage infrastructure as code with reviewed pull requests", "Click through the cloud console for each change", "Let each engineer keep their own scripts", "Apply changes directly in production first"],
+            ["Roll out gradually with canaries and automatic rollback", "Deploy to all instances at once", "Skip staging to save time", "Roll back only after customer complaints"],
+            ["Set autoscaling on meaningful metrics with sane bounds", "Run at maximum capacity permanently", "Scale manually during incidents", "Autoscale on disk usage only"],
+            ["Store secrets in a secret manager and rotate them", "Commit secrets to the repository encrypted with base64", "Bake secrets into container images", "Share secrets over chat"],
+            ["Cache dependencies and parallelise pipeline stages", "Remove tests from the pipeline", "Run the whole pipeline on a laptop", "Rebuild every dependency from source each time"],
+            ["Alert on user-facing SLOs backed by dashboards", "Alert on every CPU spike", "Disable alerts outside business hours", "Check dashboards once a week"],
+            ["Use least-privilege RBAC roles per service account", "Grant cluster-admin to all workloads", "Share one service account across teams", "Disable RBAC for simplicity"],
+            ["Right-size resources and use spot capacity for batch jobs", "Provision the largest instances for everything", "Turn off monitoring to save cost", "Delete backups to save storage"],
+            ["Pin image versions and scan them for vulnerabilities", "Always deploy the latest tag", "Use unverified public images", "Disable image pull policies"],
+            ["Use readiness probes and connection draining during deploys", "Kill pods immediately on deploy", "Route traffic to pods before they start", "Disable health checks to speed rollouts"],
+            ["Keep environment config in versioned ConfigMaps", "Hard-code configuration in the image", "Edit config inside running containers", "Use different config formats per environment"],
+        ],
+    },
+    "System Design": {
+        "templates": [
+            "(Topic: {topic}) Your system must handle 10x more users next quarter, and {topic} is a concern. Which design choice is best?",
+            "(Topic: {topic}) An architecture review questions the {topic} strategy. Which approach should you defend?",
+            "(Topic: {topic}) A regional outage exposed weaknesses in {topic}. What change improves resilience most?",
+            "(Topic: {topic}) Reads vastly outnumber writes in a service relying on {topic}. Which design helps?",
+            "(Topic: {topic}) A single hot key is overwhelming part of the system related to {topic}. What should you do?",
+            "(Topic: {topic}) Stakeholders ask for stronger guarantees around {topic}. Which trade-off is most appropriate?",
+            "(Topic: {topic}) You are designing {topic} for a global audience. Which principle should guide you?",
+            "(Topic: {topic}) Downstream services are overwhelmed whenever {topic} is under load. How do you fix it?",
+            "(Topic: {topic}) In a design interview you are asked about {topic}. Which answer shows the best judgement?",
+            "(Topic: {topic}) Data loss occurred during a failover involving {topic}. What should change?",
+        ],
+        "options": [
+            ["Partition data by a high-cardinality key and rebalance shards", "Keep everything on one larger server", "Shard by timestamp only", "Shard randomly per request"],
+            ["Add read replicas and route reads accordingly", "Send all reads to the primary", "Disable writes during peak hours", "Duplicate the database per user"],
+            ["Apply backpressure and bounded queues between services", "Buffer unlimited requests in memory", "Drop the slowest service", "Retry immediately without limits"],
+            ["Replicate across zones with automated, tested failover", "Rely on one availability zone", "Fail over manually after paging everyone", "Take nightly backups only"],
+            ["Put a CDN and cache in front of static and hot content", "Serve all assets from the origin", "Disable caching for consistency", "Cache only on client devices"],
+            ["Choose the consistency model per use case and document it", "Require strong consistency for every operation", "Ignore consistency entirely", "Let each client pick at random"],
+            ["Split hot keys and add request coalescing", "Increase timeouts for the hot key", "Block users requesting the hot key", "Store the hot key on disk only"],
+            ["Use leader election with leases and fencing tokens", "Let every node act as leader", "Pick the leader by hostname order", "Restart nodes until one wins"],
+            ["Use event sourcing where an audit trail of changes is required", "Overwrite state without history", "Store events in log files only", "Replay events manually when needed"],
+            ["Design idempotent operations so retries are safe", "Assume the network never fails", "Disable retries everywhere", "Deduplicate in the UI only"],
+            ["Separate read and write models where their scaling needs differ", "Use one model for every query shape", "Denormalise everything into one table", "Add joins across every service"],
+            ["Route users to the nearest healthy region", "Send all traffic through one region", "Pick regions randomly", "Require users to choose a region"],
+        ],
+    },
+    "Machine Learning": {
+        "templates": [
+            "(Topic: {topic}) Your model's offline metrics look great but production performance lags, and {topic} is involved. What should you do?",
+            "(Topic: {topic}) The ML team wants a repeatable process for {topic}. Which practice should be adopted?",
+            "(Topic: {topic}) A stakeholder asks how {topic} is validated before launch. What is the best answer?",
+            "(Topic: {topic}) Training runs related to {topic} are expensive and slow. Which improvement is most appropriate?",
+            "(Topic: {topic}) Predictions degrade a few weeks after deploying a model that relies on {topic}. What is the fix?",
+            "(Topic: {topic}) A reviewer is concerned about leakage in the {topic} pipeline. Which change addresses it?",
+            "(Topic: {topic}) You are writing ML guidelines for {topic}. Which recommendation should be included?",
+            "(Topic: {topic}) Serving latency for a model using {topic} exceeds the SLO. What do you do first?",
+            "(Topic: {topic}) An experiment on {topic} showed a surprising win. How should you proceed?",
+            "(Topic: {topic}) Different teams get different results when reproducing {topic}. What should change?",
+        ],
+        "options": [
+            ["Add regularization and early stopping", "Train for more epochs without changes", "Remove the validation set", "Increase model size dramatically"],
+            ["Split data by time or entity to avoid leakage", "Shuffle all rows before splitting regardless of time", "Evaluate on the training set", "Tune on the test set"],
+            ["Monitor input and prediction drift and retrain on triggers", "Retrain only when users complain", "Never retrain a deployed model", "Retrain every hour regardless of data"],
+            ["Track experiments, data versions and seeds", "Keep results in personal notebooks", "Only record the best run", "Rely on memory for hyperparameters"],
+            ["Use systematic hyperparameter search with cross-validation", "Pick hyperparameters from a blog post", "Tune by hand on the test set", "Use default values everywhere"],
+            ["Batch requests and quantise the model for serving", "Serve the largest checkpoint on CPU", "Recompute features for each request from raw logs", "Load the model for every request"],
+            ["Compute features identically for training and serving", "Reimplement features separately in each service", "Use different preprocessing in production", "Skip normalisation at serving time"],
+            ["Run a controlled A/B test with a pre-registered metric", "Ship based on one anecdote", "Stop the test as soon as it looks positive", "Compare against last year's numbers"],
+            ["Check label quality and class balance before modelling", "Assume labels are always correct", "Drop the minority class", "Duplicate the majority class"],
+            ["Store embeddings in a vector index with metadata filters", "Scan all embeddings linearly per query", "Recompute embeddings for each search", "Store embeddings as CSV text"],
+            ["Evaluate on slices that matter to users, not just overall accuracy", "Report only the overall accuracy", "Evaluate on a single example", "Use training loss as the launch metric"],
+            ["Roll out new models behind a shadow deployment first", "Replace the old model instantly for everyone", "Let users choose the model", "Deploy without monitoring"],
+        ],
+    },
+    "Mobile": {
+        "templates": [
+            "(Topic: {topic}) App store reviews complain about {topic}. What should the team address first?",
+            "(Topic: {topic}) The app drains battery whenever {topic} is active. Which change is most appropriate?",
+            "(Topic: {topic}) You are defining mobile guidelines for {topic}. Which practice belongs in them?",
+            "(Topic: {topic}) Crash reports spike after a release that changed {topic}. What should you do?",
+            "(Topic: {topic}) Users on flaky networks struggle with {topic}. Which approach helps most?",
+            "(Topic: {topic}) A release involving {topic} must reach users safely. What is the best strategy?",
+            "(Topic: {topic}) Startup time regressed after adding {topic}. How do you fix it?",
+            "(Topic: {topic}) Product wants {topic} to behave the same on iOS and Android. What do you recommend?",
+        ],
+        "options": [
+            ["Cache data locally and sync in the background with conflict handling", "Require a network connection for every screen", "Block the UI until sync completes", "Discard offline changes"],
+            ["Defer non-critical initialisation until after first render", "Initialise every SDK on launch", "Preload all screens at startup", "Increase the splash screen duration"],
+            ["Use platform schedulers for background work with constraints", "Keep a wake lock running permanently", "Poll the server every few seconds", "Run background work in an infinite loop"],
+            ["Roll out with staged releases and feature flags", "Release to 100% immediately", "Skip beta testing", "Ship untested hotfixes directly"],
+            ["Monitor crash-free sessions with symbolicated reports", "Ignore crashes below a certain count", "Ask users to email stack traces", "Disable crash reporting"],
+            ["Request permissions in context with a clear explanation", "Request every permission at first launch", "Re-prompt after each denial", "Hide features when permissions are missing without explanation"],
+            ["Virtualise long lists and recycle cells", "Render every item eagerly", "Nest scroll views inside each other", "Load full-size images in each cell"],
+            ["Validate deep links and route through a single handler", "Trust every deep link parameter", "Ignore unknown links silently", "Parse links differently on each screen"],
+            ["Use push notification tokens responsibly and respect user settings", "Send notifications as often as possible", "Ignore opt-out preferences", "Use notifications to ping the server"],
+            ["Share business logic while keeping native UI conventions", "Force identical pixels on both platforms", "Maintain two completely separate codebases for logic", "Use web views for every screen"],
+        ],
+    },
+    "Security": {
+        "templates": [
+            "(Topic: {topic}) A penetration test reported findings related to {topic}. What is the most appropriate remediation?",
+            "(Topic: {topic}) The security team is drafting a standard for {topic}. Which control should it require?",
+            "(Topic: {topic}) An incident showed attackers abusing weaknesses in {topic}. What should be changed?",
+            "(Topic: {topic}) A new service must be designed securely with respect to {topic}. Which approach is best?",
+            "(Topic: {topic}) Compliance asks for evidence about {topic}. What should you put in place?",
+            "(Topic: {topic}) Developers find {topic} requirements hard to follow. How do you make secure behaviour the default?",
+            "(Topic: {topic}) Threat modeling highlighted {topic} as high risk. Which mitigation do you prioritise?",
+            "(Topic: {topic}) A code review spotted a risky pattern related to {topic}. What should the author do?",
+        ],
+        "options": [
+            ["Use parameterised queries for all database access", "Escape quotes manually in SQL strings", "Block the word SELECT in inputs", "Hide SQL errors from logs"],
+            ["Encode output contextually and set a strict Content Security Policy", "Strip angle brackets from some inputs", "Trust HTML from authenticated users", "Disable the browser XSS auditor"],
+            ["Validate input against allow-lists at trust boundaries", "Use deny-lists of known bad strings", "Validate only on the client", "Accept any input and sanitise later"],
+            ["Store secrets in a vault with rotation and audit", "Keep secrets in environment files in the repo", "Email secrets to new joiners", "Hard-code secrets in the binary"],
+            ["Enforce TLS everywhere and mutual TLS between services", "Use plain HTTP inside the VPC", "Accept self-signed certs everywhere", "Disable certificate validation for speed"],
+            ["Apply least privilege and review access regularly", "Give admins to everyone who asks", "Share a root account across the team", "Remove access reviews to save time"],
+            ["Write tamper-evident audit logs for sensitive actions", "Log passwords to help debugging", "Keep logs only on the local disk", "Disable logging on admin paths"],
+            ["Use anti-CSRF tokens and SameSite cookies", "Rely on the Referer header alone", "Allow GET requests to change state", "Disable cookies entirely"],
+            ["Scan dependencies continuously and patch by severity", "Update dependencies once a year", "Pin vulnerable versions forever", "Vendor code and never update"],
+            ["Hash passwords with a slow, salted algorithm", "Store passwords with MD5", "Encrypt passwords with a shared key", "Store passwords in plaintext for recovery"],
+        ],
+    },
+    "Data Engineering": {
+        "templates": [
+            "(Topic: {topic}) Nightly jobs built on {topic} keep missing their SLA. What should you change first?",
+            "(Topic: {topic}) Analysts no longer trust dashboards fed by {topic}. Which practice restores confidence?",
+            "(Topic: {topic}) The data platform team is standardising {topic}. Which recommendation is best?",
+            "(Topic: {topic}) Costs of the {topic} pipeline doubled this quarter. What is the most appropriate action?",
+            "(Topic: {topic}) A schema change upstream broke {topic}. How should the pipeline handle this in future?",
+            "(Topic: {topic}) Reprocessing historical data with {topic} produces duplicates. What is the fix?",
+            "(Topic: {topic}) You are onboarding a new source into {topic}. Which step matters most?",
+            "(Topic: {topic}) Streaming consumers on {topic} fall behind during peaks. What should you do?",
+        ],
+        "options": [
+            ["Make loads idempotent with merge/upsert on natural keys", "Append every run without deduplication", "Truncate tables before every load", "Deduplicate manually in dashboards"],
+            ["Add data quality checks that fail the pipeline on violations", "Fix bad data in the BI tool", "Ignore nulls in key columns", "Check quality once per quarter"],
+            ["Partition and cluster tables on common filter columns", "Store everything in one unpartitioned table", "Use CSV files for analytical storage", "Scan full tables for every query"],
+            ["Use schema contracts and evolve schemas compatibly", "Let producers change schemas freely", "Cast every column to string", "Drop unknown columns silently"],
+            ["Track lineage so downstream impact is visible", "Document lineage in a slide deck", "Rely on tribal knowledge", "Rename tables to show dependencies"],
+            ["Orchestrate tasks as a DAG with retries and alerts", "Chain cron jobs with sleep statements", "Run everything in one giant script", "Trigger jobs manually each morning"],
+            ["Scale consumers with partitions and monitor lag", "Add more topics for the same data", "Disable consumer commits", "Increase message size limits"],
+            ["Use columnar formats with compaction of small files", "Write one file per record", "Store JSON blobs in a text column", "Disable compaction to save compute"],
+            ["Backfill with the same versioned code as daily runs", "Write one-off backfill scripts each time", "Edit historical data by hand", "Never backfill"],
+            ["Separate raw, cleaned and curated layers", "Transform data in place in the raw layer", "Let each analyst build their own copy", "Keep only the curated layer"],
+        ],
+    },
+    "General": {
+        "templates": [
+            "(Topic: {topic}) You need to optimize the {topic} layer of your application. Which improvement is most appropriate?",
+            "(Topic: {topic}) A recent deployment involving {topic} caused a regression. How do you resolve it?",
+            "(Topic: {topic}) You are tasked with scaling the {topic} infrastructure. What is the best approach?",
+            "(Topic: {topic}) Security vulnerabilities were found in the {topic} implementation. How should they be mitigated?",
+            "(Topic: {topic}) The development team is struggling with {topic} maintainability. What architectural pattern helps?",
+            "(Topic: {topic}) {topic} is consuming too much memory/CPU. What is the standard optimization technique?",
+            "(Topic: {topic}) Integration tests for {topic} are flaky. What is the most likely root cause?",
+            "(Topic: {topic}) A new team member asks for the best practice when configuring {topic}. What do you recommend?",
+            "(Topic: {topic}) Leadership asks for a plan to make {topic} more reliable. What do you propose first?",
+            "(Topic: {topic}) An incident review named {topic} as a contributing factor. Which follow-up is most valuable?",
+        ],
+        "options": [
+            ["Add a caching layer with TTL", "Disable all logging", "Ignore the issue", "Increase retries blindly"],
+            ["Introduce circuit breakers", "Remove health checks", "Add more servers without investigation", "Hard-code timeouts"],
+            ["Check resource limits and liveness probes", "Delete and recreate the cluster", "Ignore pod restarts", "Disable autoscaling"],
+            ["Add proper indexing and reduce lock scope", "Remove all transactions", "Increase connection pool to 10000", "Switch to a NoSQL database blindly"],
+            ["Profile re-renders and memoize hot paths", "Remove all state management", "Add more useEffect hooks", "Disable React strict mode"],
+            ["Add regularization and early stopping", "Train for more epochs without changes", "Remove the validation set", "Increase model size dramatically"],
+            ["Add retry logic with idempotency checks", "Remove the deploy step", "Skip tests to speed up the pipeline", "Run deploys only manually"],
+            ["Implement service discovery with health checks", "Hard-code all service URLs", "Remove inter-service communication", "Restart all services simultaneously"],
+            ["Measure first, then fix the biggest bottleneck", "Rewrite the system from scratch", "Optimise everything at once", "Guess based on intuition"],
+            ["Add automated tests around the failure and fix the root cause", "Add a try/except that hides the error", "Revert and never touch the code again", "Blame the last committer"],
+        ],
+    },
+}
@@ -0,0 +1,178 @@
+import hashlib
+import hmac
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import auth
+
+# -----------------------------
+# Server-side grading
+#
+# Mirrors the browser's evaluation rules (MCQ index, Short Answer keyword
+# coverage >= 0.6 over the first 4 lines, Coding requiredTokens >= 0.85,
+# Fill in the Blanks) but is authoritative: question sets are signed when
+# /api/generate issues them, so a client can't grade against answers it wrote.
+# Matchers are compiled once per question set and cached by its digest.
+# -----------------------------
+SHORT_ANSWER_PASS = 0.6
+CODING_PASS = 0.85
+SHORT_ANSWER_MAX_LINES = 4
+COMPILED_CACHE_SIZE = 256
+
+_WS = re.compile(r"\s+")
+_EDGE_PUNCT = re.compile(r"^[^\w]+|[^\w]+$")
+_TOPIC_PREFIX = re.compile(r"Topic:\s*([^)|]+)\)")
+
+
+def _norm(s: Optional[str]) -> str:
+    return _WS.sub(" ", (s or "").lower()).strip()
+
+
+def _norm_blank(s: Optional[str]) -> str:
+    return _EDGE_PUNCT.sub("", _norm(s))
+
+
+def question_set_digest(questions: Sequence[Dict[str, Any]]) -> str:
+    canonical = json.dumps(list(questions), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def sign_question_set(questions: Sequence[Dict[str, Any]], difficulty: str) -> str:
+    """Token proving a question set (and its difficulty) was issued by this server via /api/generate."""
+    msg = f"{question_set_digest(questions)}|{difficulty}"
+    return hmac.new(auth.SECRET_KEY.encode(), msg.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_question_set(questions: Sequence[Dict[str, Any]], difficulty: str, token: Optional[str]) -> bool:
+    return bool(token) and hmac.compare_digest(sign_question_set(questions, difficulty), token)
+
+
+def within_edit_distance(a: str, b: str, max_dist: int) -> bool:
+    """Levenshtein distance <= max_dist, abandoning rows once every cell exceeds the bound."""
+    if abs(len(a) - len(b)) > max_dist:
+        return False
+    if a == b:
+        return True
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+        if min(cur) > max_dist:
+            return False
+        prev = cur
+    return prev[-1] <= max_dist
+
+
+def _blank_tolerance(expected: str) -> int:
+    if len(expected) <= 3:
+        return 0
+    if len(expected) <= 7:
+        return 1
+    return 2
+
+
+class CompiledQuestion:
+    __slots__ = ("type", "topic", "title", "correct_index", "keywords", "keyword_re", "prefix_keywords", "blanks", "tokens", "tests")
+
+    def __init__(self, q: Dict[str, Any]):
+        self.type: str = (q.get("type") or "").strip()
+        scenario = q.get("scenario") or ""
+        m = _TOPIC_PREFIX.search(scenario[:200])
+        self.topic: str = m.group(1).strip() if m else "General"
+        self.title: str = scenario[:60] + "..."
+        self.correct_index: Optional[int] = q.get("correctIndex")
+
+        # Short Answer: all keywords folded into one zero-width alternation, so a single
+        # scan reports a keyword at every position it starts, including overlaps. The
+        # one case a scan can't see is a keyword that is a prefix of a longer one at
+        # the same position ("rate limit" / "rate limiting"); those are checked directly.
+        self.keywords: Tuple[str, ...] = tuple(dict.fromkeys(k for k in map(_norm, q.get("keywords") or []) if k))
+        self.keyword_re = (
+            re.compile("(?=(" + "|".join(re.escape(k) for k in sorted(self.keywords, key=len, reverse=True)) + "))")
+            if self.keywords else None
+        )
+        self.prefix_keywords: Tuple[str, ...] = tuple(
+            k for k in self.keywords if any(o != k and o.startswith(k) for o in self.keywords)
+        )
+
+        # Fill in the Blanks: "a | b" lists accepted alternatives.
+        self.blanks: Tuple[str, ...] = tuple(
+            b for b in (_norm_blank(x) for x in (q.get("answer") or "").split("|")) if b
+        )
+
+        # Coding: case-insensitive substring checks, as in the editor.
+        self.tokens: Tuple[str, ...] = tuple(t.strip().lower() for t in (q.get("requiredTokens") or []) if t and t.strip())
+
+        # Python Coding questions may carry assert-based tests run in the sandbox.
+        language = (q.get("language") or "").strip().lower()
+        self.tests: Optional[str] = q.get("tests") if self.type.upper() == "CODING" and language == "python" else None
+
+    def grade(self, answer: Optional[str], selected_index: Optional[int]) -> Tuple[float, bool, List[str], List[str]]:
+        """Return (score 0..1, passed, matched, missing)."""
+        t = self.type.upper()
+        # A question missing what it is graded against (correct index, keywords, blanks,
+        # required tokens) can't be passed, as in the browser; otherwise any answer would earn EXP.
+        if t == "MCQ":
+            ok = selected_index is not None and self.correct_index is not None and selected_index == self.correct_index
+            return (1.0 if ok else 0.0), ok, [], []
+
+        if t == "SHORT ANSWER":
+            if not self.keyword_re:
+                return 0.0, False, [], []
+            text = _norm("\n".join((answer or "").split("\n")[:SHORT_ANSWER_MAX_LINES]))
+            found = set(self.keyword_re.findall(text))
+            found.update(k for k in self.prefix_keywords if k not in found and k in text)
+            matched = [k for k in self.keywords if k in found]
+            missing = [k for k in self.keywords if k not in found]
+            score = len(matched) / len(self.keywords)
+            return score, score >= SHORT_ANSWER_PASS, matched, missing
+
+        if t == "FILL IN THE BLANKS":
+            got = _norm_blank(answer)
+            if not got or not self.blanks:
+                return 0.0, False, [], list(self.blanks)
+            for expected in self.blanks:
+                if got == expected or within_edit_distance(got, expected, _blank_tolerance(expected)):
+                    return 1.0, True, [expected], []
+            return 0.0, False, [], list(self.blanks)
+
+        if t == "CODING":
+            if not self.tokens:
+                return 0.0, False, [], []
+            src = (answer or "").lower()
+            matched = [tok for tok in self.tokens if tok in src]
+            missing = [tok for tok in self.tokens if tok not in src]
+            score = len(matched) / len(self.tokens)
+            return score, score >= CODING_PASS, matched, missing
+
+        return 0.0, False, [], []
+
+
+def status_for(score: float, passed: bool) -> str:
+    """Map a grade onto the activity statuses used by user_activities."""
+    if passed:
+        return "Success"
+    return "Partial" if score > 0 else "Failed"
+
+
+_compiled_cache: "OrderedDict[str, List[CompiledQuestion]]" = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def compile_question_set(questions: Sequence[Dict[str, Any]], digest: Optional[str] = None) -> List[CompiledQuestion]:
+    digest = digest or question_set_digest(questions)
+    with _compiled_lock:
+        compiled = _compiled_cache.get(digest)
+        if compiled is not None:
+            _compiled_cache.move_to_end(digest)
+            return compiled
+    compiled = [CompiledQuestion(q) for q in questions]
+    with _compiled_lock:
+        _compiled_cache[digest] = compiled
+        while len(_compiled_cache) > COMPILED_CACHE_SIZE:
+            _compiled_cache.popitem(last=False)
+    return compiled
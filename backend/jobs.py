@@ -0,0 +1,342 @@
+import hashlib
+import json
+import os
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+# -----------------------------
+# Durable background job queue
+#
+# Jobs live in the `jobs` table, so they survive restarts and any worker
+# process sharing the database can pick them up. Each job kind gets its own
+# fixed set of worker threads, which caps that kind's concurrency per process.
+# Workers claim jobs with a conditional UPDATE (queued -> running), so two
+# workers never run the same job.
+#
+# A claimed job is leased: a heartbeat thread in each process refreshes
+# heartbeat_at on the jobs it is running, and any process requeues running jobs
+# whose heartbeat is older than JOB_LEASE_SECONDS, i.e. whose worker died. The
+# attempt number taken at claim time fences the result: a worker that lost its
+# lease can't overwrite the job once another worker has reclaimed it.
+#
+# A finished job's input_blob is cleared, and the heartbeat deletes done and
+# failed jobs JOB_RETENTION_HOURS after they finished; until then they answer
+# status polls and identical resubmits.
+# -----------------------------
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "72"))
+JOB_SWEEP_BATCH = int(os.getenv("JOB_SWEEP_BATCH", "500"))
+
+Handler = Callable[[models.Job, Session], Any]
+
+
+class Handoff:
+    """
+    Returned by a handler to continue the job as another (stage) kind, on that
+    kind's workers: e.g. a CPU-bound scan hands the LLM calls to a stage whose
+    threads may sit waiting on the network without holding up further scans.
+    """
+
+    def __init__(self, kind: str, blob: Optional[bytes] = None):
+        self.kind = kind
+        self.blob = blob
+
+
+def dedupe_key(kind: str, payload: Dict[str, Any], blob: Optional[bytes] = None) -> str:
+    h = hashlib.sha256()
+    h.update(kind.encode())
+    h.update(json.dumps(payload, sort_keys=True, default=str).encode())
+    if blob is not None:
+        h.update(hashlib.sha256(blob).digest())
+    return h.hexdigest()
+
+
+class JobQueue:
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal):
+        self._session_factory = session_factory
+        self._handlers: Dict[str, Handler] = {}
+        self._concurrency: Dict[str, int] = {}
+        self._wakeups: Dict[str, threading.Event] = {}
+        self._stage_of: Dict[str, str] = {}
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # id -> attempt of the jobs this process is running, for the heartbeat.
+        self._running: Dict[str, int] = {}
+        self._running_lock = threading.Lock()
+
+    def register(self, kind: str, handler: Handler, concurrency: int = 1, stage_of: Optional[str] = None) -> None:
+        """
+        Register a handler; JOB_CONCURRENCY_<KIND> in the environment overrides `concurrency`.
+        A `stage_of` kind only receives Handoffs, and its jobs keep reporting that parent kind.
+        """
+        self._handlers[kind] = handler
+        if stage_of is not None:
+            self._stage_of[kind] = stage_of
+        self._concurrency[kind] = max(1, int(os.getenv(f"JOB_CONCURRENCY_{kind.upper()}", str(concurrency))))
+        self._wakeups[kind] = threading.Event()
+
+    def public_kind(self, kind: str) -> str:
+        return self._stage_of.get(kind, kind)
+
+    # -- submission ----------------------------------------------------------
+
+    def submit(
+        self,
+        db: Session,
+        kind: str,
+        payload: Dict[str, Any],
+        blob: Optional[bytes] = None,
+        user_id: Optional[int] = None,
+    ) -> models.Job:
+        """
+        Enqueue a job, or return the existing one for identical input.
+
+        Queued, running and finished jobs with the same (kind, payload, blob)
+        are reused; a failed one is requeued, so resubmitting retries it. The
+        unique dedupe key makes concurrent identical submits share one row.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        key = dedupe_key(kind, payload, blob)
+        job = db.query(models.Job).filter(models.Job.dedupe_key == key).first()
+        if job is None:
+            job = models.Job(
+                id=uuid.uuid4().hex,
+                kind=kind,
+                dedupe_key=key,
+                status="queued",
+                user_id=user_id,
+                payload=json.dumps(payload, default=str),
+                input_blob=blob,
+            )
+            db.add(job)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another request inserted the same job first.
+                db.rollback()
+                job = db.query(models.Job).filter(models.Job.dedupe_key == key).one()
+            else:
+                db.refresh(job)
+                self._wakeups[kind].set()
+                return job
+
+        if job.status == "failed":
+            requeued = db.query(models.Job).filter(
+                models.Job.id == job.id,
+                models.Job.status == "failed",
+            ).update({
+                "kind": kind, "status": "queued", "attempts": 0, "error": None, "result": None, "input_blob": blob,
+                "started_at": None, "heartbeat_at": None, "finished_at": None,
+            }, synchronize_session=False)
+            db.commit()
+            db.refresh(job)
+            if requeued:
+                self._wakeups[kind].set()
+        return job
+
+    # -- workers -------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        for kind, n in self._concurrency.items():
+            for i in range(n):
+                t = threading.Thread(target=self._worker, args=(kind,), name=f"job-{kind}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        t = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for ev in self._wakeups.values():
+            ev.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _heartbeat(self) -> None:
+        while True:
+            try:
+                self._beat()
+                self._requeue_expired()
+                self._delete_finished()
+            except Exception as e:
+                print(f"Job heartbeat error: {e}")
+            if self._stop.wait(JOB_HEARTBEAT_SECONDS):
+                return
+
+    def _beat(self) -> None:
+        with self._running_lock:
+            running = list(self._running)
+        if not running:
+            return
+        db = self._session_factory()
+        try:
+            db.query(models.Job).filter(
+                models.Job.id.in_(running),
+                models.Job.status == "running",
+            ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _requeue_expired(self) -> None:
+        """Requeue running jobs whose worker stopped heartbeating; give up on those out of attempts."""
+        db = self._session_factory()
+        try:
+            expired = (
+                models.Job.status == "running",
+                # Jobs claimed before heartbeats existed only have started_at.
+                func.coalesce(models.Job.heartbeat_at, models.Job.started_at)
+                < datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS),
+            )
+            failed = db.query(models.Job).filter(*expired, models.Job.attempts >= JOB_MAX_ATTEMPTS).update(
+                {"status": "failed", "error": "worker lost", "input_blob": None, "finished_at": datetime.utcnow()},
+                synchronize_session=False,
+            )
+            requeued = db.query(models.Job).filter(*expired).update({"status": "queued"}, synchronize_session=False)
+            db.commit()
+            if failed or requeued:
+                print(f"Requeued {requeued} and failed {failed} job(s) with expired leases")
+                for ev in self._wakeups.values():
+                    ev.set()
+        finally:
+            db.close()
+
+    def _delete_finished(self) -> None:
+        """Delete up to JOB_SWEEP_BATCH done or failed jobs that finished more than JOB_RETENTION_HOURS ago."""
+        db = self._session_factory()
+        try:
+            old = db.query(models.Job.id).filter(
+                models.Job.status.in_(("done", "failed")),
+                models.Job.finished_at < datetime.utcnow() - timedelta(hours=JOB_RETENTION_HOURS),
+            ).limit(JOB_SWEEP_BATCH).all()
+            if not old:
+                return
+            # Re-check the status: a failed job may have been resubmitted since it was selected.
+            deleted = db.query(models.Job).filter(
+                models.Job.id.in_([job_id for (job_id,) in old]),
+                models.Job.status.in_(("done", "failed")),
+            ).delete(synchronize_session=False)
+            db.commit()
+            print(f"Deleted {deleted} finished job(s) older than {JOB_RETENTION_HOURS:g}h")
+        finally:
+            db.close()
+
+    def _claim(self, db: Session, kind: str) -> Optional[models.Job]:
+        candidates = db.query(models.Job.id).filter(
+            models.Job.kind == kind,
+            models.Job.status == "queued",
+        ).order_by(models.Job.created_at).limit(5).all()
+        now = datetime.utcnow()
+        for (job_id,) in candidates:
+            claimed = db.query(models.Job).filter(
+                models.Job.id == job_id,
+                models.Job.status == "queued",
+            ).update(
+                {"status": "running", "started_at": now, "heartbeat_at": now, "attempts": models.Job.attempts + 1},
+                synchronize_session=False,
+            )
+            db.commit()
+            if claimed:
+                return db.get(models.Job, job_id)
+        return None
+
+    def _worker(self, kind: str) -> None:
+        handler = self._handlers[kind]
+        wakeup = self._wakeups[kind]
+        while not self._stop.is_set():
+            db = self._session_factory()
+            try:
+                job = self._claim(db, kind)
+                if job is None:
+                    db.close()
+                    wakeup.wait(JOB_POLL_SECONDS)
+                    wakeup.clear()
+                    continue
+                self._run(db, job, handler)
+            except Exception as e:
+                print(f"Job worker {kind} error: {e}")
+                traceback.print_exc()
+                self._stop.wait(JOB_POLL_SECONDS)
+            finally:
+                db.close()
+
+    def _run(self, db: Session, job: models.Job, handler: Handler) -> None:
+        job_id, kind, attempt = job.id, job.kind, job.attempts or 0
+        with self._running_lock:
+            self._running[job_id] = attempt
+        try:
+            try:
+                result = handler(job, db)
+                if isinstance(result, Handoff):
+                    # A fresh attempt budget for the next stage; it starts from the handed-off blob.
+                    values = {"kind": result.kind, "status": "queued", "attempts": 0, "error": None,
+                              "input_blob": result.blob}
+                else:
+                    values = {"status": "done", "result": json.dumps(result, default=str), "error": None,
+                              "input_blob": None}
+            except HTTPException as e:
+                db.rollback()
+                values = {"status": "failed", "error": str(e.detail), "input_blob": None}
+            except Exception as e:
+                print(f"Job {job_id} ({kind}) failed: {e}")
+                traceback.print_exc()
+                db.rollback()
+                # Unexpected errors are retried; handlers raise HTTPException for permanent ones.
+                values = {
+                    "status": "queued" if attempt < JOB_MAX_ATTEMPTS else "failed",
+                    "error": str(e) or e.__class__.__name__,
+                }
+                if values["status"] == "failed":
+                    # Only a resubmit retries it now, and that brings the input again.
+                    values["input_blob"] = None
+            values["finished_at"] = datetime.utcnow() if values["status"] != "queued" else None
+            # Only the holder of the current attempt may record the outcome.
+            owned = db.query(models.Job).filter(
+                models.Job.id == job_id,
+                models.Job.status == "running",
+                models.Job.attempts == attempt,
+            ).update(values, synchronize_session=False)
+            db.commit()
+            if not owned:
+                print(f"Job {job_id} ({kind}) lost its lease; discarding this attempt's outcome")
+            elif values["status"] == "queued":
+                self._wakeups[values.get("kind", kind)].set()
+        finally:
+            with self._running_lock:
+                self._running.pop(job_id, None)
+
+
+def to_status(job: models.Job) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "kind": queue.public_kind(job.kind),
+        "status": job.status,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+queue = JobQueue()
@@ -0,0 +1,105 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, TypeVar
+
+from fastapi import HTTPException
+
+import profiling
+
+# -----------------------------
+# Execution lanes
+#
+# Blocking work runs in a bounded thread pool per class of work instead of
+# Starlette's shared threadpool, so a burst of slow LLM calls can't take the
+# threads that health checks, logins and profile reads need. Each lane admits
+# at most `workers + max_queue` calls; beyond that it answers 503 right away
+# rather than letting requests pile up behind work that is already late.
+#
+# Sizes are set with LANE_<NAME>_WORKERS and LANE_<NAME>_QUEUE.
+# -----------------------------
+T = TypeVar("T")
+
+RETRY_AFTER_SECONDS = 5
+WAIT_SAMPLES = 256
+
+
+class Lane:
+    def __init__(self, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = max(1, int(os.getenv(f"LANE_{name.upper()}_WORKERS", str(workers))))
+        self.max_queue = max(0, int(os.getenv(f"LANE_{name.upper()}_QUEUE", str(max_queue))))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"lane-{name}")
+        self._lock = threading.Lock()
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self._waits_ms: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking call in this lane, or raise 503 if the lane is full."""
+        with self._lock:
+            if self.active + self.queued >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Server is busy ({self.name}); please retry shortly",
+                    headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+                )
+            self.queued += 1
+
+        enqueued = time.perf_counter()
+        ctx = contextvars.copy_context()
+
+        def call() -> T:
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                self._waits_ms.append((time.perf_counter() - enqueued) * 1000)
+            try:
+                return ctx.run(profiling.run_attached, fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        return await asyncio.wrap_future(self._executor.submit(call))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits_ms)
+            active, queued = self.active, self.queued
+            completed, rejected = self.completed, self.rejected
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "active": active,
+            "queued": queued,
+            # Share of the lane's admission capacity in use; at 1.0 new calls get 503.
+            "saturation": (active + queued) / (self.workers + self.max_queue),
+            "completed": completed,
+            "rejected": rejected,
+            "queue_wait_p50_ms": waits[len(waits) // 2] if waits else None,
+            "queue_wait_p95_ms": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else None,
+        }
+
+
+llm = Lane("llm", workers=16, max_queue=64)
+pdf = Lane("pdf", workers=min(4, os.cpu_count() or 1), max_queue=32)
+hashing = Lane("hash", workers=min(4, os.cpu_count() or 1), max_queue=128)
+db = Lane("db", workers=16, max_queue=256)
+# Grading waits on sandbox results for up to several seconds per answer.
+sandbox = Lane("sandbox", workers=8, max_queue=64)
+# Uploaded images: streaming, hashing and decoding up to MAX_PHOTO_BYTES each.
+media = Lane("media", workers=min(4, os.cpu_count() or 1), max_queue=32)
+
+LANES: Dict[str, Lane] = {lane.name: lane for lane in (llm, pdf, hashing, db, sandbox, media)}
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {name: lane.stats() for name, lane in LANES.items()}
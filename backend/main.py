@@ -1,44 +1,107 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Iterator, Tuple, TYPE_CHECKING
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from groq import Groq
 import os
 import io
 import random
 import json
 import re
+import asyncio
+import itertools
+import math
+import multiprocessing
+import threading
+import time
+from collections import Counter
 from datetime import datetime
+import concurrent.futures
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # Database & Auth Integrations
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from fastapi import Depends, status
+from fastapi import Depends, Query, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 
 import models
 import schemas
 import auth
-from database import engine, get_db
-
-# Create SQLite tables
-models.Base.metadata.create_all(bind=engine)
+import catalog
+import export
+import grading
+import jobs
+import lanes
+import photos
+import profiling
+import retrieval
+import routing
+import sandbox
+from database import SessionLocal, engine, get_db
+from fallback_bank import FALLBACK_BANK
+
+if TYPE_CHECKING:
+    from groq import Groq
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQAPI_KEY", "")
-_groq_client: Optional[Groq] = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
 
-app = FastAPI()
+# The Groq SDK (and httpx under it) is the single most expensive import here, so the
+# client is only built the first time an LLM call actually needs it.
+_groq_client: Optional["Groq"] = None
+_groq_client_lock = threading.Lock()
+
+
+def get_groq_client() -> Optional["Groq"]:
+    global _groq_client
+    if _groq_client is None and GROQ_API_KEY:
+        with _groq_client_lock:
+            if _groq_client is None:
+                from groq import Groq
+                _groq_client = Groq(api_key=GROQ_API_KEY)
+    return _groq_client
+
+
+# Schema creation and migrations are a one-shot deploy step (`python migration.py`),
+# not something every worker races on at boot. Local SQLite setups still get their
+# tables created on startup unless AUTO_CREATE_SCHEMA=0.
+AUTO_CREATE_SCHEMA = os.getenv(
+    "AUTO_CREATE_SCHEMA", "1" if engine.url.get_backend_name() == "sqlite" else "0"
+) == "1"
+
+UPLOADS_DIR = "uploads"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    if AUTO_CREATE_SCHEMA:
+        models.Base.metadata.create_all(bind=engine)
+    catalog.current()  # load and serialise the catalog before the first request
+    jobs.queue.start()
+    sandbox.pool.start()
+    yield
+    sandbox.pool.stop()
+    jobs.queue.stop()
+    photos.shutdown()
+    retrieval.shutdown()
+    _discard_pdf_pool()
+
 
-# Ensure uploads directory exists
-os.makedirs("uploads", exist_ok=True)
-from fastapi.staticfiles import StaticFiles
-app.mount("/api/uploads", StaticFiles(directory="uploads"), name="uploads")
+app = FastAPI(lifespan=lifespan)
+
+# The directory is created in lifespan(), so don't require it at import time.
+app.mount("/api/uploads", photos.CachedStaticFiles(directory=UPLOADS_DIR, check_dir=False), name="uploads")
 
 app.add_middleware(
     CORSMiddleware,
@@ -47,6 +110,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Question sets and batch results are large, repetitive JSON. Responses that are
+# already encoded (the precompressed /api/catalog) pass through untouched.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+# Outermost, so a profile's duration covers the whole request.
+app.add_middleware(profiling.ProfilingMiddleware)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -77,6 +145,7 @@ class Question(BaseModel):
     language: Optional[str] = None
     starterCode: Optional[str] = None
     requiredTokens: Optional[List[str]] = None
+    tests: Optional[str] = None  # Python only: assert statements run against submissions in the sandbox
 
 
 class GenerateRequest(BaseModel):
@@ -90,143 +159,73 @@ class ExtractTopicsResponse(BaseModel):
     topics: List[str]
 
 
-# -----------------------------
-# Full catalog — must match frontend SUBJECTS exactly
-# -----------------------------
-CATALOG: Dict[str, List[str]] = {
-    "Frontend": [
-        "React","Next.js","TypeScript","JavaScript","CSS","TailwindCSS","Accessibility","Web Performance",
-        "State Management","Redux","Zustand","MobX","Testing Library","Jest","Playwright",
-        "Animations","Framer Motion","SSR","CSR","Hydration","Code Splitting","Memoization",
-        "WebSockets","Service Workers","PWA","i18n","Form Handling","React Query","TanStack Query",
-        "Vite","Webpack","Babel","Storybook","Design Systems","Component Architecture","Hooks","Context API",
-    ],
-    "Backend": [
-        "APIs","REST","GraphQL","gRPC","Microservices","Monolith","Caching","Redis","Queues","RabbitMQ",
-        "Kafka","Databases","PostgreSQL","MySQL","MongoDB","ORM","Prisma","SQLAlchemy","Auth","OAuth2",
-        "JWT","Rate Limiting","Circuit Breaker","Observability","Metrics","Tracing","Logging","Testing",
-        "Pagination","Idempotency","Schema Migrations","Multi-tenancy","API Gateway","Service Discovery",
-    ],
-    "DevOps": [
-        "Docker","Kubernetes","Helm","CI/CD","GitHub Actions","Terraform","Ansible","Prometheus","Grafana",
-        "ArgoCD","Autoscaling","Blue-Green","Canary","Load Balancing","Nginx","Istio","Linkerd",
-        "Secrets","ConfigMaps","RBAC","Ingress","EKS","GKE","AKS","Cost Optimization",
-    ],
-    "System Design": [
-        "Scalability","Availability","Consistency","CAP Theorem","Sharding","Replication","Leader Election",
-        "Distributed Caching","CDN","Global Traffic","Failover","Backpressure","Rate Limiting",
-        "Event Sourcing","CQRS","Read/Write Splitting","Geo-partitioning","Hot Partitions",
-    ],
-    "Machine Learning": [
-        "Model Training","Data Preprocessing","Feature Engineering","Cross Validation","Regularization",
-        "Hyperparameter Tuning","Overfitting","Underfitting","Model Serving","Batch Inference","Streaming Inference",
-        "Embeddings","Vector Databases","Evaluation","Drift Detection","A/B Testing","Monitoring","Retraining",
-    ],
-    "Mobile": [
-        "React Native","Swift","Kotlin","Android","iOS","Flutter","Performance","Offline Sync","Push Notifications",
-        "Background Tasks","Deep Links","App Store","Play Store","Crash Reporting",
-    ],
-    "Security": [
-        "OWASP","Input Validation","XSS","CSRF","SQL Injection","Secrets Management","Vulnerability Scanning",
-        "Penetration Testing","Threat Modeling","Audit Logging","Encryption","TLS","mTLS","SSO",
-    ],
-    "Data Engineering": [
-        "ETL","ELT","Batch Processing","Stream Processing","Spark","Flink","Airflow","dbt","Lakehouse",
-        "Delta Lake","Data Quality","Data Lineage","Data Catalog","Parquet","Iceberg","Hudi",
-    ],
-}
+class FileTopics(BaseModel):
+    filename: str
+    topics: List[str] = []
+    error: Optional[str] = None
+
+
+class TopicFrequency(BaseModel):
+    topic: str
+    documents: int  # how many files in the batch mention it
+
+
+class BatchExtractTopicsResponse(BaseModel):
+    files: List[FileTopics]
+    topics: List[TopicFrequency]  # merged over all files, most common first
+
+
+class GradeItem(BaseModel):
+    question: int  # index into GradeRequest.questions
+    answer: Optional[str] = None  # Short Answer / Fill in the Blanks / Coding
+    selectedIndex: Optional[int] = None  # MCQ
+
+
+class GradeRequest(BaseModel):
+    questions: List[Question]
+    answers: List[GradeItem]
+    set_token: Optional[str] = None  # returned by /api/generate with the questions
+    difficulty: Optional[str] = "Bachelor"
+    record: bool = False  # save each graded answer as an activity (requires login + set_token)
+
+
+class ExecutionResult(BaseModel):
+    passed: bool
+    timed_out: bool = False
+    runtime_ms: float
+    stdout: str = ""
+    stderr: str = ""
+    error: Optional[str] = None
+
+
+class GradeResult(BaseModel):
+    question: int
+    score: float
+    passed: bool
+    status: str
+    matched: List[str] = []
+    missing: List[str] = []
+    error: Optional[str] = None
+    execution: Optional[ExecutionResult] = None  # Python Coding answers with tests
+
+
+class GradeResponse(BaseModel):
+    verified: bool
+    total: int
+    passed: int
+    mean_score: float
+    results: List[GradeResult]
 
-ALL_TOPICS: List[str] = sorted({t for items in CATALOG.values() for t in items})
-
-_ALIASES: Dict[str, str] = {
-    "reactjs": "React", "react.js": "React", "nextjs": "Next.js", "next js": "Next.js",
-    "ts": "TypeScript", "js": "JavaScript", "tailwind": "TailwindCSS", "tailwind css": "TailwindCSS",
-    "node": "APIs", "nodejs": "APIs", "node.js": "APIs", "express": "APIs", "fastapi": "APIs",
-    "flask": "APIs", "django": "APIs", "sql": "Databases", "nosql": "MongoDB",
-    "postgres": "PostgreSQL", "postgresql": "PostgreSQL", "mongo": "MongoDB", "mongodb": "MongoDB",
-    "k8s": "Kubernetes",
-    "ci cd": "CI/CD", "ci/cd": "CI/CD", "github actions": "GitHub Actions", "gh actions": "GitHub Actions",
-    "ml": "Model Training", "machine learning": "Model Training", "deep learning": "Model Training",
-    "neural network": "Model Training", "neural networks": "Model Training",
-    "cnn": "Model Training", "rnn": "Model Training", "transformer": "Model Training",
-    "transformers": "Model Training", "llm": "Model Training", "large language model": "Model Training",
-    "nlp": "Embeddings", "natural language processing": "Embeddings",
-    "server side rendering": "SSR", "client side rendering": "CSR",
-    "code splitting": "Code Splitting", "state management": "State Management",
-    "api": "APIs", "rest api": "REST", "restful": "REST", "graphql": "GraphQL", "grpc": "gRPC",
-    "oauth": "OAuth2", "oauth2": "OAuth2", "json web token": "JWT", "json web tokens": "JWT",
-    "rate limit": "Rate Limiting", "rate limiting": "Rate Limiting",
-    "circuit breaker": "Circuit Breaker", "microservice": "Microservices",
-    "cap theorem": "CAP Theorem", "event sourcing": "Event Sourcing", "event driven": "Event Sourcing",
-    "container": "Docker", "containers": "Docker", "containerization": "Docker",
-    "infrastructure as code": "Terraform", "iac": "Terraform",
-    "load balancer": "Load Balancing", "load balancing": "Load Balancing",
-    "message queue": "Queues", "cache": "Caching",
-    "service mesh": "Istio", "configmap": "ConfigMaps", "configmaps": "ConfigMaps",
-    "role based access": "RBAC", "auto scaling": "Autoscaling",
-    "blue green": "Blue-Green", "blue green deployment": "Blue-Green",
-    "canary deployment": "Canary", "argo cd": "ArgoCD",
-    "leader election": "Leader Election", "distributed caching": "Distributed Caching",
-    "global traffic": "Global Traffic", "read write splitting": "Read/Write Splitting",
-    "read/write splitting": "Read/Write Splitting",
-    "geo partitioning": "Geo-partitioning", "geo-partitioning": "Geo-partitioning",
-    "hot partition": "Hot Partitions", "hot partitions": "Hot Partitions",
-    "batch processing": "Batch Processing", "stream processing": "Stream Processing",
-    "batch inference": "Batch Inference", "streaming inference": "Streaming Inference",
-    "data preprocessing": "Data Preprocessing", "data augmentation": "Data Preprocessing",
-    "feature engineering": "Feature Engineering", "cross validation": "Cross Validation",
-    "hyperparameter": "Hyperparameter Tuning", "hyperparameter tuning": "Hyperparameter Tuning",
-    "model serving": "Model Serving", "model deployment": "Model Serving",
-    "vector database": "Vector Databases", "vector db": "Vector Databases",
-    "drift detection": "Drift Detection", "model monitoring": "Monitoring",
-    "a/b testing": "A/B Testing", "ab testing": "A/B Testing",
-    "pwa": "PWA", "progressive web app": "PWA",
-    "service worker": "Service Workers", "service workers": "Service Workers",
-    "websocket": "WebSockets", "websockets": "WebSockets",
-    "react hooks": "Hooks", "context api": "Context API",
-    "content delivery network": "CDN", "orm": "ORM", "object relational mapping": "ORM",
-    "api gateway": "API Gateway", "service discovery": "Service Discovery",
-    "schema migration": "Schema Migrations", "schema migrations": "Schema Migrations",
-    "database migration": "Schema Migrations",
-    "multi tenancy": "Multi-tenancy", "multi-tenancy": "Multi-tenancy",
-    "pen testing": "Penetration Testing", "penetration testing": "Penetration Testing",
-    "ssl": "TLS", "single sign on": "SSO",
-    "secret management": "Secrets Management", "secrets management": "Secrets Management",
-    "vulnerability scanning": "Vulnerability Scanning", "threat modeling": "Threat Modeling",
-    "audit log": "Audit Logging", "audit logging": "Audit Logging",
-    "input validation": "Input Validation",
-    "push notification": "Push Notifications", "push notifications": "Push Notifications",
-    "offline sync": "Offline Sync",
-    "background task": "Background Tasks", "background tasks": "Background Tasks",
-    "deep link": "Deep Links", "deep links": "Deep Links", "deep linking": "Deep Links",
-    "app store": "App Store", "play store": "Play Store", "crash reporting": "Crash Reporting",
-    "model retraining": "Retraining", "model evaluation": "Evaluation",
-    "design system": "Design Systems", "design systems": "Design Systems",
-    "component architecture": "Component Architecture",
-    "a11y": "Accessibility", "internationalization": "i18n",
-    "form handling": "Form Handling", "forms": "Form Handling",
-    "react query": "React Query", "tanstack query": "TanStack Query",
-    "framer motion": "Framer Motion", "animation": "Animations", "animations": "Animations",
-    "web performance": "Web Performance", "performance optimization": "Web Performance",
-    "usememo": "Memoization", "usecallback": "Memoization", "memo": "Memoization",
-    "unit testing": "Testing", "integration testing": "Testing",
-    "apache spark": "Spark", "apache flink": "Flink", "apache airflow": "Airflow",
-    "data pipeline": "ETL", "data pipelines": "ETL",
-    "delta lake": "Delta Lake", "data quality": "Data Quality",
-    "data lineage": "Data Lineage", "data catalog": "Data Catalog",
-    "dropout": "Regularization", "l1 regularization": "Regularization", "l2 regularization": "Regularization",
-    "react native": "React Native",
-}
 
 # -----------------------------
 # Utilities
 # -----------------------------
-def distribute_topics(topics: List[str], count: int) -> List[str]:
+def distribute_topics(topics: List[str], count: int, rng: Optional[random.Random] = None) -> List[str]:
     if not topics:
         return []
 
     topics = list(topics)
-    random.shuffle(topics)
+    (rng or random).shuffle(topics)
 
     if len(topics) <= count:
         result: List[str] = []
@@ -315,125 +314,334 @@ def _shuffle_mcq_options(q: Question) -> None:
 
 
 def match_topics_from_text(text: str) -> List[str]:
-    text_lower = text.lower()
-    matched: set = set()
-
-    for topic in ALL_TOPICS:
-        if len(topic) <= 3:
-            if re.search(r"\b" + re.escape(topic) + r"\b", text, re.IGNORECASE):
-                matched.add(topic)
-        else:
-            if topic.lower() in text_lower:
-                matched.add(topic)
-
-    for alias, canonical in _ALIASES.items():
-        if len(alias) <= 3:
-            if re.search(r"\b" + re.escape(alias) + r"\b", text_lower):
-                matched.add(canonical)
-        else:
-            if alias in text_lower:
-                matched.add(canonical)
-
-    return sorted(matched)
+    return catalog.current().match_topics(text)
+
+
+# Below this many matched topics the LLM is asked for more, so early exit waits for it too.
+MIN_MATCHED_TOPICS = 5
+TOPIC_SATURATION_PAGES = int(os.getenv("TOPIC_SATURATION_PAGES", "12"))
+
+_FIRST_WS = re.compile(r"\s")
+
+
+class TopicAccumulator:
+    """
+    match_topics_from_text over a stream of text chunks (pages).
+
+    Coverage is saturated once at least `min_topics` are known and nothing new
+    turned up in the last `patience` chunks, or in the last half of everything
+    read so far if that is longer, so one dense intro doesn't end a long book.
+    """
+
+    def __init__(self, min_topics: int = MIN_MATCHED_TOPICS, patience: int = TOPIC_SATURATION_PAGES):
+        self.min_topics = min_topics
+        self.patience = patience
+        self.found: set = set()
+        self.chunks = 0
+        self._catalog = catalog.current()
+        self._since_new = 0
+        self._tail = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Match one chunk and return the topics it added."""
+        new = [t for t in self._catalog.match_topics(self._tail + " " + text) if t not in self.found]
+        self.found.update(new)
+        self.chunks += 1
+        self._since_new = 0 if new else self._since_new + 1
+
+        # Carry enough of the tail for the longest catalog term, so a term split across
+        # a page break is still found, starting on a word boundary so it can't fake a \b match.
+        overlap = self._catalog.max_term_len
+        tail = text[-overlap:]
+        if len(text) > overlap:
+            m = _FIRST_WS.search(tail)
+            tail = tail[m.end():] if m else ""
+        self._tail = tail
+        return new
+
+    @property
+    def topics(self) -> List[str]:
+        return sorted(self.found)
+
+    @property
+    def saturated(self) -> bool:
+        if len(self.found) >= len(self._catalog.all_topics):
+            return True
+        return len(self.found) >= self.min_topics and self._since_new >= max(self.patience, self.chunks // 2)
 
 
 # -----------------------------
 # Fallback Questions
 # -----------------------------
-FALLBACK_SCENARIO_TEMPLATES = [
-    "(Topic: {topic}) You need to optimize the {topic} layer of your application. Which improvement is most appropriate?",
-    "(Topic: {topic}) A recent deployment involving {topic} caused a regression. How do you resolve it?",
-    "(Topic: {topic}) You are tasked with scaling the {topic} infrastructure. What is the best approach?",
-    "(Topic: {topic}) Security vulnerabilities were found in the {topic} implementation. How should they be mitigated?",
-    "(Topic: {topic}) The development team is struggling with {topic} maintainability. What architectural pattern helps?",
-    "(Topic: {topic}) {topic} is consuming too much memory/CPU. What is the standard optimization technique?",
-    "(Topic: {topic}) Integration tests for {topic} are flaky. What is the most likely root cause?",
-    "(Topic: {topic}) A new team member asks for the best practice when configuring {topic}. What do you recommend?"
-]
-
-FALLBACK_OPTION_SETS = [
-    ["Add a caching layer with TTL", "Disable all logging", "Ignore the issue", "Increase retries blindly"],
-    ["Introduce circuit breakers", "Remove health checks", "Add more servers without investigation", "Hard-code timeouts"],
-    ["Check resource limits and liveness probes", "Delete and recreate the cluster", "Ignore pod restarts", "Disable autoscaling"],
-    ["Add proper indexing and reduce lock scope", "Remove all transactions", "Increase connection pool to 10000", "Switch to a NoSQL database blindly"],
-    ["Profile re-renders and memoize hot paths", "Remove all state management", "Add more useEffect hooks", "Disable React strict mode"],
-    ["Add regularization and early stopping", "Train for more epochs without changes", "Remove the validation set", "Increase model size dramatically"],
-    ["Add retry logic with idempotency checks", "Remove the deploy step", "Skip tests to speed up the pipeline", "Run deploys only manually"],
-    ["Implement service discovery with health checks", "Hard-code all service URLs", "Remove inter-service communication", "Restart all services simultaneously"],
-]
-
-
-def fallback_questions(subjects: List[str], count: int, force_type: Optional[str] = None, difficulty: str = "Bachelor") -> List[Question]:
-    questions: List[Question] = []
-    distributed = distribute_topics(subjects, count)
-    indices = list(range(len(FALLBACK_SCENARIO_TEMPLATES)))
-    random.shuffle(indices)
-
-    for i in range(count):
-        si = indices[i % len(indices)]
-        options = FALLBACK_OPTION_SETS[si].copy()
-        topic = distributed[i] if i < len(distributed) else random.choice(subjects)
-        
-        scenario_text = FALLBACK_SCENARIO_TEMPLATES[si % len(FALLBACK_SCENARIO_TEMPLATES)].format(topic=topic)
+# All 24 orderings of a 4-option set, so shuffling an MCQ is one randrange() and
+# the correct index is a lookup rather than a list search.
+_OPTION_PERMUTATIONS = [tuple(p) for p in itertools.permutations(range(4))]
+
+_FALLBACK_MCQ_HINT = "Think about reliability, performance, and best practices."
+
+
+def _fallback_category(topic: str) -> str:
+    # Grouped topics ("React and CSS") take the category of their first member.
+    first = topic.split(" and ", 1)[0].strip()
+    snapshot = catalog.current()
+    cat = snapshot.topic_category.get(first) or snapshot.topic_category.get(snapshot.aliases.get(first.lower(), ""))
+    return cat if cat in FALLBACK_BANK else "General"
+
+
+def _sample_fallback_pairs(categories: List[str], rng: random.Random) -> List[tuple]:
+    """
+    Assign a (bank, template index, option set index) triple to every slot.
+
+    Slots are grouped by category and each group draws its pairs in one
+    rng.sample() over the flattened template x option-set grid, so no pair
+    repeats within a request. Once a category's grid is exhausted the overflow
+    draws from "General"; only when that is exhausted too do pairs recycle.
+    """
+    slots_by_cat: Dict[str, List[int]] = {}
+    for i, cat in enumerate(categories):
+        slots_by_cat.setdefault(cat, []).append(i)
+
+    # General is sampled last so it can absorb overflow from every other category.
+    order = [c for c in slots_by_cat if c != "General"] + ["General"]
+    assigned: List[Optional[tuple]] = [None] * len(categories)
+    overflow: List[int] = []
+    for cat in order:
+        slots = slots_by_cat.get(cat, [])
+        if cat == "General":
+            slots = slots + overflow
+        bank = FALLBACK_BANK[cat]
+        n_opts = len(bank["options"])
+        grid = len(bank["templates"]) * n_opts
+        picks = rng.sample(range(grid), min(len(slots), grid))
+        if cat == "General":
+            while len(picks) < len(slots):
+                picks += rng.sample(range(grid), min(len(slots) - len(picks), grid))
+        for slot, pid in zip(slots, picks):
+            assigned[slot] = (cat, pid // n_opts, pid % n_opts)
+        overflow.extend(slots[len(picks):])
+    return assigned  # type: ignore[return-value]
+
+
+def fallback_questions(
+    subjects: List[str],
+    count: int,
+    force_type: Optional[str] = None,
+    difficulty: str = "Bachelor",
+    seed: Optional[int] = None,
+) -> List[Question]:
+    rng = random.Random(seed)
+    distributed = distribute_topics(subjects, count, rng)
+    topics = [distributed[i] if i < len(distributed) else rng.choice(subjects) for i in range(count)]
 
-        if force_type == "Coding":
-            q = Question(
+    questions: List[Question] = []
+    if force_type == "Coding":
+        for i, topic in enumerate(topics):
+            slug = f"{topic.lower().replace(' ', '_')}_v{i+1}"
+            questions.append(Question(
                 type="Coding",
-                scenario=f"({difficulty} Level | Topic: {topic}) Implement feature variant #{i+1} by writing a function named `process_{topic.lower().replace(' ', '_')}_v{i+1}` that takes a parameter `config_data` and returns `True`. \n\nExpected Variables: \n- `config_data`\n- `status_flag`",
+                scenario=f"({difficulty} Level | Topic: {topic}) Implement feature variant #{i+1} by writing a function named `process_{slug}` that takes a parameter `config_data` and returns `True`. \n\nExpected Variables: \n- `config_data`\n- `status_flag`",
                 options=None,
                 correctIndex=None,
                 hint="Make sure to define the function, use the required variables, and return True.",
                 reason="This is the standard approach for this feature, ensuring all required variables are used.",
-                answer=f"def process_{topic.lower().replace(' ', '_')}_v{i+1}(config_data):\n    status_flag = True\n    return status_flag",
-                starterCode=f"def process_{topic.lower().replace(' ', '_')}_v{i+1}(config_data):\n    # Implement here\n    pass",
+                answer=f"def process_{slug}(config_data):\n    status_flag = True\n    return status_flag",
+                starterCode=f"def process_{slug}(config_data):\n    # Implement here\n    pass",
                 requiredTokens=["def", "return", "config_data", "status_flag"],
-                language="python"
-            )
-        else:
-            q = Question(
-                type="MCQ",
-                scenario=scenario_text,
-                options=options,
-                correctIndex=0,
-                hint="Think about reliability, performance, and best practices.",
-                reason=f"{options[0]} directly addresses the root cause.",
-            )
-            _shuffle_mcq_options(q)
-            
-        questions.append(q)
+                language="python",
+                tests=f"assert process_{slug}({{}}) is True",
+            ))
+        return questions
 
+    pairs = _sample_fallback_pairs([_fallback_category(t) for t in topics], rng)
+    n_perms = len(_OPTION_PERMUTATIONS)
+    for topic, (cat, ti, oi) in zip(topics, pairs):
+        bank = FALLBACK_BANK[cat]
+        option_set = bank["options"][oi]
+        perm = _OPTION_PERMUTATIONS[rng.randrange(n_perms)]
+        questions.append(Question(
+            type="MCQ",
+            scenario=bank["templates"][ti].format(topic=topic),
+            options=[option_set[j] for j in perm],
+            correctIndex=perm.index(0),
+            hint=_FALLBACK_MCQ_HINT,
+            reason=f"{option_set[0]} directly addresses the root cause.",
+        ))
     return questions
 
 
 # -----------------------------
 # Groq calls
 # -----------------------------
-def _groq_complete(prompt: str, temperature: float = 1.0, max_tokens: int = 8192) -> str:
-    """Call Groq with streaming and return the full assembled response string."""
-    if _groq_client is None:
+class _StreamAttempt:
+    """One streamed completion request that another thread can cancel by closing its stream."""
+
+    def __init__(self, client, kwargs: dict, hedge: bool = False):
+        self.client = client
+        self.kwargs = kwargs
+        self.hedge = hedge
+        self.started = time.perf_counter()
+        self.ttft_ms: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self.chars = 0
+        self.cancelled = False
+        # Set on the first chunk, and when the attempt ends, so waiters never sleep past a failure.
+        self.progress = threading.Event()
+        self._stream = None
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def run(self) -> str:
+        try:
+            self._stream = self.client.chat.completions.create(**self.kwargs)
+            if self.cancelled:
+                self.cancel()
+            chunks = []
+            for chunk in self._stream:
+                if self.cancelled:
+                    raise RuntimeError("hedged attempt cancelled")
+                if self.ttft_ms is None:
+                    # Any chunk counts, including reasoning: it shows the stream is alive.
+                    self.ttft_ms = self.elapsed_ms()
+                    self.progress.set()
+                delta = chunk.choices[0].delta
+                if delta and delta.content:
+                    chunks.append(delta.content)
+                    self.chars += len(delta.content)
+            return "".join(chunks)
+        finally:
+            self.latency_ms = self.elapsed_ms()
+            self.progress.set()
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+    def token_estimate(self, prompt: str) -> int:
+        return (len(prompt) + self.chars) // 4
+
+
+# Hedged calls run their attempts here so the caller can wait on both.
+_hedge_pool = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_THREADS", "32")), thread_name_prefix="llm-hedge")
+
+
+def _groq_complete(prompt: str, route: routing.Route, temperature: float = 1.0, max_tokens: Optional[int] = None) -> str:
+    """
+    Call Groq with streaming on the given route and return the full assembled response string.
+
+    With hedging enabled, a call whose first chunk or full response is later
+    than the route's recent percentile gets a second identical request; the
+    first to finish wins and the other is cancelled.
+    """
+    client = get_groq_client()
+    if client is None:
         raise RuntimeError("Groq client not initialised — check GROQAPI_KEY in .env")
 
-    stream = _groq_client.chat.completions.create(
-        model="openai/gpt-oss-120b",
+    kwargs = dict(
+        model=route.model,
         messages=[{"role": "user", "content": prompt}],
         temperature=temperature,
-        max_completion_tokens=max_tokens,
+        max_completion_tokens=min(max_tokens or route.max_tokens, route.max_tokens),
         top_p=1,
-        reasoning_effort="medium",
         stream=True,
         stop=None,
     )
-
-    chunks = []
-    for chunk in stream:
-        delta = chunk.choices[0].delta
-        if delta and delta.content:
-            chunks.append(delta.content)
-    return "".join(chunks)
-
-
-def call_openrouter(subjects: List[str], types: List[str], count: int, difficulty: str = "Bachelor") -> List[Question]:
-    """Generate questions via Groq (was OpenRouter)."""
+    if route.reasoning_effort:
+        kwargs["reasoning_effort"] = route.reasoning_effort
+
+    primary = _StreamAttempt(client, kwargs)
+    delays = routing.router.hedge_delays(route)
+    if delays is None:
+        try:
+            text = primary.run()
+        except Exception:
+            routing.router.record(route.name, primary.latency_ms, ok=False)
+            raise
+        routing.router.record(route.name, primary.latency_ms, True, primary.ttft_ms)
+        routing.router.record_spend(route.name, primary.token_estimate(prompt))
+        return text
+
+    ttft_ms, total_ms = delays
+    futures = {_hedge_pool.submit(primary.run): primary}
+    first = next(iter(futures))
+    if primary.progress.wait(ttft_ms / 1000) and not first.done():
+        concurrent.futures.wait([first], timeout=max(0.0, total_ms - primary.elapsed_ms()) / 1000)
+
+    if not first.done() and routing.router.hedge_allowed(route.name):
+        hedge = _StreamAttempt(client, kwargs, hedge=True)
+        futures[_hedge_pool.submit(hedge.run)] = hedge
+
+    # Take the first attempt to succeed; an attempt that fails just leaves the other running.
+    pending = set(futures)
+    winner_future = None
+    while pending and winner_future is None:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        winner_future = next((f for f in done if f.exception() is None), None)
+    for f, attempt in futures.items():
+        if f is not winner_future:
+            attempt.cancel()
+            routing.router.record_spend(route.name, attempt.token_estimate(prompt), hedge_extra=len(futures) > 1)
+
+    if winner_future is None:
+        routing.router.record(route.name, primary.elapsed_ms(), ok=False)
+        raise first.exception()
+
+    # A cancelled loser's latency is unknown (only that it was slower), so only the winner is sampled.
+    winner = futures[winner_future]
+    routing.router.record(route.name, winner.latency_ms, True, winner.ttft_ms)
+    routing.router.record_spend(route.name, winner.token_estimate(prompt))
+    if len(futures) > 1:
+        routing.router.record_hedge(route.name, hedge_won=winner.hedge)
+    return winner_future.result()
+
+
+# Overall time allowed for checking a generated set's tests; checks still running then are kept.
+QUESTION_CHECK_SECONDS = float(os.getenv("QUESTION_CHECK_SECONDS", "10"))
+
+
+async def _drop_failing_tests(questions: List[Question]) -> None:
+    """
+    Run each reference answer against its own tests in the sandbox, all at
+    once; tests it fails would fail everyone. The sandbox pool does the work,
+    so this only awaits its futures and holds no lane slot.
+    """
+    if not sandbox.pool.enabled:
+        return
+    checks = {}
+    for q in questions:
+        if q.type == "Coding" and q.tests:
+            try:
+                checks[asyncio.wrap_future(sandbox.pool.submit(q.answer or "", q.tests))] = q
+            except sandbox.SandboxUnavailable:
+                break
+    if not checks:
+        return
+    done, pending = await asyncio.wait(checks, timeout=QUESTION_CHECK_SECONDS)
+    for fut in pending:
+        # Not checked in time: keep the tests rather than hold up the response.
+        fut.cancel()
+    for fut in done:
+        try:
+            ok = fut.result()["passed"]
+        except Exception:
+            ok = False
+        if not ok:
+            checks[fut].tests = None
+
+
+def call_openrouter(
+    subjects: List[str],
+    types: List[str],
+    count: int,
+    difficulty: str = "Bachelor",
+    context: Optional[str] = None,
+) -> List[Question]:
+    """Generate questions via Groq (was OpenRouter); `context` is retrieved company material to ground scenarios in."""
     force_type = types[0] if types and len(types) == 1 else None
 
     if not GROQ_API_KEY:
@@ -466,6 +674,14 @@ def call_openrouter(subjects: List[str], types: List[str], count: int, difficult
     if force_type:
         prompt += f'CRITICAL: Every question MUST have "type": "{force_type}".\n\n'
 
+    if context:
+        prompt += (
+            "Company context: excerpts from the user's organisation's own documents, each tagged with its topic. "
+            "Where relevant, set scenarios in this organisation's systems, conventions and terminology. "
+            "Do not quote the excerpts verbatim or ask about details that appear only in them.\n"
+            f"{context}\n\n"
+        )
+
     prompt += (
         "Return ONLY a valid JSON array.\n"
         "No markdown. No explanations.\n"
@@ -476,6 +692,7 @@ def call_openrouter(subjects: List[str], types: List[str], count: int, difficult
         "4) 'reason': A high-level explanation of the code's approach.\n"
         "5) 'requiredTokens': A JSON array of 4-6 critical strings (keywords, method names, variable names) that MUST be present in a correct solution for validation.\n"
         "6) 'language': The language identifier (e.g. 'python', 'typescript', 'javascript', 'sql', 'bash').\n"
+        "7) 'tests': ONLY for python, 2-4 lines of plain `assert` statements that call the requested function(s) and pass against your 'answer'. No imports, no I/O. Use null for other languages.\n"
     )
 
     def _parse_response(raw: str) -> List[Question]:
@@ -488,7 +705,10 @@ def call_openrouter(subjects: List[str], types: List[str], count: int, difficult
         return [Question(**item) for item in parsed]
 
     try:
-        raw_content = _groq_complete(prompt, temperature=1.0, max_tokens=8192)
+        route = routing.router.get(routing.generation_route_name(count, types, difficulty))
+        raw_content = _groq_complete(
+            prompt, route, temperature=1.0, max_tokens=routing.generation_token_budget(route, count, types)
+        )
         questions = dedupe_questions(_parse_response(raw_content))
 
         # 🔥 HARD FORCE TYPES (NO MATTER WHAT MODEL RETURNS)
@@ -517,6 +737,10 @@ def call_openrouter(subjects: List[str], types: List[str], count: int, difficult
                 else:
                     q.answer = _strip_code_fences(q.answer)
 
+                q.tests = _strip_code_fences(q.tests) if q.tests and q.language == "python" else None
+            else:
+                q.tests = None
+
         # 🔥 Shuffle only if MCQ
         for q in questions:
             if q.type == "MCQ" and q.options:
@@ -533,14 +757,18 @@ def call_openrouter(subjects: List[str], types: List[str], count: int, difficult
         return fallback_questions(subjects, count, force_type, difficulty)
 
 
-def call_openrouter_topics(pdf_text: str) -> List[str]:
-    """Extract topics from PDF text via Groq (was OpenRouter)."""
-    if not GROQ_API_KEY:
-        return match_topics_from_text(pdf_text)
+TOPIC_LLM_CHUNK_CHARS = int(os.getenv("TOPIC_LLM_CHUNK_CHARS", "8000"))
+TOPIC_LLM_MAX_CHUNKS = int(os.getenv("TOPIC_LLM_MAX_CHUNKS", "6"))
+# In a document too long to read whole, a topic must be reported for at least
+# this share of the sampled chunks to be kept. When every chunk is read, one is enough.
+TOPIC_LLM_VOTE_SHARE = float(os.getenv("TOPIC_LLM_VOTE_SHARE", "0.25"))
+
+_topic_llm_pool = ThreadPoolExecutor(max_workers=TOPIC_LLM_MAX_CHUNKS, thread_name_prefix="topics-llm")
 
-    truncated = pdf_text[:8000]
-    topics_json = json.dumps(ALL_TOPICS)
 
+def _llm_topics_for_chunk(text: str) -> Optional[List[str]]:
+    """Topics the LLM finds in one chunk of text, or None if the call failed."""
+    snapshot = catalog.current()
     prompt = (
         "You are a topic extraction assistant.\n"
         "Identify which topics from the provided list are discussed or relevant.\n\n"
@@ -548,114 +776,316 @@ def call_openrouter_topics(pdf_text: str) -> List[str]:
         "1) ONLY return topics from the list.\n"
         "2) Return ONLY a JSON array of strings.\n"
         "3) Strings must match EXACT spelling/casing from the list.\n\n"
-        f"AVAILABLE TOPICS:\n{topics_json}\n\n"
-        f"DOCUMENT TEXT:\n{truncated}\n"
+        f"AVAILABLE TOPICS:\n{snapshot.topics_json}\n\n"
+        f"DOCUMENT TEXT:\n{text}\n"
     )
 
     try:
-        content = _groq_complete(prompt, temperature=0.1, max_tokens=2048)
+        content = _groq_complete(prompt, routing.router.get("topics"), temperature=0.1, max_tokens=2048)
         content = _strip_code_fences(content.strip())
         topics = json.loads(content)
         if isinstance(topics, list):
-            return [t for t in topics if t in ALL_TOPICS]
+            return [t for t in topics if t in snapshot.topic_set]
     except Exception as e:
         print(f"Groq topic extraction failed: {e}")
+    return None
+
+
+def _chunk_pages(pages: List[str], size: int) -> List[str]:
+    """Pack consecutive pages into chunks of about `size` characters, splitting oversized pages."""
+    chunks: List[str] = []
+    buf: List[str] = []
+    buf_len = 0
+    for page in pages:
+        for i in range(0, len(page), size):
+            part = page[i:i + size]
+            if buf and buf_len + len(part) > size:
+                chunks.append("\n".join(buf))
+                buf, buf_len = [], 0
+            buf.append(part)
+            buf_len += len(part) + 1
+    if buf:
+        chunks.append("\n".join(buf))
+    return chunks
+
+
+def _spread_sample(items: List[str], k: int) -> List[str]:
+    """Up to k items evenly spaced from first to last."""
+    if len(items) <= k:
+        return list(items)
+    if k == 1:
+        return items[:1]
+    return [items[round(i * (len(items) - 1) / (k - 1))] for i in range(k)]
+
+
+def llm_topics_map_reduce(pages: List[str]) -> List[str]:
+    """
+    Ask the LLM about chunks sampled across the whole document, concurrently,
+    and keep the topics enough chunks agree on, most-voted first.
+
+    A short document is read in full, so a topic covered by only one of its
+    chunks (one chapter, say) is still kept; the vote share only filters the
+    topics of documents that had to be sampled.
+    """
+    all_chunks = _chunk_pages(pages, TOPIC_LLM_CHUNK_CHARS)
+    chunks = _spread_sample(all_chunks, TOPIC_LLM_MAX_CHUNKS)
+    if not chunks:
+        return []
+    results = [r for r in _topic_llm_pool.map(_llm_topics_for_chunk, chunks) if r is not None]
+    if not results:
+        return []
+    votes = Counter(t for r in results for t in set(r))
+    sampled = len(chunks) < len(all_chunks)
+    min_votes = max(1, math.ceil(len(results) * TOPIC_LLM_VOTE_SHARE)) if sampled else 1
+    return [t for t, n in sorted(votes.items(), key=lambda kv: (-kv[1], kv[0])) if n >= min_votes]
+
 
-    return match_topics_from_text(pdf_text)
 
+# Total document text sent in the single combined call of a batch, shared between its files.
+TOPIC_BATCH_LLM_CHARS = int(os.getenv("TOPIC_BATCH_LLM_CHARS", "24000"))
+
+
+def llm_topics_for_documents(docs: List[List[str]]) -> Optional[List[List[str]]]:
+    """
+    One LLM call for several documents (each a list of pages), returning topics
+    per document, or None if the call failed. Each document gets an equal share
+    of TOPIC_BATCH_LLM_CHARS, taken as excerpts spread across its pages.
+    """
+    if not docs:
+        return []
+    snapshot = catalog.current()
+    share = max(1000, TOPIC_BATCH_LLM_CHARS // len(docs))
+    sections = []
+    for i, pages in enumerate(docs, 1):
+        excerpts = _spread_sample(_chunk_pages(pages, share // 3), 3)
+        sections.append(f"=== DOCUMENT {i} ===\n" + "\n[...]\n".join(excerpts)[:share])
+
+    prompt = (
+        "You are a topic extraction assistant.\n"
+        "For EACH numbered document below, identify which topics from the provided list are discussed or relevant.\n\n"
+        "RULES:\n"
+        "1) ONLY return topics from the list.\n"
+        '2) Return ONLY a JSON object mapping each document number (as a string) to an array of strings, e.g. {"1": [...], "2": [...]}.\n'
+        "3) Strings must match EXACT spelling/casing from the list.\n\n"
+        f"AVAILABLE TOPICS:\n{snapshot.topics_json}\n\n"
+        "DOCUMENTS:\n" + "\n\n".join(sections) + "\n"
+    )
+
+    try:
+        content = _groq_complete(prompt, routing.router.get("topics"), temperature=0.1, max_tokens=4096)
+        result = json.loads(_strip_code_fences(content.strip()))
+        if isinstance(result, dict):
+            return [
+                [t for t in (result.get(str(i)) or []) if isinstance(t, str) and t in snapshot.topic_set]
+                for i in range(1, len(docs) + 1)
+            ]
+    except Exception as e:
+        print(f"Groq batch topic extraction failed: {e}")
+    return None
 
 # -----------------------------
 # PDF Text Extraction (multiple fallbacks + OCR)
+#
+# Each backend is a page generator, so callers can consume a document page by
+# page and stop early; closing the generator releases the backend's handles.
 # -----------------------------
-def extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
-    try:
-        from pdfminer.high_level import extract_text as pdfminer_extract
-        text = pdfminer_extract(io.BytesIO(pdf_bytes))
-        if text and text.strip():
-            return text.strip()
-    except Exception:
-        pass
+OCR_MAX_PAGES = 8
 
-    try:
-        from PyPDF2 import PdfReader
-        reader = PdfReader(io.BytesIO(pdf_bytes))
-        out = []
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                out.append(page_text)
-        text = "\n".join(out)
-        if text.strip():
-            return text.strip()
-    except Exception:
-        pass
 
+def _pdfminer_pages(pdf_bytes: bytes) -> Iterator[str]:
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    rsrc = PDFResourceManager()
+    buf = io.StringIO()
+    device = TextConverter(rsrc, buf, laparams=LAParams())
+    try:
+        interpreter = PDFPageInterpreter(rsrc, device)
+        for page in PDFPage.get_pages(io.BytesIO(pdf_bytes)):
+            interpreter.process_page(page)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+    finally:
+        device.close()
+
+
+def _pypdf2_pages(pdf_bytes: bytes) -> Iterator[str]:
+    from PyPDF2 import PdfReader
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    for page in reader.pages:
+        yield page.extract_text() or ""
+
+
+def _fitz_pages(pdf_bytes: bytes) -> Iterator[str]:
+    import fitz  # type: ignore
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     try:
-        import fitz  # type: ignore
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        out = []
         for page in doc:
-            out.append(page.get_text())
+            yield page.get_text()
+    finally:
         doc.close()
-        text = "\n".join(out)
-        if text.strip():
-            return text.strip()
-    except Exception:
-        pass
 
-    try:
-        import pdfplumber  # type: ignore
-        out = []
-        with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    out.append(page_text)
-        text = "\n".join(out)
-        if text.strip():
-            return text.strip()
-    except Exception:
-        pass
 
-    try:
-        import fitz  # type: ignore
-        import pytesseract  # type: ignore
-        from PIL import Image  # type: ignore
+def _pdfplumber_pages(pdf_bytes: bytes) -> Iterator[str]:
+    import pdfplumber  # type: ignore
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages:
+            yield page.extract_text() or ""
 
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        out = []
-        max_pages = min(len(doc), 8)
 
-        for i in range(max_pages):
-            page = doc[i]
-            pix = page.get_pixmap(dpi=200)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            ocr_text = pytesseract.image_to_string(img)
-            if ocr_text and ocr_text.strip():
-                out.append(ocr_text)
+def _ocr_pages(pdf_bytes: bytes) -> Iterator[str]:
+    import fitz  # type: ignore
+    import pytesseract  # type: ignore
+    from PIL import Image  # type: ignore
 
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        for i in range(min(len(doc), OCR_MAX_PAGES)):
+            pix = doc[i].get_pixmap(dpi=200)
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            yield pytesseract.image_to_string(img)
+    finally:
         doc.close()
 
-        text = "\n".join(out)
-        if text.strip():
-            return text.strip()
-    except Exception as e:
-        print(f"OCR extraction failed: {e}")
 
-    return ""
+_PDF_PAGE_BACKENDS = (_pdfminer_pages, _pypdf2_pages, _fitz_pages, _pdfplumber_pages, _ocr_pages)
+
+
+def iter_pdf_pages(pdf_bytes: bytes) -> Iterator[str]:
+    """
+    Yield the text of each non-blank page using the first backend that finds any text.
+
+    A backend that fails or finds nothing hands over to the next one. Once a
+    backend has yielded text it is committed to: a later error just ends the
+    stream, since restarting with another backend would repeat pages.
+    """
+    for backend in _PDF_PAGE_BACKENDS:
+        produced = False
+        try:
+            for text in backend(pdf_bytes):
+                if text and text.strip():
+                    produced = True
+                    yield text
+        except Exception as e:
+            if backend is _ocr_pages:
+                print(f"OCR extraction failed: {e}")
+            elif produced:
+                print(f"PDF extraction stopped early ({backend.__name__}): {e}")
+        if produced:
+            return
+
+
+def extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
+    return "\n".join(iter_pdf_pages(pdf_bytes)).strip()
 
 
 # -----------------------------
 # Routes
 # -----------------------------
 @app.get("/api/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
+# Short revalidation for /api/catalog; ?v=<version> URLs never change and are cached for a year.
+CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", "3600"))
+_CATALOG_ENCODINGS = ("br", "gzip", "identity")
+
+
+def _pick_encoding(accept_encoding: str, available: Dict[str, bytes]) -> str:
+    """Best of br > gzip > identity that the client accepts (q > 0) and we have."""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    for encoding in _CATALOG_ENCODINGS:
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def _etag_matches(if_none_match: Optional[str], version: str) -> bool:
+    # The body only differs by encoding, so any tag carrying the version matches.
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        tag = tag[2:] if tag.startswith("W/") else tag
+        if tag.strip('"').split("-", 1)[0] == version:
+            return True
+    return False
+
+
+@app.get("/api/catalog")
+async def get_catalog(request: Request, v: Optional[str] = None):
+    """The topic catalog, serialised and compressed once per catalog version."""
+    snapshot = catalog.current()
+    encoding = _pick_encoding(request.headers.get("accept-encoding", ""), snapshot.encoded)
+    headers = {
+        "ETag": f'"{snapshot.version}"' if encoding == "identity" else f'"{snapshot.version}-{encoding}"',
+        "Cache-Control": (
+            "public, max-age=31536000, immutable" if v == snapshot.version
+            else f"public, max-age={CATALOG_MAX_AGE}"
+        ),
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request.headers.get("if-none-match"), snapshot.version):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(snapshot.encoded[encoding], media_type="application/json", headers=headers)
+
+
+def _scope_for_email(email: str) -> Optional[str]:
+    # A short session of its own: the request goes on to wait on the LLM or PDF lanes.
+    db = SessionLocal()
+    try:
+        row = db.query(models.User.id, models.User.organization).filter(models.User.email == email).first()
+    finally:
+        db.close()
+    return retrieval.scope_for(row.id, row.organization) if row else None
+
+
+async def _retrieval_scope(token: Optional[str] = Depends(oauth2_scheme_optional)) -> Optional[str]:
+    """The signed-in user's retrieval scope (see retrieval.scope_for); None for anonymous calls."""
+    if not token:
+        return None
+    try:
+        email = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+    if not email:
+        return None
+    return await lanes.db.run(_scope_for_email, email)
+
+
 @app.post("/api/generate")
-def generate_questions(req: GenerateRequest):
-    if not req.subjects:
+async def generate_questions(req: GenerateRequest, scope: Optional[str] = Depends(_retrieval_scope)):
+    questions = await lanes.llm.run(_generate_questions, req, scope)
+    # Checked after the llm lane is released: sandbox runs must not hold its slots.
+    await _drop_failing_tests(questions)
+    payload = [q.dict() for q in questions]
+    return {"questions": payload, "set_token": grading.sign_question_set(payload, req.difficulty or "Bachelor")}
+
+
+def _generate_questions(req: GenerateRequest, scope: Optional[str] = None) -> List[Question]:
+    # Free-text subjects ("kubernets", "next js 14") take the catalog's spelling; other subjects are kept as written.
+    subjects = catalog.canonicalize_subjects(req.subjects)
+    if not subjects:
         raise HTTPException(status_code=400, detail="subjects must not be empty")
 
     count = req.count or 5
@@ -663,44 +1093,197 @@ def generate_questions(req: GenerateRequest):
 
     print("REQUEST TYPES:", types)
 
-    questions = call_openrouter(req.subjects, types, count, req.difficulty)
+    # Signed-in users get scenarios grounded in their own (or their organisation's) uploaded documents.
+    context = retrieval.context_for(scope, subjects)
+    return call_openrouter(subjects, types, count, req.difficulty, context=context)
 
-    return {"questions": [q.dict() for q in questions]}
+_NO_TEXT_DETAIL = (
+    "Could not extract text from the PDF. "
+    "If it's scanned, enable OCR: brew install tesseract; pip install pymupdf pillow pytesseract."
+)
 
-@app.post("/api/extract-topics", response_model=ExtractTopicsResponse)
-async def extract_topics(file: UploadFile = File(...)):
+
+def scan_pdf_topics(content: bytes) -> Tuple[List[str], List[str]]:
+    """
+    Matcher stage: stream the PDF page by page into the topic matcher and stop
+    reading once coverage saturates. Returns (topics, pages read).
+    """
+    acc = TopicAccumulator()
+    pages: List[str] = []
+    stream = iter_pdf_pages(content)
+    try:
+        for page in stream:
+            pages.append(page)
+            acc.feed(page)
+            if acc.saturated:
+                break
+    finally:
+        stream.close()
+
+    if not pages:
+        raise HTTPException(status_code=422, detail=_NO_TEXT_DETAIL)
+    return acc.topics, pages
+
+
+def _needs_llm_topics(matched: List[str]) -> bool:
+    return len(matched) < MIN_MATCHED_TOPICS and bool(GROQ_API_KEY)
+
+
+def _merge_llm_topics(matched: List[str], pages: List[str]) -> List[str]:
+    """
+    Matcher topics plus the LLM's, mapped over chunks sampled from the whole
+    document rather than just its beginning. Waits on the network: run it in
+    the llm lane, never while holding a PDF slot.
+    """
+    return sorted(set(matched) | set(llm_topics_map_reduce(pages)))
+
+
+def extract_topics_from_pdf(content: bytes) -> List[str]:
+    """Both stages inline, for scripts and the benchmark; the endpoints split them across lanes."""
+    matched, pages = scan_pdf_topics(content)
+    return _merge_llm_topics(matched, pages) if _needs_llm_topics(matched) else matched
+
+
+async def _read_pdf_upload(file: UploadFile) -> bytes:
     if not file.filename or not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files supported")
 
     content = await file.read()
     if not content:
         raise HTTPException(status_code=400, detail="Empty file")
+    return content
 
-    text = extract_text_from_pdf_bytes(content)
-    if not text.strip():
-        raise HTTPException(
-            status_code=422,
-            detail=(
-                "Could not extract text from the PDF. "
-                "If it's scanned, enable OCR: brew install tesseract; pip install pymupdf pillow pytesseract."
-            ),
-        )
 
-    matched = match_topics_from_text(text)
+@app.post("/api/extract-topics", response_model=ExtractTopicsResponse)
+async def extract_topics(file: UploadFile = File(...), scope: Optional[str] = Depends(_retrieval_scope)):
+    content = await _read_pdf_upload(file)
+    # The scan is CPU work for the pdf lane; if it falls short, the LLM calls go to the llm lane.
+    topics, pages = await lanes.pdf.run(scan_pdf_topics, content)
+    if _needs_llm_topics(topics):
+        topics = await lanes.llm.run(_merge_llm_topics, topics, pages)
+    retrieval.schedule_index(scope, file.filename, content, iter_pdf_pages)
+    return {"topics": topics}
+
 
-    if len(matched) < 5 and GROQ_API_KEY:
-        llm_topics = call_openrouter_topics(text)
-        matched = sorted(set(matched) | set(llm_topics))
+# -----------------------------
+# Batch topic extraction
+#
+# PDF parsing is CPU-bound Python, so the files of a batch are scanned in a
+# process pool (spawned on first use) instead of threads sharing the GIL.
+# Files the matcher leaves short of topics then share a single LLM call.
+# -----------------------------
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "50"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
 
-    if not matched and GROQ_API_KEY:
-        matched = call_openrouter_topics(text)
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
 
-    return {"topics": matched}
+
+def _get_pdf_pool() -> Optional[ProcessPoolExecutor]:
+    global _pdf_pool
+    if PDF_WORKERS <= 0:
+        return None
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # Spawn, not fork: this process is multi-threaded.
+            _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_pool
+
+
+def _discard_pdf_pool(broken: Optional[ProcessPoolExecutor] = None) -> None:
+    """Shut the pool down; with `broken`, only if it is still the current one (the next batch respawns it)."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None or (broken is not None and _pdf_pool is not broken):
+            return
+        pool, _pdf_pool = _pdf_pool, None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _scan_pdf_for_batch(content: bytes) -> dict:
+    """Runs in a PDF worker: matcher topics, plus the pages if the LLM will need them."""
+    try:
+        topics, pages = scan_pdf_topics(content)
+    except HTTPException as e:
+        return {"topics": [], "pages": None, "error": e.detail}
+    return {"topics": topics, "pages": pages if len(topics) < MIN_MATCHED_TOPICS else None, "error": None}
+
+
+async def _scan_pdfs(contents: List[bytes]) -> List[dict]:
+    pool = _get_pdf_pool()
+    if pool is None:
+        calls = [lanes.pdf.run(_scan_pdf_for_batch, c) for c in contents]
+    else:
+        loop = asyncio.get_running_loop()
+        calls = [loop.run_in_executor(pool, _scan_pdf_for_batch, c) for c in contents]
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    scans = []
+    for r in results:
+        if isinstance(r, BrokenProcessPool):
+            _discard_pdf_pool(pool)
+            r = {"topics": [], "pages": None, "error": "PDF worker crashed while reading this file"}
+        elif isinstance(r, BaseException):
+            print(f"Batch PDF scan failed: {r}")
+            r = {"topics": [], "pages": None, "error": "Could not read this PDF"}
+        scans.append(r)
+    return scans
+
+
+@app.post("/api/extract-topics/batch", response_model=BatchExtractTopicsResponse)
+async def extract_topics_batch(files: List[UploadFile] = File(...), scope: Optional[str] = Depends(_retrieval_scope)):
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} files per batch")
+    # A file that can't be read (wrong type, empty) fails on its own, like a failed scan.
+    contents: List[Optional[bytes]] = []
+    read_errors: Dict[int, str] = {}
+    for i, f in enumerate(files):
+        try:
+            contents.append(await _read_pdf_upload(f))
+        except HTTPException as e:
+            contents.append(None)
+            read_errors[i] = e.detail
+
+    # Identical files in one batch are scanned once.
+    unique = list(dict.fromkeys(c for c in contents if c is not None))
+    scans = dict(zip(unique, await _scan_pdfs(unique)))
+
+    leftovers = [c for c in unique if scans[c]["pages"]]
+    if leftovers and GROQ_API_KEY:
+        llm_topics = await lanes.llm.run(llm_topics_for_documents, [scans[c]["pages"] for c in leftovers])
+        for c, extra in zip(leftovers, llm_topics or []):
+            scans[c]["topics"] = sorted(set(scans[c]["topics"]) | set(extra))
+
+    results = [
+        FileTopics(filename=f.filename or "", topics=[], error=read_errors[i]) if c is None
+        else FileTopics(filename=f.filename, topics=scans[c]["topics"], error=scans[c]["error"])
+        for i, (f, c) in enumerate(zip(files, contents))
+    ]
+    # Each distinct file is indexed once, under the first name it was uploaded with.
+    names: Dict[bytes, str] = {}
+    for f, c in zip(files, contents):
+        if c is not None:
+            names.setdefault(c, f.filename)
+    for c in unique:
+        if scans[c]["error"] is None:
+            retrieval.schedule_index(scope, names[c], c, iter_pdf_pages)
+    frequency = Counter(t for r in results for t in r.topics)
+    return {
+        "files": results,
+        "topics": [
+            TopicFrequency(topic=t, documents=n)
+            for t, n in sorted(frequency.items(), key=lambda kv: (-kv[1], kv[0]))
+        ],
+    }
 
 # -----------------------------
 # Authentication & User Routes
 # -----------------------------
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def _user_by_email(db: Session, email: str) -> Optional[models.User]:
+    return db.query(models.User).filter(models.User.email == email).first()
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -715,14 +1298,36 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
+    user = await lanes.db.run(_user_by_email, db, token_data.email)
     if user is None:
         raise credentials_exception
     return user
 
 
+async def get_optional_user(token: Optional[str] = Depends(oauth2_scheme_optional), db: Session = Depends(get_db)) -> Optional[models.User]:
+    if not token:
+        return None
+    try:
+        return await get_current_user(token, db)
+    except HTTPException:
+        return None
+
+
+# Admins are flagged in the database with admins.py. Email addresses aren't verified
+# at registration, so an address alone must never grant access.
+async def get_admin_user(current_user: models.User = Depends(get_current_user)) -> models.User:
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+
 @app.post("/api/auth/register", response_model=schemas.User)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    # bcrypt is deliberately slow, so it gets its own lane.
+    return await lanes.hashing.run(_register_user, user, db)
+
+
+def _register_user(user: schemas.UserCreate, db: Session) -> schemas.User:
     print(f"Registering user: {user.email}")
     try:
         db_user = db.query(models.User).filter(models.User.email == user.email).first()
@@ -740,7 +1345,8 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         db.commit()
         db.refresh(new_user)
         print(f"User {user.email} registered successfully")
-        return new_user
+        # Serialise here, in the lane, rather than on the event loop.
+        return schemas.User.model_validate(new_user)
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
@@ -749,7 +1355,11 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @app.post("/api/auth/login", response_model=schemas.Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    return await lanes.hashing.run(_login, form_data, db)
+
+
+def _login(form_data: OAuth2PasswordRequestForm, db: Session) -> dict:
     user = db.query(models.User).filter(models.User.email == form_data.username).first()
     if not user or not auth.verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
@@ -763,16 +1373,41 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
 
 
 @app.get("/api/users/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
-    return current_user
+async def read_users_me(current_user: models.User = Depends(get_current_user)):
+    return await lanes.db.run(schemas.User.model_validate, current_user)
+
+
+EXP_BY_DIFFICULTY: Dict[str, int] = {
+    "Middle School": 10,
+    "High School": 25,
+    "Bachelor": 50,
+    "Master": 100,
+    "PHD": 150,
+    "Veteran": 250
+}
+
+# Off by default: a client-reported {"status": "Success"} can be forged, so EXP
+# comes from /api/grade with record=true. Set ALLOW_UNGRADED_EXP=1 only while a
+# client still reports results through /api/users/me/activities alone.
+ALLOW_UNGRADED_EXP = os.getenv("ALLOW_UNGRADED_EXP", "0") == "1"
+
+
+def _grant_exp(db: Session, user: models.User, difficulty: Optional[str]) -> None:
+    # Use difficulty passed from frontend, default to Bachelor
+    user.exp = (user.exp or 0) + EXP_BY_DIFFICULTY.get(difficulty or "Bachelor", 50)
+    db.add(user)
 
 
 @app.post("/api/users/me/activities", response_model=schemas.Activity)
-def create_user_activity(
+async def create_user_activity(
     activity: schemas.ActivityCreate, 
     db: Session = Depends(get_db), 
     current_user: models.User = Depends(get_current_user)
 ):
+    return await lanes.db.run(_create_user_activity, activity, db, current_user)
+
+
+def _create_user_activity(activity: schemas.ActivityCreate, db: Session, current_user: models.User) -> models.UserActivity:
     # 1. Save Actvity
     db_activity = models.UserActivity(
         user_id=current_user.id,
@@ -782,58 +1417,80 @@ def create_user_activity(
     )
     db.add(db_activity)
 
-    # 2. Grant EXP if successful
-    if activity.status == "Success":
-        difficulty_multipliers = {
-            "Middle School": 10,
-            "High School": 25,
-            "Bachelor": 50,
-            "Master": 100,
-            "PHD": 150,
-            "Veteran": 250
-        }
-        # Use difficulty passed from frontend, default to Bachelor
-        base_exp = difficulty_multipliers.get(getattr(activity, "difficulty", "Bachelor"), 50)
-        
-        current_user.exp += base_exp
-        db.add(current_user)
+    # 2. Grant EXP if successful. Client-asserted results only earn EXP while
+    # ALLOW_UNGRADED_EXP is on; /api/grade with record=true grants it from server grades.
+    if activity.status == "Success" and ALLOW_UNGRADED_EXP:
+        _grant_exp(db, current_user, activity.difficulty)
 
     db.commit()
     db.refresh(db_activity)
     return db_activity
 
 @app.get("/api/users/me/activities", response_model=List[schemas.Activity])
-def read_user_activities(
+async def read_user_activities(
     skip: int = 0, limit: int = 20, 
     db: Session = Depends(get_db), 
     current_user: models.User = Depends(get_current_user)
 ):
-    activities = db.query(models.UserActivity).filter(
-        models.UserActivity.user_id == current_user.id
-    ).order_by(models.UserActivity.timestamp.desc()).offset(skip).limit(limit).all()
-    return activities
+    def query():
+        return db.query(models.UserActivity).filter(
+            models.UserActivity.user_id == current_user.id
+        ).order_by(models.UserActivity.timestamp.desc()).offset(skip).limit(limit).all()
 
-@app.get("/api/users/me/plan", response_model=schemas.PlanResponse)
-def generate_user_plan(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
-    if not _groq_client:
+    return await lanes.db.run(query)
+
+
+# Activities (raw, then compacted daily totals) included in the plan prompt.
+PLAN_CONTEXT_ITEMS = 20
+
+
+def build_user_plan(db: Session, user: models.User) -> str:
+    try:
+        return _plan_markdown(db, user)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("Error generating plan:", e)
+        raise HTTPException(status_code=500, detail="Failed to generate plan securely")
+
+
+def _plan_markdown(db: Session, user: models.User) -> str:
+    # LLM errors propagate, so the plan job can retry them; build_user_plan turns them into a 500.
+    client = get_groq_client()
+    if not client:
         raise HTTPException(status_code=500, detail="Groq API key not configured")
 
     # Fetch recent activities
     activities = db.query(models.UserActivity).filter(
-        models.UserActivity.user_id == current_user.id
-    ).order_by(models.UserActivity.timestamp.desc()).limit(20).all()
+        models.UserActivity.user_id == user.id
+    ).order_by(models.UserActivity.timestamp.desc()).limit(PLAN_CONTEXT_ITEMS).all()
+
+    # Older attempts may have been compacted by retention.py; fill up with their daily totals.
+    summaries = []
+    if len(activities) < PLAN_CONTEXT_ITEMS:
+        summaries = db.query(models.ActivityDailySummary).filter(
+            models.ActivityDailySummary.user_id == user.id
+        ).order_by(models.ActivityDailySummary.day.desc()).limit(PLAN_CONTEXT_ITEMS - len(activities)).all()
 
     # Build prompt context
-    if not activities:
+    if not activities and not summaries:
         context_str = "User is brand new and has not completed any coding paths yet."
     else:
-        log_lines = []
-        for a in activities:
-            log_lines.append(f"- Topic: {a.topic} | Result: {a.status} | Time: {a.timestamp.strftime('%Y-%m-%d')}")
-        context_str = "User's recent activity log:\n" + "\n".join(log_lines)
+        sections = []
+        if activities:
+            log_lines = []
+            for a in activities:
+                log_lines.append(f"- Topic: {a.topic} | Result: {a.status} | Time: {a.timestamp.strftime('%Y-%m-%d')}")
+            sections.append("User's recent activity log:\n" + "\n".join(log_lines))
+        if summaries:
+            sections.append("Earlier activity (daily totals):\n" + "\n".join(
+                f"- Topic: {d.topic} | Success: {d.successes}, Partial: {d.partials}, Failed: {d.failures} | Day: {d.day.isoformat()}"
+                for d in summaries
+            ))
+        context_str = "\n\n".join(sections)
+
+    # End the read transaction so its pooled connection isn't held through the LLM call.
+    db.rollback()
 
     prompt = f"""
 You are an expert technical mentor and software engineering coach.
@@ -846,42 +1503,338 @@ If they have no activity, provide a generic 3-day full-stack web development cra
 Use strict GitHub-flavored Markdown. Include headers, bullet points, and brief encouraging advice. Do not output anything other than the markdown plan.
 """
 
-    try:
-        response = _groq_client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama-3.1-8b-instant",
-            temperature=0.4,
-            max_tokens=800,
-        )
-        plan = response.choices[0].message.content or "Could not generate plan."
-        return {"plan_markdown": plan}
-    except Exception as e:
-        print("Error generating plan:", e)
-        raise HTTPException(status_code=500, detail="Failed to generate plan securely")
+    return _groq_complete(prompt, routing.router.get("plan"), temperature=0.4) or "Could not generate plan."
+
+
+@app.get("/api/users/me/plan", response_model=schemas.PlanResponse)
+async def generate_user_plan(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    return {"plan_markdown": await lanes.llm.run(build_user_plan, db, current_user)}
 
 
 @app.post("/api/users/me/photo")
 async def upload_profile_photo(
+    request: Request,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    if not file.content_type.startswith("image/"):
+    if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File provided is not an image")
-    
-    # Save file to disk
-    file_ext = file.filename.split(".")[-1]
-    filename = f"user_{current_user.id}_{int(datetime.utcnow().timestamp())}.{file_ext}"
-    file_path = os.path.join("uploads", filename)
-    
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
-        
+
+    # Stream to disk under its content hash; identical uploads share one file.
+    # The upload is decoded first, and its real format picks the extension.
+    digest, rel_path = await lanes.media.run(photos.store_photo, file.file, UPLOADS_DIR)
+
+    # Only thumbnails that already exist (a repeat upload) are returned; new ones
+    # are generated in the background and appear at photos.thumbnail_path() later.
+    existing = photos.existing_thumbnails(UPLOADS_DIR, digest)
+    if len(existing) < len(photos.THUMBNAIL_SIZES):
+        photos.schedule_thumbnails(UPLOADS_DIR, rel_path, digest)
+
+    photo_url = str(request.url_for("uploads", path=rel_path))
+    thumbnails = {str(size): str(request.url_for("uploads", path=path)) for size, path in existing.items()}
+
     # Update DB
-    current_user.profile_picture = photo_url
-    db.add(current_user)
+    def save():
+        current_user.profile_picture = photo_url
+        db.add(current_user)
+        db.commit()
+        db.refresh(current_user)
+
+    await lanes.db.run(save)
+
+    return {"profile_picture": photo_url, "thumbnails": thumbnails}
+
+
+# -----------------------------
+# Background Jobs
+# -----------------------------
+def _run_extract_topics_job(job: models.Job, db: Session):
+    # Scan here; the LLM fallback continues on the extract_topics_llm workers.
+    topics, pages = scan_pdf_topics(job.input_blob or b"")
+    if _needs_llm_topics(topics):
+        return jobs.Handoff("extract_topics_llm", json.dumps({"topics": topics, "pages": pages}).encode())
+    return {"topics": topics}
+
+
+def _run_extract_topics_llm_job(job: models.Job, db: Session) -> dict:
+    scan = json.loads(job.input_blob or b"{}")
+    return {"topics": _merge_llm_topics(scan.get("topics") or [], scan.get("pages") or [])}
+
+
+def _run_user_plan_job(job: models.Job, db: Session) -> dict:
+    user = db.get(models.User, job.user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"plan_markdown": _plan_markdown(db, user)}
+
+
+jobs.queue.register("extract_topics", _run_extract_topics_job, concurrency=2)
+jobs.queue.register("extract_topics_llm", _run_extract_topics_llm_job, concurrency=4, stage_of="extract_topics")
+jobs.queue.register("user_plan", _run_user_plan_job, concurrency=4)
+
+
+@app.post("/api/jobs/extract-topics", response_model=schemas.JobStatus, status_code=status.HTTP_202_ACCEPTED)
+async def submit_extract_topics_job(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    scope: Optional[str] = Depends(_retrieval_scope),
+):
+    content = await _read_pdf_upload(file)
+    job = await lanes.db.run(jobs.queue.submit, db, "extract_topics", {}, blob=content)
+    retrieval.schedule_index(scope, file.filename, content, iter_pdf_pages)
+    return jobs.to_status(job)
+
+
+@app.post("/api/jobs/plan", response_model=schemas.JobStatus, status_code=status.HTTP_202_ACCEPTED)
+async def submit_user_plan_job(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    return await lanes.db.run(_submit_user_plan_job, db, current_user)
+
+
+def _submit_user_plan_job(db: Session, current_user: models.User) -> dict:
+    # Keyed on the newest activity so a new attempt invalidates the cached plan.
+    latest = db.query(func.max(models.UserActivity.id)).filter(
+        models.UserActivity.user_id == current_user.id
+    ).scalar()
+    job = jobs.queue.submit(
+        db, "user_plan", {"user_id": current_user.id, "latest_activity_id": latest}, user_id=current_user.id
+    )
+    return jobs.to_status(job)
+
+
+@app.get("/api/jobs/{job_id}", response_model=schemas.JobStatus)
+async def read_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user)
+):
+    job = await lanes.db.run(db.get, models.Job, job_id)
+    # Per-user jobs are only visible to their owner; 404 rather than 403 so ids don't leak.
+    if job is None or (job.user_id is not None and (current_user is None or current_user.id != job.user_id)):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.to_status(job)
+
+
+# -----------------------------
+# Grading
+# -----------------------------
+MAX_GRADE_ANSWERS = int(os.getenv("MAX_GRADE_ANSWERS", "50000"))
+MAX_RECORDED_ANSWERS = 500
+
+
+@app.post("/api/grade", response_model=GradeResponse)
+async def grade_answers(
+    req: GradeRequest,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.User] = Depends(get_optional_user)
+):
+    return await lanes.sandbox.run(_grade_answers, req, db, current_user)
+
+
+def _grade_answers(req: GradeRequest, db: Session, current_user: Optional[models.User]) -> dict:
+    if len(req.answers) > MAX_GRADE_ANSWERS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_GRADE_ANSWERS} answers per request")
+
+    questions = [q.dict() for q in req.questions]
+    difficulty = req.difficulty or "Bachelor"
+    verified = grading.verify_question_set(questions, difficulty, req.set_token)
+    if req.record:
+        if len(req.answers) > MAX_RECORDED_ANSWERS:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_RECORDED_ANSWERS} answers can be recorded per request")
+        if current_user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Login required to record results")
+        if not verified:
+            raise HTTPException(status_code=403, detail="Question set was not issued by this server")
+
+    compiled = grading.compile_question_set(questions)
+    # Only tests this server wrote are executed, and only for signed-in users.
+    execute = verified and current_user is not None and sandbox.pool.enabled
+    results: List[dict] = []
+    runs = []
+    for item in req.answers:
+        if not 0 <= item.question < len(compiled):
+            results.append({"question": item.question, "score": 0.0, "passed": False, "status": "Failed",
+                            "error": "question index out of range"})
+            continue
+        cq = compiled[item.question]
+        score, passed, matched, missing = cq.grade(item.answer, item.selectedIndex)
+        result = {"question": item.question, "score": score, "passed": passed,
+                  "status": grading.status_for(score, passed), "matched": matched, "missing": missing}
+        results.append(result)
+        if cq.tests and execute:
+            try:
+                runs.append((result, sandbox.pool.submit(item.answer or "", cq.tests)))
+            except sandbox.SandboxUnavailable:
+                pass
+
+    if runs:
+        # Don't hold a pooled DB connection while waiting on the sandbox.
+        db.rollback()
+
+    # Executed tests are authoritative over the token heuristic when available.
+    for result, fut in runs:
+        try:
+            execution = fut.result(timeout=sandbox.SANDBOX_WALL_SECONDS * 4 + 5)
+        except Exception as e:
+            result["error"] = f"execution unavailable: {e}"
+            continue
+        result["execution"] = execution
+        result["passed"] = execution["passed"]
+        result["score"] = 1.0 if execution["passed"] else min(result["score"], 0.5)
+        result["status"] = grading.status_for(result["score"], result["passed"])
+
+    if req.record and results:
+        _record_graded_activities(db, current_user, compiled, results, difficulty)
+
+    n_passed = sum(1 for r in results if r["passed"])
+    return {
+        "verified": verified,
+        "total": len(results),
+        "passed": n_passed,
+        "mean_score": (sum(r["score"] for r in results) / len(results)) if results else 0.0,
+        "results": results,
+    }
+
+
+def _record_graded_activities(db: Session, user: models.User, compiled, results: List[dict], difficulty: str) -> None:
+    # EXP is granted once per question: a question this user already passed doesn't pay out again.
+    graded = [(compiled[r["question"]], r) for r in results if r.get("error") is None]
+    titles = {cq.title for cq, _ in graded}
+    # Passes older than the retention age live in the archive table.
+    already = {
+        (topic, title)
+        for table in (models.UserActivity, models.UserActivityArchive)
+        for topic, title in db.query(table.topic, table.title).filter(
+            table.user_id == user.id,
+            table.status == "Success",
+            table.title.in_(titles),
+        )
+    }
+    for cq, r in graded:
+        db.add(models.UserActivity(user_id=user.id, topic=cq.topic, title=cq.title, status=r["status"]))
+        if r["status"] == "Success" and (cq.topic, cq.title) not in already:
+            _grant_exp(db, user, difficulty)
+            already.add((cq.topic, cq.title))
     db.commit()
-    db.refresh(current_user)
-    
-    return {"profile_picture": photo_url}
\ No newline at end of file
+
+
+# -----------------------------
+# Admin
+# -----------------------------
+@app.get("/api/admin/routing")
+async def routing_stats(admin: models.User = Depends(get_admin_user)):
+    """Per-route model settings, SLOs and the latency observed over the current window."""
+    return routing.router.stats()
+
+
+@app.get("/api/admin/lanes")
+async def lane_stats(admin: models.User = Depends(get_admin_user)):
+    """Occupancy, saturation, queue wait and rejections for each execution lane."""
+    return lanes.stats()
+
+
+class ProfilingToggle(BaseModel):
+    enabled: bool
+    # Switch off again after this many profiled requests; omit to keep profiling until disabled.
+    limit: Optional[int] = None
+
+
+@app.get("/api/admin/profiling")
+async def profiling_state(admin: models.User = Depends(get_admin_user)):
+    return profiling.toggle.state()
+
+
+@app.post("/api/admin/profiling")
+async def set_profiling(req: ProfilingToggle, admin: models.User = Depends(get_admin_user)):
+    """Profile requests to PROFILE_PATHS (generation, topic extraction) until switched off or `limit` is used up."""
+    if req.limit is not None and req.limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    profiling.toggle.set(req.enabled, req.limit)
+    return profiling.toggle.state()
+
+
+@app.get("/api/admin/profiles")
+async def list_profiles(limit: int = 50, admin: models.User = Depends(get_admin_user)):
+    """Recent request profiles, newest first."""
+    return await lanes.db.run(profiling.list_profiles, max(1, min(limit, profiling.PROFILE_KEEP or limit)))
+
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, admin: models.User = Depends(get_admin_user)):
+    """Folded stacks for one profile; feed to flamegraph.pl or drop into speedscope."""
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
+
+
+class OrganizationAssignment(BaseModel):
+    # Null removes the user from their organisation; their uploads become private again.
+    organization: Optional[str] = None
+
+
+def _set_organization(db: Session, user_id: int, organization: Optional[str]) -> dict:
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.organization = (organization or "").strip() or None
+    db.commit()
+    return {"id": user.id, "email": user.email, "organization": user.organization}
+
+
+@app.put("/api/admin/users/{user_id}/organization")
+async def set_user_organization(
+    user_id: int,
+    req: OrganizationAssignment,
+    db: Session = Depends(get_db),
+    admin: models.User = Depends(get_admin_user),
+):
+    """Assign a user to an organisation; members share the documents they upload for question grounding."""
+    return await lanes.db.run(_set_organization, db, user_id, req.organization)
+
+
+def _export_response(body, fmt: str, name: str) -> StreamingResponse:
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return StreamingResponse(
+        body,
+        media_type=export.FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}-{stamp}.{fmt}"'},
+    )
+
+
+def _check_export_format(fmt: str) -> None:
+    if fmt not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(export.FORMATS)}")
+
+
+@app.get("/api/admin/export/activities")
+async def export_activities(
+    fmt: str = Query("ndjson", alias="format"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    topic: Optional[str] = None,
+    status: Optional[str] = None,
+    include_archive: bool = False,
+    admin: models.User = Depends(get_admin_user),
+):
+    """
+    Stream activities with each user's email, name and EXP as NDJSON or CSV.
+    `start` is inclusive and `end` exclusive; `include_archive` adds compacted rows.
+    """
+    _check_export_format(fmt)
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return _export_response(export.activities(fmt, start, end, topic, status, include_archive), fmt, "activities")
+
+
+@app.get("/api/admin/export/users")
+async def export_users(fmt: str = Query("ndjson", alias="format"), admin: models.User = Depends(get_admin_user)):
+    """Stream every user's EXP as NDJSON or CSV."""
+    _check_export_format(fmt)
+    return _export_response(export.users(fmt), fmt, "users")
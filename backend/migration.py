@@ -3,10 +3,15 @@ load_dotenv()
 
 from database import engine, SessionLocal
 from sqlalchemy import text
+import models
 
 def run_migration():
     print(f"Starting database migration on {engine.url}...")
-    
+
+    # Create any missing tables first; workers no longer do this at boot.
+    models.Base.metadata.create_all(bind=engine)
+    print("Ensured all tables exist.")
+
     with engine.begin() as conn:
         try:
             conn.execute(text("ALTER TABLE users ADD COLUMN exp INTEGER DEFAULT 0;"))
@@ -26,7 +31,65 @@ def run_migration():
                 print("'profile_picture' column already exists, skipping.")
             else:
                 print(f"Error adding 'profile_picture' column: {e}")
-                
+
+    with engine.begin() as conn:
+        try:
+            conn.execute(text("ALTER TABLE users ADD COLUMN organization VARCHAR;"))
+            print("Successfully added 'organization' column to users table.")
+        except Exception as e:
+            if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
+                print("'organization' column already exists, skipping.")
+            else:
+                print(f"Error adding 'organization' column: {e}")
+
+    with engine.begin() as conn:
+        try:
+            conn.execute(text("ALTER TABLE users ADD COLUMN is_admin BOOLEAN NOT NULL DEFAULT FALSE;"))
+            print("Successfully added 'is_admin' column to users table.")
+        except Exception as e:
+            if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
+                print("'is_admin' column already exists, skipping.")
+            else:
+                print(f"Error adding 'is_admin' column: {e}")
+
+    with engine.begin() as conn:
+        try:
+            conn.execute(text("ALTER TABLE jobs ADD COLUMN heartbeat_at TIMESTAMP;"))
+            print("Successfully added 'heartbeat_at' column to jobs table.")
+        except Exception as e:
+            if "already exists" in str(e).lower() or "duplicate column" in str(e).lower():
+                print("'heartbeat_at' column already exists, skipping.")
+            else:
+                print(f"Error adding 'heartbeat_at' column: {e}")
+
+    # Job dedupe keys become unique. Older duplicates (earlier failed attempts) keep
+    # their rows but give up the key, so the newest job for each input owns it.
+    with engine.begin() as conn:
+        try:
+            conn.execute(text(
+                "UPDATE jobs SET dedupe_key = NULL WHERE dedupe_key IS NOT NULL AND EXISTS ("
+                "SELECT 1 FROM jobs AS newer WHERE newer.dedupe_key = jobs.dedupe_key "
+                "AND (newer.created_at > jobs.created_at OR (newer.created_at = jobs.created_at AND newer.id > jobs.id)));"
+            ))
+            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_jobs_dedupe_key ON jobs (dedupe_key);"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_jobs_dedupe_key;"))
+            print("Ensured unique 'uq_jobs_dedupe_key' index on jobs.")
+        except Exception as e:
+            print(f"Error creating unique job dedupe index: {e}")
+
+    # Composite index for the per-user, newest-first activity reads. On PostgreSQL it's
+    # built CONCURRENTLY (outside a transaction) so a large table stays writable meanwhile.
+    concurrently = "" if engine.dialect.name == "sqlite" else "CONCURRENTLY "
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        try:
+            conn.execute(text(
+                f"CREATE INDEX {concurrently}IF NOT EXISTS ix_user_activities_user_timestamp "
+                "ON user_activities (user_id, timestamp);"
+            ))
+            print("Ensured 'ix_user_activities_user_timestamp' index on user_activities.")
+        except Exception as e:
+            print(f"Error creating activity index: {e}")
+
     print("Migration complete.")
 
 if __name__ == "__main__":
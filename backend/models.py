@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, Date, DateTime, ForeignKey, Text, LargeBinary, Index, UniqueConstraint
+from sqlalchemy.sql import false
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -12,12 +13,18 @@ class User(Base):
     hashed_password = Column(String)
     exp = Column(Integer, default=0)
     profile_picture = Column(String, nullable=True)
+    # Set by admins; users in the same organisation share uploaded documents for retrieval.
+    organization = Column(String, nullable=True)
+    # Granted out of band with admins.py (never through the API), for /api/admin/* routes.
+    is_admin = Column(Boolean, nullable=False, default=False, server_default=false())
     created_at = Column(DateTime, default=datetime.utcnow)
 
     activities = relationship("UserActivity", back_populates="owner")
 
 class UserActivity(Base):
     __tablename__ = "user_activities"
+    # Every read filters by user and sorts by time (history page, plan prompt).
+    __table_args__ = (Index("ix_user_activities_user_timestamp", "user_id", "timestamp"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -27,3 +34,55 @@ class UserActivity(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
     owner = relationship("User", back_populates="activities")
+
+class UserActivityArchive(Base):
+    """Raw activities moved out of user_activities by retention.py once they're past the retention age."""
+    __tablename__ = "user_activities_archive"
+    __table_args__ = (Index("ix_user_activities_archive_user_timestamp", "user_id", "timestamp"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=False) # same id it had in user_activities
+    user_id = Column(Integer, ForeignKey("users.id"))
+    topic = Column(String)
+    title = Column(String)
+    status = Column(String)
+    timestamp = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+class ActivityDailySummary(Base):
+    """Per-user, per-topic, per-day attempt counts for compacted activities."""
+    __tablename__ = "activity_daily_summaries"
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", "topic", name="uq_activity_daily_user_day_topic"),
+        Index("ix_activity_daily_user_day", "user_id", "day"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    topic = Column(String, nullable=False)
+    successes = Column(Integer, default=0)
+    partials = Column(Integer, default=0)
+    failures = Column(Integer, default=0)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_kind_status_created", "kind", "status", "created_at"),
+        # One job per input: concurrent identical submits resolve to the same row.
+        Index("uq_jobs_dedupe_key", "dedupe_key", unique=True),
+    )
+
+    id = Column(String, primary_key=True, index=True) # uuid4 hex
+    kind = Column(String, index=True) # extract_topics, user_plan
+    dedupe_key = Column(String)
+    status = Column(String, index=True, default="queued") # queued, running, done, failed
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    payload = Column(Text, nullable=True) # JSON
+    input_blob = Column(LargeBinary, nullable=True) # e.g. uploaded PDF bytes, cleared once done or failed
+    result = Column(Text, nullable=True) # JSON
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True) # refreshed by the worker running it; a stale one means the worker died
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,181 @@
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+from starlette.responses import FileResponse, Response
+from starlette.datastructures import Headers
+from starlette.types import Scope
+
+# -----------------------------
+# Content-addressed profile photos
+#
+# Originals are stored as uploads/photos/<sha256>.<ext>, so identical uploads
+# share one file and a URL always refers to the same bytes. That lets us serve
+# them with an immutable, year-long Cache-Control and the digest as ETag.
+# -----------------------------
+PHOTOS_SUBDIR = "photos"
+THUMBS_SUBDIR = "thumbs"
+THUMBNAIL_SIZES = (64, 256)
+MAX_PHOTO_BYTES = int(os.getenv("MAX_PHOTO_BYTES", str(5 * 1024 * 1024)))
+MAX_PHOTO_PIXELS = int(os.getenv("MAX_PHOTO_PIXELS", str(40_000_000)))
+CHUNK_SIZE = 64 * 1024
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Pillow's detected format -> stored extension. The client's Content-Type is never trusted.
+_FORMATS: Dict[str, str] = {
+    "JPEG": "jpg",
+    "PNG": "png",
+    "GIF": "gif",
+    "WEBP": "webp",
+}
+
+_thumb_pool = ThreadPoolExecutor(max_workers=int(os.getenv("THUMBNAIL_WORKERS", "2")), thread_name_prefix="thumbs")
+
+
+def _image_extension(path: str) -> str:
+    """Decode the file's headers and structure with Pillow; the extension for its real format, or 400."""
+    try:
+        from PIL import Image  # type: ignore
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Image uploads are unavailable: Pillow is not installed")
+
+    try:
+        with Image.open(path) as img:
+            fmt = img.format
+            width, height = img.size
+            img.verify()
+    except Exception:
+        raise HTTPException(status_code=400, detail="File provided is not a valid image")
+    ext = _FORMATS.get(fmt or "")
+    if not ext:
+        raise HTTPException(status_code=400, detail="File provided is not a supported image (jpeg, png, gif, webp)")
+    if width * height > MAX_PHOTO_PIXELS:
+        raise HTTPException(status_code=413, detail="Image dimensions are too large")
+    return ext
+
+
+def store_photo(src: BinaryIO, uploads_dir: str) -> Tuple[str, str]:
+    """
+    Stream an upload to disk while hashing it and return (digest, relative path).
+
+    The bytes go to a temp file in the destination directory, are checked to
+    be a jpeg, png, gif or webp image (which also picks the extension), and
+    are renamed into place, so readers never see a partial or non-image file.
+    If the digest already exists the temp file is dropped: duplicate uploads
+    cost no extra storage. Blocking; call it from a worker thread.
+    """
+    photos_dir = os.path.join(uploads_dir, PHOTOS_SUBDIR)
+    os.makedirs(photos_dir, exist_ok=True)
+
+    sha = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=photos_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_PHOTO_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Image exceeds {MAX_PHOTO_BYTES // (1024 * 1024)} MB limit")
+                sha.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty file")
+
+        ext = _image_extension(tmp_path)
+        digest = sha.hexdigest()
+        rel_path = f"{PHOTOS_SUBDIR}/{digest}.{ext}"
+        final_path = os.path.join(uploads_dir, rel_path)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, final_path)
+        return digest, rel_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def thumbnail_path(digest: str, size: int) -> str:
+    return f"{THUMBS_SUBDIR}/{digest}_{size}.jpg"
+
+
+def existing_thumbnails(uploads_dir: str, digest: str) -> Dict[int, str]:
+    """Relative paths of the thumbnails already generated for a photo, by size."""
+    paths = {size: thumbnail_path(digest, size) for size in THUMBNAIL_SIZES}
+    return {size: p for size, p in paths.items() if os.path.exists(os.path.join(uploads_dir, p))}
+
+
+def _make_thumbnails(uploads_dir: str, rel_path: str, digest: str) -> None:
+    try:
+        from PIL import Image  # type: ignore
+    except ImportError:
+        print("Thumbnail generation skipped: Pillow is not installed (pip install pillow)")
+        return
+
+    thumbs_dir = os.path.join(uploads_dir, THUMBS_SUBDIR)
+    os.makedirs(thumbs_dir, exist_ok=True)
+    pending = [s for s in THUMBNAIL_SIZES if not os.path.exists(os.path.join(uploads_dir, thumbnail_path(digest, s)))]
+    if not pending:
+        return
+
+    try:
+        with Image.open(os.path.join(uploads_dir, rel_path)) as img:
+            img.seek(0)
+            img = img.convert("RGBA")
+            # Flatten transparency onto white so every thumbnail can be a JPEG.
+            base = Image.new("RGB", img.size, (255, 255, 255))
+            base.paste(img, mask=img.split()[-1])
+            for size in sorted(pending, reverse=True):
+                thumb = base.copy()
+                thumb.thumbnail((size, size))
+                target = os.path.join(uploads_dir, thumbnail_path(digest, size))
+                fd, tmp_path = tempfile.mkstemp(dir=thumbs_dir, suffix=".part")
+                with os.fdopen(fd, "wb") as out:
+                    thumb.save(out, format="JPEG", quality=85, optimize=True)
+                os.replace(tmp_path, target)
+    except Exception as e:
+        print(f"Thumbnail generation failed for {rel_path}: {e}")
+
+
+def schedule_thumbnails(uploads_dir: str, rel_path: str, digest: str):
+    """Generate thumbnails on the worker pool; the request does not wait for them."""
+    return _thumb_pool.submit(_make_thumbnails, uploads_dir, rel_path, digest)
+
+
+def shutdown() -> None:
+    _thumb_pool.shutdown(wait=False, cancel_futures=True)
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles that marks content-addressed files (photos/, thumbs/) as
+    immutable and uses their digest as a strong ETag, which stays the same
+    across instances unlike Starlette's mtime-based default.
+    """
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        rel = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        if not rel.startswith((PHOTOS_SUBDIR + "/", THUMBS_SUBDIR + "/")):
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        digest = os.path.splitext(os.path.basename(rel))[0]
+        headers = {"etag": f'"{digest}"', "cache-control": IMMUTABLE_CACHE_CONTROL}
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from types import CodeType, FrameType
+from typing import Any, Callable, Dict, List, Optional, Set, TypeVar
+
+# -----------------------------
+# On-demand sampling profiler
+#
+# A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>`, or while
+# an admin has profiling switched on for PROFILE_PATHS. Its blocking work (the
+# execution lanes run every handler's heavy part: generation and
+# _parse_response, PDF extraction, the topic matcher) registers its thread with
+# the request's profile, and one sampler thread reads those threads' stacks
+# from sys._current_frames() every PROFILE_INTERVAL_MS. The result is written
+# to PROFILES_DIR in folded-stack format ("a;b;c <count>" per line), which
+# flamegraph.pl, speedscope and inferno read directly.
+#
+# With nothing being profiled no sampler thread runs, and the cost per request
+# is a flag check (plus a header scan when PROFILE_TOKEN is set).
+# -----------------------------
+T = TypeVar("T")
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN") or None
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILES_DIR = os.getenv("PROFILES_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+PROFILE_PATHS = tuple(
+    p.strip() for p in os.getenv("PROFILE_PATHS", "/api/generate,/api/extract-topics").split(",") if p.strip()
+)
+
+_PROFILE_ID = re.compile(r"^\d{8}-\d{6}-[0-9a-f]{8}$")
+_active: ContextVar[Optional["Profile"]] = ContextVar("profile", default=None)
+# Profiles are written here rather than on Starlette's shared threadpool.
+_save_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile-save")
+
+
+class Profile:
+    def __init__(self, method: str, path: str):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}"
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def sample(self, frames: Dict[int, FrameType]) -> None:
+        with self._lock:
+            threads = list(self._threads.items())
+        folded = [_fold(frames[tid], name) for tid, name in threads if tid in frames]
+        with self._lock:
+            self.samples += 1
+            self.stacks.update(folded)
+
+    def meta(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started": self.started,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "samples": self.samples,
+            "interval_ms": PROFILE_INTERVAL_MS,
+        }
+
+    def save(self) -> None:
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        with self._lock:
+            lines = [f"{stack} {count}\n" for stack, count in self.stacks.most_common()]
+        with open(os.path.join(PROFILES_DIR, f"{self.id}.folded"), "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        with open(os.path.join(PROFILES_DIR, f"{self.id}.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta(), f)
+        _prune()
+
+
+# -- stack folding -------------------------------------------------------------
+
+_labels: Dict[CodeType, str] = {}
+
+
+def _label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+        _labels[code] = label
+    return label
+
+
+def _fold(frame: Optional[FrameType], thread_name: str) -> str:
+    """Root-first stack of one thread, cut at run_attached so lane and executor frames drop out."""
+    names: List[str] = []
+    while frame is not None and frame.f_code is not _RUN_ATTACHED_CODE:
+        names.append(_label(frame.f_code))
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+# -- sampler -------------------------------------------------------------------
+
+class _Sampler:
+    """One daemon thread shared by every in-flight profile; it exits when none are left."""
+
+    def __init__(self):
+        self._profiles: Set[Profile] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: Profile) -> None:
+        with self._lock:
+            self._profiles.discard(profile)
+
+    def _run(self) -> None:
+        interval = PROFILE_INTERVAL_MS / 1000
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+                profiles = list(self._profiles)
+            frames = sys._current_frames()
+            for profile in profiles:
+                profile.sample(frames)
+
+
+_sampler = _Sampler()
+
+
+def run_attached(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Call fn, sampling this thread for the current request's profile, if it has one."""
+    profile = _active.get()
+    if profile is None:
+        return fn(*args, **kwargs)
+    tid = threading.get_ident()
+    with profile._lock:
+        profile._threads[tid] = threading.current_thread().name
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        with profile._lock:
+            profile._threads.pop(tid, None)
+
+
+_RUN_ATTACHED_CODE = run_attached.__code__
+
+
+# -- admin toggle --------------------------------------------------------------
+
+class _Toggle:
+    def __init__(self):
+        self.enabled = False
+        self.remaining: Optional[int] = None  # profiles left before switching off; None for no limit
+        self._lock = threading.Lock()
+
+    def set(self, enabled: bool, limit: Optional[int] = None) -> None:
+        with self._lock:
+            self.enabled = enabled
+            self.remaining = limit if enabled else None
+
+    def take(self, path: str) -> bool:
+        if not any(path == p or path.startswith(p + "/") for p in PROFILE_PATHS):
+            return False
+        with self._lock:
+            if not self.enabled:
+                return False
+            if self.remaining is not None:
+                self.remaining -= 1
+                if self.remaining <= 0:
+                    self.enabled = False
+            return True
+
+    def state(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "remaining": self.remaining, "paths": list(PROFILE_PATHS)}
+
+
+toggle = _Toggle()
+
+
+def _header_requested(scope: Dict[str, Any]) -> bool:
+    if PROFILE_TOKEN is None:
+        return False
+    for name, value in scope.get("headers") or ():
+        if name == b"x-profile":
+            return secrets.compare_digest(value, PROFILE_TOKEN.encode())
+    return False
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware, so unprofiled requests pay nothing beyond the checks above."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (
+            (toggle.enabled and toggle.take(scope["path"])) or _header_requested(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"])
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        token = _active.set(profile)
+        _sampler.add(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.duration_ms = (time.perf_counter() - start) * 1000
+            _sampler.remove(profile)
+            _active.reset(token)
+            try:
+                await asyncio.wrap_future(_save_pool.submit(profile.save))
+            except OSError as e:
+                print(f"Could not save profile {profile.id}: {e}")
+
+
+# -- stored profiles -------------------------------------------------------------
+
+def list_profiles(limit: int = 50) -> List[Dict[str, Any]]:
+    """Metadata of the most recent saved profiles, newest first."""
+    try:
+        names = sorted((n for n in os.listdir(PROFILES_DIR) if n.endswith(".json")), reverse=True)
+    except FileNotFoundError:
+        return []
+    out = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(PROFILES_DIR, name), encoding="utf-8") as f:
+                out.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return out
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """Path of a saved folded-stack file, or None for unknown or malformed ids."""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(PROFILES_DIR, f"{profile_id}.folded")
+    return path if os.path.exists(path) else None
+
+
+def _prune() -> None:
+    try:
+        ids = sorted({n.rsplit(".", 1)[0] for n in os.listdir(PROFILES_DIR) if _PROFILE_ID.match(n.rsplit(".", 1)[0])})
+    except FileNotFoundError:
+        return
+    for stale in ids[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for ext in (".folded", ".json"):
+            try:
+                os.remove(os.path.join(PROFILES_DIR, stale + ext))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,143 @@
+"""
+Activity log retention.
+
+Activities older than ACTIVITY_RETENTION_DAYS are compacted: each batch adds
+its rows to per-user, per-topic daily counts in activity_daily_summaries,
+copies them to user_activities_archive and deletes them from user_activities,
+all in one short transaction. Batches walk the primary key from the oldest
+end, so each one is an index range scan that stops after ACTIVITY_COMPACTION_BATCH
+rows, and a pause between batches leaves room for foreground writes.
+
+Run it from cron, e.g. nightly:
+
+    python retention.py                  # compact everything past the retention age
+    python retention.py --days 90 --batch 5000 --max-batches 200
+    python retention.py --dry-run        # count what would be compacted
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+ACTIVITY_RETENTION_DAYS = int(os.getenv("ACTIVITY_RETENTION_DAYS", "180"))
+ACTIVITY_COMPACTION_BATCH = int(os.getenv("ACTIVITY_COMPACTION_BATCH", "1000"))
+ACTIVITY_COMPACTION_PAUSE_SECONDS = float(os.getenv("ACTIVITY_COMPACTION_PAUSE_SECONDS", "0.05"))
+
+# Summary column for each activity status; anything unrecognised counts as a failure.
+_STATUS_COLUMNS = {"Success": "successes", "Partial": "partials", "Failed": "failures"}
+
+
+def compact_batch(db: Session, cutoff: datetime, batch_size: int = ACTIVITY_COMPACTION_BATCH) -> int:
+    """Compact up to batch_size activities older than cutoff; returns how many were moved."""
+    rows = (
+        db.query(models.UserActivity)
+        .filter(models.UserActivity.timestamp < cutoff)
+        .order_by(models.UserActivity.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not rows:
+        db.rollback()
+        return 0
+
+    counts: Dict[Tuple[int, object, str], Counter] = {}
+    for a in rows:
+        key = (a.user_id, a.timestamp.date(), a.topic or "General")
+        counts.setdefault(key, Counter())[_STATUS_COLUMNS.get(a.status, "failures")] += 1
+
+    existing = {
+        (s.user_id, s.day, s.topic): s
+        for s in db.query(models.ActivityDailySummary).filter(
+            models.ActivityDailySummary.user_id.in_({k[0] for k in counts}),
+            models.ActivityDailySummary.day.in_({k[1] for k in counts}),
+        )
+    }
+    for (user_id, day, topic), c in counts.items():
+        summary = existing.get((user_id, day, topic))
+        if summary is None:
+            summary = models.ActivityDailySummary(user_id=user_id, day=day, topic=topic, successes=0, partials=0, failures=0)
+            db.add(summary)
+        for column, n in c.items():
+            setattr(summary, column, getattr(summary, column) + n)
+
+    db.execute(insert(models.UserActivityArchive), [
+        {"id": a.id, "user_id": a.user_id, "topic": a.topic, "title": a.title, "status": a.status, "timestamp": a.timestamp}
+        for a in rows
+    ])
+    db.query(models.UserActivity).filter(
+        models.UserActivity.id.in_([a.id for a in rows])
+    ).delete(synchronize_session=False)
+    db.commit()
+    return len(rows)
+
+
+def compact(
+    older_than_days: int = ACTIVITY_RETENTION_DAYS,
+    batch_size: int = ACTIVITY_COMPACTION_BATCH,
+    max_batches: Optional[int] = None,
+    pause: float = ACTIVITY_COMPACTION_PAUSE_SECONDS,
+    session_factory: Callable[[], Session] = SessionLocal,
+) -> int:
+    """Compact activities past the retention age in batches; returns the number of rows moved."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    moved = batches = 0
+    db = session_factory()
+    try:
+        while max_batches is None or batches < max_batches:
+            n = compact_batch(db, cutoff, batch_size)
+            if not n:
+                break
+            moved += n
+            batches += 1
+            print(f"Compacted batch {batches}: {n} activities ({moved} total)")
+            if n < batch_size:
+                break
+            time.sleep(pause)
+    finally:
+        db.close()
+    return moved
+
+
+def pending(older_than_days: int = ACTIVITY_RETENTION_DAYS, session_factory: Callable[[], Session] = SessionLocal) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    db = session_factory()
+    try:
+        return db.query(func.count(models.UserActivity.id)).filter(models.UserActivity.timestamp < cutoff).scalar()
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=ACTIVITY_RETENTION_DAYS, help="compact activities older than this many days")
+    parser.add_argument("--batch", type=int, default=ACTIVITY_COMPACTION_BATCH, help="activities per transaction")
+    parser.add_argument("--max-batches", type=int, default=None, help="stop after this many batches")
+    parser.add_argument("--pause", type=float, default=ACTIVITY_COMPACTION_PAUSE_SECONDS, help="seconds to sleep between batches")
+    parser.add_argument("--dry-run", action="store_true", help="only report how many activities would be compacted")
+    args = parser.parse_args(argv)
+
+    if args.days < 1 or args.batch < 1:
+        parser.error("--days and --batch must be at least 1")
+    if args.dry_run:
+        print(f"{pending(args.days)} activities older than {args.days} days would be compacted.")
+        return 0
+    moved = compact(args.days, args.batch, args.max_batches, args.pause)
+    print(f"Compaction complete: {moved} activities archived.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# -----------------------------
+# Document retrieval
+#
+# PDFs uploaded by signed-in users are chunked into overlapping passages and
+# stored in a local SQLite FTS5 index (RETRIEVAL_DB_PATH), separate from the
+# main database so it works the same on PostgreSQL and SQLite deployments.
+# Passages are keyed by scope: the organisation an admin assigned the uploader
+# to (users.organization), or else the uploader alone. Email domains are never
+# trusted for this, since registration doesn't verify addresses. At generation
+# time each topic pulls its top BM25 passages from the caller's scope, and
+# passages are taken round-robin across topics until RETRIEVAL_TOKEN_BUDGET
+# is spent, so the prompt stays the same size however large the corpus grows.
+# -----------------------------
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "1") == "1"
+RETRIEVAL_DB_PATH = os.getenv("RETRIEVAL_DB_PATH", "retrieval.db")
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1200"))
+CHARS_PER_TOKEN = 4
+CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1200"))
+CHUNK_OVERLAP_CHARS = 200
+MAX_INDEX_PAGES = int(os.getenv("RETRIEVAL_MAX_PAGES", "500"))
+
+_WORD = re.compile(r"[0-9a-z]+")
+_STOPWORDS = frozenset("a an and are as at be by for from in is it of on or the to with".split())
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    org TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    name TEXT,
+    passages INTEGER NOT NULL DEFAULT 0,
+    added REAL NOT NULL,
+    UNIQUE (org, sha256)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(org_key, body, doc_id UNINDEXED, tokenize = 'porter unicode61');
+"""
+
+
+def scope_for(user_id: int, organization: Optional[str] = None) -> str:
+    """Retrieval scope of a user: their admin-assigned organisation, or just themselves."""
+    organization = (organization or "").strip().lower()
+    return f"org:{organization}" if organization else f"user:{user_id}"
+
+
+def _org_key(org: str) -> str:
+    # A single all-digit token: never split by the tokenizer or changed by the stemmer.
+    return str(int(hashlib.sha1(org.encode()).hexdigest()[:15], 16))
+
+
+def chunk_text(pages: Iterable[str], size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP_CHARS) -> Iterator[str]:
+    """Passages of about `size` characters on word boundaries, each repeating the previous one's last `overlap`."""
+    words: List[str] = []
+    length = 0
+    emitted = False
+    for page in pages:
+        for word in page.split():
+            words.append(word)
+            length += len(word) + 1
+            if length >= size:
+                yield " ".join(words)
+                emitted = True
+                kept: List[str] = []
+                kept_len = 0
+                for w in reversed(words):
+                    if kept_len + len(w) + 1 > overlap:
+                        break
+                    kept.append(w)
+                    kept_len += len(w) + 1
+                words, length = kept[::-1], kept_len
+    # The tail is only worth a passage if it's more than the overlap already indexed.
+    if words and (length > overlap or not emitted):
+        yield " ".join(words)
+
+
+def _match_query(org_key: str, topic: str) -> Optional[str]:
+    terms = [t for t in dict.fromkeys(_WORD.findall(topic.lower())) if len(t) > 1 and t not in _STOPWORDS]
+    if not terms:
+        return None
+    return f'org_key : "{org_key}" AND body : (' + " OR ".join(f'"{t}"' for t in terms) + ")"
+
+
+class Index:
+    def __init__(self, path: str = RETRIEVAL_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(_SCHEMA)
+            # Rank by body relevance only; org_key is a filter.
+            conn.execute("INSERT INTO passages(passages, rank) VALUES ('rank', 'bm25(0.0, 1.0)')")
+            conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def has_document(self, org: str, sha256: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM documents WHERE org = ? AND sha256 = ?", (org, sha256)).fetchone()
+        return row is not None
+
+    def add_document(self, org: str, name: str, content: bytes, pages: Callable[[bytes], Iterable[str]]) -> int:
+        """Chunk and index one PDF for `org`; returns the passages added (0 if it was already indexed)."""
+        sha256 = hashlib.sha256(content).hexdigest()
+        if self.has_document(org, sha256):
+            return 0
+        page_iter = iter(pages(content))
+        try:
+            chunks = list(chunk_text(p for _, p in zip(range(MAX_INDEX_PAGES), page_iter)))
+        finally:
+            close = getattr(page_iter, "close", None)
+            if close:
+                close()
+        if not chunks:
+            return 0
+        key = _org_key(org)
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO documents (org, sha256, name, passages, added) VALUES (?, ?, ?, ?, ?)",
+                    (org, sha256, name, len(chunks), time.time()),
+                )
+                if not cur.rowcount:
+                    return 0
+                conn.executemany(
+                    "INSERT INTO passages (org_key, body, doc_id) VALUES (?, ?, ?)",
+                    [(key, chunk, cur.lastrowid) for chunk in chunks],
+                )
+        return len(chunks)
+
+    def search(self, org: str, topic: str, k: int = RETRIEVAL_TOP_K) -> List[Tuple[int, str]]:
+        """Top-k (rowid, passage) for a topic within one scope, best first."""
+        query = _match_query(_org_key(org), topic)
+        if query is None:
+            return []
+        return self._conn().execute(
+            "SELECT rowid, body FROM passages WHERE passages MATCH ? ORDER BY rank LIMIT ?", (query, k)
+        ).fetchall()
+
+    def context(self, org: str, topics: List[str], token_budget: int = RETRIEVAL_TOKEN_BUDGET) -> Optional[str]:
+        """Passages for the topics, taken round-robin by rank until the budget is spent."""
+        hits: Dict[str, List[Tuple[int, str]]] = {t: self.search(org, t) for t in dict.fromkeys(topics)}
+        budget = token_budget * CHARS_PER_TOKEN
+        seen = set()
+        lines: List[str] = []
+        for rank in range(RETRIEVAL_TOP_K):
+            for topic, passages in hits.items():
+                if rank >= len(passages):
+                    continue
+                rowid, body = passages[rank]
+                if rowid in seen:
+                    continue
+                line = f"[{topic}] {body}"
+                if len(line) > budget:
+                    continue
+                seen.add(rowid)
+                lines.append(line)
+                budget -= len(line) + 1
+        return "\n".join(lines) or None
+
+
+_index: Optional[Index] = None
+_index_lock = threading.Lock()
+# One writer is enough: indexing is off the request path and SQLite serialises writes anyway.
+_index_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieval-index")
+
+
+def index() -> Index:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = Index(RETRIEVAL_DB_PATH)
+        return _index
+
+
+def _index_document(org: str, name: str, content: bytes, pages: Callable[[bytes], Iterable[str]]) -> None:
+    try:
+        added = index().add_document(org, name, content, pages)
+        if added:
+            print(f"Indexed {name} for {org}: {added} passages")
+    except Exception as e:
+        print(f"Indexing {name} for {org} failed: {e}")
+
+
+def schedule_index(scope: Optional[str], name: str, content: bytes, pages: Callable[[bytes], Iterable[str]]):
+    """Index an uploaded PDF for the uploader's scope in the background; no-op for anonymous uploads."""
+    if not RETRIEVAL_ENABLED or scope is None:
+        return None
+    return _index_pool.submit(_index_document, scope, name, content, pages)
+
+
+def context_for(scope: Optional[str], topics: List[str]) -> Optional[str]:
+    """Grounding passages for a generation request, or None if there are none (or retrieval is off)."""
+    if not RETRIEVAL_ENABLED or scope is None or not topics:
+        return None
+    try:
+        return index().context(scope, topics)
+    except sqlite3.Error as e:
+        print(f"Retrieval failed: {e}")
+        return None
+
+
+def shutdown() -> None:
+    _index_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,271 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# -----------------------------
+# Model routing
+#
+# Each LLM call goes through a named route that fixes the model, reasoning
+# effort and output token ceiling, plus a p95 latency SLO. Generation picks a
+# route from the request's count, types and difficulty; callers report every
+# call's latency back. When a route's recent p95 breaks its SLO, traffic moves
+# to its cheaper fallback route until the slow samples age out of the window.
+#
+# LLM_ROUTES (JSON) overrides fields per route, e.g.
+#   {"deep": {"model": "openai/gpt-oss-120b", "slo_ms": 45000}}
+#
+# The same samples drive optional request hedging (LLM_HEDGING=1): a call
+# whose first token, or whole response, is later than the route's recent
+# LLM_HEDGE_PERCENTILE gets a second identical request, as long as hedges have
+# used less than LLM_HEDGE_BUDGET of the route's estimated token spend.
+# -----------------------------
+ROUTING_ADAPTIVE = os.getenv("LLM_ROUTING_ADAPTIVE", "1") == "1"
+ROUTE_WINDOW_SECONDS = float(os.getenv("LLM_ROUTE_WINDOW_SECONDS", "600"))
+ROUTE_MIN_SAMPLES = int(os.getenv("LLM_ROUTE_MIN_SAMPLES", "8"))
+ROUTE_MAX_SAMPLES = 500
+
+HEDGING_ENABLED = os.getenv("LLM_HEDGING", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.1"))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+DIFFICULTY_LEVELS: Dict[str, int] = {
+    "Middle School": 0,
+    "High School": 1,
+    "Bachelor": 2,
+    "Master": 3,
+    "PHD": 4,
+    "Veteran": 5,
+}
+
+# Rough output tokens per generated question, by type, and the reasoning tokens
+# spent before the answer starts, by effort. Budgets are generous: a truncated
+# JSON array fails to parse and the request falls back to the template bank.
+TOKENS_PER_QUESTION: Dict[str, int] = {"MCQ": 260, "Fill in the Blanks": 200, "Short Answer": 320, "Coding": 900}
+REASONING_OVERHEAD: Dict[Optional[str], int] = {None: 0, "low": 1024, "medium": 3072, "high": 8192}
+TOKEN_MARGIN = 2.0
+MIN_GENERATION_TOKENS = 4096
+
+
+class Route:
+    __slots__ = ("name", "model", "reasoning_effort", "max_tokens", "slo_ms", "fallback")
+
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        reasoning_effort: Optional[str],
+        max_tokens: int,
+        slo_ms: float,
+        fallback: Optional[str] = None,
+    ):
+        self.name = name
+        self.model = model
+        self.reasoning_effort = reasoning_effort  # None for models without a reasoning mode
+        self.max_tokens = max_tokens
+        self.slo_ms = slo_ms
+        self.fallback = fallback  # cheaper route used while this one misses its SLO
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+_DEFAULT_ROUTES: Dict[str, Dict[str, Any]] = {
+    "light": {"model": "openai/gpt-oss-20b", "reasoning_effort": "low", "max_tokens": 8192, "slo_ms": 10000},
+    "standard": {"model": "openai/gpt-oss-120b", "reasoning_effort": "low", "max_tokens": 12288, "slo_ms": 20000,
+                 "fallback": "light"},
+    "deep": {"model": "openai/gpt-oss-120b", "reasoning_effort": "medium", "max_tokens": 24576, "slo_ms": 45000,
+             "fallback": "standard"},
+    "topics": {"model": "openai/gpt-oss-120b", "reasoning_effort": "medium", "max_tokens": 4096, "slo_ms": 20000},
+    "plan": {"model": "llama-3.1-8b-instant", "reasoning_effort": None, "max_tokens": 800, "slo_ms": 5000},
+}
+
+
+def _load_routes() -> Dict[str, Route]:
+    specs = {name: dict(spec) for name, spec in _DEFAULT_ROUTES.items()}
+    raw = os.getenv("LLM_ROUTES")
+    if raw:
+        try:
+            for name, override in json.loads(raw).items():
+                specs.setdefault(name, {}).update(override)
+        except (ValueError, AttributeError) as e:
+            print(f"Ignoring invalid LLM_ROUTES: {e}")
+    try:
+        routes = {name: Route(name=name, **spec) for name, spec in specs.items()}
+    except TypeError as e:
+        print(f"Ignoring invalid LLM_ROUTES: {e}")
+        routes = {name: Route(name=name, **spec) for name, spec in _DEFAULT_ROUTES.items()}
+    for route in routes.values():
+        if route.fallback not in routes:
+            route.fallback = None
+    return routes
+
+
+Sample = Tuple[float, float, bool, Optional[float]]  # (at, latency_ms, ok, ttft_ms)
+
+
+class _RouteStats:
+    def __init__(self):
+        self.samples: Deque[Sample] = deque(maxlen=ROUTE_MAX_SAMPLES)
+        self.spend: Deque[Tuple[float, int, bool]] = deque(maxlen=ROUTE_MAX_SAMPLES * 2)  # (at, tokens, hedge_extra)
+        self.calls = 0
+        self.errors = 0
+        self.downgraded = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedge_budget_skips = 0
+
+    def recent(self, now: float) -> List[Sample]:
+        cutoff = now - ROUTE_WINDOW_SECONDS
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return list(self.samples)
+
+    def recent_spend(self, now: float) -> Tuple[int, int]:
+        """(total, hedge extra) estimated tokens over the window."""
+        cutoff = now - ROUTE_WINDOW_SECONDS
+        while self.spend and self.spend[0][0] < cutoff:
+            self.spend.popleft()
+        total = sum(t for _, t, _ in self.spend)
+        return total, sum(t for _, t, extra in self.spend if extra)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class Router:
+    def __init__(self, routes: Optional[Dict[str, Route]] = None):
+        self.routes = routes if routes is not None else _load_routes()
+        self._stats: Dict[str, _RouteStats] = {name: _RouteStats() for name in self.routes}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Route:
+        """The route to use for `name`, following fallbacks past routes that miss their SLO."""
+        route = self.routes[name]
+        if not ROUTING_ADAPTIVE:
+            return route
+        seen = {route.name}
+        while route.fallback and route.fallback not in seen and self._over_slo(route):
+            with self._lock:
+                self._stats[route.name].downgraded += 1
+            route = self.routes[route.fallback]
+            seen.add(route.name)
+        return route
+
+    def _over_slo(self, route: Route) -> bool:
+        with self._lock:
+            samples = self._stats[route.name].recent(time.monotonic())
+        if len(samples) < ROUTE_MIN_SAMPLES:
+            return False
+        # Failures count as SLO misses: a route that errors fast is not healthy.
+        latencies = [ms if ok else math.inf for _, ms, ok, _ in samples]
+        return _percentile(latencies, 0.95) > route.slo_ms
+
+    def record(self, name: str, latency_ms: float, ok: bool = True, ttft_ms: Optional[float] = None) -> None:
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                return
+            stats.samples.append((time.monotonic(), latency_ms, ok, ttft_ms))
+            stats.calls += 1
+            if not ok:
+                stats.errors += 1
+
+    # -- hedging -------------------------------------------------------------
+
+    def hedge_delays(self, route: Route) -> Optional[Tuple[float, float]]:
+        """(first-token, total) delays in ms after which a call should be hedged, or None to not hedge."""
+        if not HEDGING_ENABLED:
+            return None
+        with self._lock:
+            samples = [s for s in self._stats[route.name].recent(time.monotonic()) if s[2]]
+        ttfts = [s[3] for s in samples if s[3] is not None]
+        if len(samples) < HEDGE_MIN_SAMPLES or len(ttfts) < HEDGE_MIN_SAMPLES:
+            return None
+        return _percentile(ttfts, HEDGE_PERCENTILE), _percentile([s[1] for s in samples], HEDGE_PERCENTILE)
+
+    def hedge_allowed(self, name: str) -> bool:
+        """True while hedges account for less than HEDGE_BUDGET of the route's token spend."""
+        with self._lock:
+            stats = self._stats[name]
+            total, extra = stats.recent_spend(time.monotonic())
+            if total and extra / total < HEDGE_BUDGET:
+                return True
+            stats.hedge_budget_skips += 1
+            return False
+
+    def record_hedge(self, name: str, hedge_won: bool) -> None:
+        with self._lock:
+            stats = self._stats[name]
+            stats.hedges += 1
+            if hedge_won:
+                stats.hedge_wins += 1
+
+    def record_spend(self, name: str, tokens: int, hedge_extra: bool = False) -> None:
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is not None:
+                stats.spend.append((time.monotonic(), tokens, hedge_extra))
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        out: Dict[str, Any] = {}
+        for name, route in self.routes.items():
+            with self._lock:
+                s = self._stats[name]
+                samples = s.recent(now)
+                total_spend, extra_spend = s.recent_spend(now)
+                calls, errors, downgraded = s.calls, s.errors, s.downgraded
+                hedges, hedge_wins, budget_skips = s.hedges, s.hedge_wins, s.hedge_budget_skips
+            latencies = [ms for _, ms, ok, _ in samples if ok]
+            ttfts = [t for _, _, ok, t in samples if ok and t is not None]
+            out[name] = {
+                **route.to_dict(),
+                "calls": calls,
+                "errors": errors,
+                "downgraded": downgraded,
+                "window_samples": len(samples),
+                "p50_ms": _percentile(latencies, 0.5),
+                "p95_ms": _percentile(latencies, 0.95),
+                "ttft_p50_ms": _percentile(ttfts, 0.5),
+                "ttft_p95_ms": _percentile(ttfts, 0.95),
+                "over_slo": self._over_slo(route),
+                "hedges": hedges,
+                "hedge_rate": hedges / calls if calls else 0.0,
+                "hedge_win_rate": hedge_wins / hedges if hedges else 0.0,
+                "hedge_budget_skips": budget_skips,
+                "hedge_token_share": extra_spend / total_spend if total_spend else 0.0,
+            }
+        return out
+
+
+def generation_route_name(count: int, types: List[str], difficulty: Optional[str]) -> str:
+    """
+    Small, easy sets get the light route; coding at Master level and above, or
+    large sets, get the deep route; everything else is standard.
+    """
+    level = DIFFICULTY_LEVELS.get(difficulty or "Bachelor", 2)
+    coding = "Coding" in types
+    if count > 10 or (coding and level >= 3):
+        return "deep"
+    if level <= 1 and count <= 5 and not coding:
+        return "light"
+    return "standard"
+
+
+def generation_token_budget(route: Route, count: int, types: List[str]) -> int:
+    """Output tokens for `count` questions of the costliest requested type, plus reasoning, capped by the route."""
+    per_question = max((TOKENS_PER_QUESTION.get(t, 320) for t in types), default=320)
+    wanted = REASONING_OVERHEAD.get(route.reasoning_effort, 0) + count * per_question * TOKEN_MARGIN
+    return int(min(route.max_tokens, max(MIN_GENERATION_TOKENS, wanted)))
+
+
+router = Router()
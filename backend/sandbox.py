@@ -0,0 +1,563 @@
+import ctypes
+import io
+import itertools
+import json
+import os
+import platform
+import queue as queue_mod
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Any, Dict, List, Optional, Tuple
+
+# -----------------------------
+# Sandboxed execution of Python Coding answers
+#
+# A pool of long-lived workers is started once. Each is a fresh
+# `python -I sandbox.py --worker` with an empty environment, so no server
+# secret is ever in a worker's memory, and tasks and results go over its
+# stdin/stdout as JSON lines. For each submission a worker forks a throwaway
+# child which, before anything it was sent runs:
+#   - unshares mount, network, IPC, UTS and PID namespaces (plus a user
+#     namespace when the worker isn't root), so there is no network and no
+#     process outside the sandbox can be seen, signalled or traced;
+#   - pivots into a fresh tmpfs root with read-only binds of the system and
+#     the Python install, a writable /work and /tmp, a minimal /dev and no /proc;
+#   - drops to SANDBOX_UID/SANDBOX_GID with no capabilities and no_new_privs,
+#     and applies CPU, memory, file-size and process rlimits (RLIMIT_NPROC=0:
+#     no fork, no exec of a shell, no threads).
+# If any step fails nothing is run. The worker enforces the wall-clock limit
+# and SIGKILLs children that overrun it.
+#
+# This module only uses the standard library so workers start fast.
+# -----------------------------
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", "2"))
+SANDBOX_WALL_SECONDS = float(os.getenv("SANDBOX_WALL_SECONDS", "5"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "256"))
+SANDBOX_MAX_PENDING = int(os.getenv("SANDBOX_MAX_PENDING", "1000"))
+SANDBOX_UID = int(os.getenv("SANDBOX_UID", "65534"))  # nobody
+SANDBOX_GID = int(os.getenv("SANDBOX_GID", "65534"))  # nogroup
+MAX_OUTPUT_CHARS = 8000
+MAX_FILE_BYTES = 1024 * 1024
+
+SUPPORTED = sys.platform.startswith("linux")
+
+ISOLATION_ERROR = "sandbox isolation failed"
+
+
+class SandboxUnavailable(RuntimeError):
+    pass
+
+
+# -----------------------------
+# Isolation (runs in the forked child)
+# -----------------------------
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_REMOUNT = 0x20
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+# Flags a bind remount has to keep from its source (the kernel locks them in user namespaces).
+MS_KEEP = os.ST_NOEXEC | os.ST_NOATIME | os.ST_NODIRATIME | os.ST_RELATIME
+MNT_DETACH = 2
+
+PR_SET_PDEATHSIG = 1
+PR_SET_DUMPABLE = 4
+PR_SET_NO_NEW_PRIVS = 38
+_LINUX_CAPABILITY_VERSION_3 = 0x20080522
+
+_SYS_PIVOT_ROOT = {"x86_64": 155, "aarch64": 41, "riscv64": 41, "armv7l": 218, "i686": 217, "ppc64le": 203, "s390x": 217}
+
+# Read-only paths inside the sandbox root; symlinks (/bin -> usr/bin) are recreated as symlinks.
+_RO_PATHS = ("/usr", "/lib", "/lib64", "/lib32", "/bin", "/etc/ld.so.cache", "/etc/localtime")
+_DEV_NODES = ("/dev/null", "/dev/zero", "/dev/urandom", "/dev/random")
+
+_libc: Optional[ctypes.CDLL] = None
+
+
+def _load_libc() -> ctypes.CDLL:
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.mount.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_ulong, ctypes.c_char_p]
+        libc.umount2.argtypes = [ctypes.c_char_p, ctypes.c_int]
+        libc.unshare.argtypes = [ctypes.c_int]
+        libc.prctl.argtypes = [ctypes.c_int, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong]
+        libc.capset.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+        _libc = libc
+    return _libc
+
+
+def _check(rc: int, what: str) -> None:
+    if rc != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, f"{what}: {os.strerror(err)}")
+
+
+def _mount(source: Optional[str], target: str, fstype: Optional[str], flags: int, data: Optional[str] = None) -> None:
+    libc = _load_libc()
+    _check(libc.mount(
+        source.encode() if source else None, target.encode(), fstype.encode() if fstype else None, flags,
+        data.encode() if data else None,
+    ), f"mount {target}")
+
+
+def _bind(source: str, target: str, read_only: bool, devices: bool = False) -> None:
+    _mount(source, target, None, MS_BIND | MS_REC)
+    flags = MS_BIND | MS_REMOUNT | MS_NOSUID | (0 if devices else MS_NODEV) | (os.statvfs(source).f_flag & MS_KEEP)
+    _mount(None, target, None, flags | (MS_RDONLY if read_only else 0))
+
+
+def _ro_paths() -> List[str]:
+    paths: List[str] = []
+    for p in (*_RO_PATHS, sys.base_prefix, sys.prefix):
+        if os.path.lexists(p) and not any(p == q or p.startswith(q + "/") for q in paths):
+            paths.append(p)
+    return paths
+
+
+def _build_root(root: str, workdir: str) -> None:
+    _mount("tmpfs", root, "tmpfs", MS_NOSUID | MS_NODEV, "size=1m,mode=755")
+    for src in _ro_paths():
+        target = root + src
+        os.makedirs(os.path.dirname(target), mode=0o755, exist_ok=True)
+        if os.path.islink(src):
+            os.symlink(os.readlink(src), target)
+            continue
+        if os.path.isdir(src):
+            os.makedirs(target, mode=0o755, exist_ok=True)
+        else:
+            open(target, "w").close()
+        _bind(src, target, read_only=True)
+
+    os.mkdir(root + "/work", 0o755)
+    _bind(workdir, root + "/work", read_only=False)
+    os.mkdir(root + "/tmp", 0o1777)
+    _mount("tmpfs", root + "/tmp", "tmpfs", MS_NOSUID | MS_NODEV, "size=16m,mode=1777")
+    os.mkdir(root + "/dev", 0o755)
+    for node in _DEV_NODES:
+        open(root + node, "w").close()
+        try:
+            _bind(node, root + node, read_only=False, devices=True)
+        except OSError:
+            os.remove(root + node)
+
+
+def _pivot(root: str) -> None:
+    nr = _SYS_PIVOT_ROOT.get(platform.machine())
+    if nr is None:
+        raise OSError(f"pivot_root: unsupported architecture {platform.machine()}")
+    libc = _load_libc()
+    os.chdir(root)
+    # pivot_root(".", ".") stacks the old root on the new one; detaching it leaves only the new root.
+    _check(libc.syscall(ctypes.c_long(nr), b".", b"."), "pivot_root")
+    _check(libc.umount2(b".", MNT_DETACH), "umount old root")
+    os.chdir("/")
+    _mount(None, "/", None, MS_BIND | MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV)
+
+
+def _write(path: str, data: str) -> None:
+    with open(path, "w") as f:
+        f.write(data)
+
+
+def _enter_namespaces(root: str, workdir: str) -> bool:
+    """Unshare, map ids and switch to the sandbox root. Returns True if the worker was real root."""
+    libc = _load_libc()
+    host_root = os.geteuid() == 0
+    uid, gid = os.getuid(), os.getgid()
+    flags = CLONE_NEWNS | CLONE_NEWNET | CLONE_NEWIPC | CLONE_NEWUTS | CLONE_NEWPID
+    if not host_root:
+        flags |= CLONE_NEWUSER
+    _check(libc.unshare(flags), "unshare")
+    if host_root:
+        os.chown(workdir, SANDBOX_UID, SANDBOX_GID)
+    else:
+        # The only ids an unprivileged process may map are its own.
+        _write("/proc/self/setgroups", "deny")
+        _write("/proc/self/uid_map", f"{SANDBOX_UID} {uid} 1")
+        _write("/proc/self/gid_map", f"{SANDBOX_GID} {gid} 1")
+    _mount(None, "/", None, MS_REC | MS_PRIVATE)
+    _build_root(root, workdir)
+    _pivot(root)
+    return host_root
+
+
+class _CapHeader(ctypes.Structure):
+    _fields_ = [("version", ctypes.c_uint32), ("pid", ctypes.c_int)]
+
+
+class _CapData(ctypes.Structure):
+    _fields_ = [("effective", ctypes.c_uint32), ("permitted", ctypes.c_uint32), ("inheritable", ctypes.c_uint32)]
+
+
+def _drop_privileges(host_root: bool) -> None:
+    libc = _load_libc()
+    if host_root:
+        os.setgroups([])
+        os.setresgid(SANDBOX_GID, SANDBOX_GID, SANDBOX_GID)
+        os.setresuid(SANDBOX_UID, SANDBOX_UID, SANDBOX_UID)
+    header = _CapHeader(_LINUX_CAPABILITY_VERSION_3, 0)
+    data = (_CapData * 2)()
+    _check(libc.capset(ctypes.byref(header), ctypes.byref(data)), "capset")
+    _check(libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "no_new_privs")
+    _check(libc.prctl(PR_SET_DUMPABLE, 0, 0, 0, 0), "dumpable")
+    if os.getuid() != SANDBOX_UID or os.geteuid() == 0:
+        raise OSError("still privileged after dropping to the sandbox uid")
+
+
+def _apply_limits(cpu_seconds: int, memory_mb: int, baseline_bytes: int) -> None:
+    import resource
+
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (MAX_FILE_BYTES, MAX_FILE_BYTES))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    # RLIMIT_AS counts the interpreter that is already mapped, so the budget is on top of it.
+    limit = baseline_bytes + memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _mapped_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+def _write_result(wfd: int, result: Dict[str, Any]) -> None:
+    view = memoryview(json.dumps(result).encode())
+    while view:
+        n = os.write(wfd, view)
+        view = view[n:]
+
+
+def _run_submission(task: Dict[str, Any], host_root: bool, baseline: int, wfd: int) -> None:
+    """PID 1 of the sandbox's PID namespace: drop privileges, run the code and tests, report."""
+    result: Dict[str, Any] = {"passed": False, "error": None}
+    out, err = io.StringIO(), io.StringIO()
+    try:
+        _load_libc().prctl(PR_SET_PDEATHSIG, signal.SIGKILL, 0, 0, 0)
+        os.chdir("/work")
+        _drop_privileges(host_root)
+        _apply_limits(task["cpu_seconds"], task["memory_mb"], baseline)
+    except BaseException as e:  # noqa: B902
+        _write_result(wfd, {**result, "error": f"{ISOLATION_ERROR}: {e}", "stdout": "", "stderr": ""})
+        os._exit(1)
+
+    scope: Dict[str, Any] = {"__name__": "__main__", "__builtins__": __builtins__}
+    with redirect_stdout(out), redirect_stderr(err):
+        try:
+            exec(compile(task["code"], "<submission>", "exec"), scope)
+            if task.get("tests"):
+                exec(compile(task["tests"], "<tests>", "exec"), scope)
+            result["passed"] = True
+        except BaseException as e:  # noqa: B902 - report everything, including SystemExit
+            traceback.print_exc()
+            result["error"] = f"{e.__class__.__name__}: {e}"
+    result["stdout"] = out.getvalue()[-MAX_OUTPUT_CHARS:]
+    result["stderr"] = err.getvalue()[-MAX_OUTPUT_CHARS:]
+    _write_result(wfd, result)
+    os._exit(0)
+
+
+def _child(task: Dict[str, Any], root: str, workdir: str, wfd: int) -> None:
+    # Nothing the submission does may reach the worker's protocol pipes or the server's log.
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    for fd in _PROTOCOL_FDS:
+        os.close(fd)
+    try:
+        baseline = _mapped_bytes()
+        host_root = _enter_namespaces(root, workdir)
+    except BaseException as e:  # noqa: B902
+        _write_result(wfd, {"passed": False, "error": f"{ISOLATION_ERROR}: {e}", "stdout": "", "stderr": ""})
+        os._exit(1)
+
+    # A new PID namespace applies to children only, so the submission runs in a grandchild.
+    pid = os.fork()
+    if pid == 0:
+        try:
+            _run_submission(task, host_root, baseline, wfd)
+        finally:
+            os._exit(1)
+    os.close(wfd)
+    _, status = os.waitpid(pid, 0)
+    os._exit(128 + os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status))
+
+
+# -----------------------------
+# Worker side (runs in `python -I sandbox.py --worker`)
+# -----------------------------
+_PROTOCOL_FDS: Tuple[int, ...] = ()
+
+
+def _execute(task: Dict[str, Any]) -> Dict[str, Any]:
+    workdir = os.path.realpath(tempfile.mkdtemp(prefix="sandbox-"))
+    root = os.path.realpath(tempfile.mkdtemp(prefix="sandbox-root-"))
+    try:
+        return _execute_in(task, root, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _execute_in(task: Dict[str, Any], root: str, workdir: str) -> Dict[str, Any]:
+    rfd, wfd = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(rfd)
+        try:
+            _child(task, root, workdir, wfd)
+        finally:
+            os._exit(1)
+    os.close(wfd)
+
+    deadline = start + task["wall_seconds"]
+    chunks: List[bytes] = []
+    timed_out = False
+    try:
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                timed_out = True
+                break
+            ready, _, _ = select.select([rfd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(rfd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(rfd)
+        if timed_out:
+            # The submission dies with its parent (PDEATHSIG).
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        _, wait_status = os.waitpid(pid, 0)
+    runtime_ms = (time.perf_counter() - start) * 1000
+
+    if timed_out:
+        return {"passed": False, "timed_out": True, "runtime_ms": runtime_ms, "stdout": "", "stderr": "",
+                "error": f"wall-clock limit of {task['wall_seconds']}s exceeded"}
+    try:
+        result = json.loads(b"".join(chunks).decode())
+    except ValueError:
+        code = os.WEXITSTATUS(wait_status) if os.WIFEXITED(wait_status) else None
+        sig = code - 128 if code is not None and code > 128 else None
+        reason = {signal.SIGXCPU: "CPU time limit exceeded", signal.SIGKILL: "killed (memory or CPU limit)"}.get(
+            sig, f"exited abnormally ({sig or code})"
+        )
+        result = {"passed": False, "stdout": "", "stderr": "", "error": reason}
+    result["timed_out"] = False
+    result["runtime_ms"] = runtime_ms
+    return result
+
+
+def _worker_main() -> None:
+    global _PROTOCOL_FDS
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    tasks = os.fdopen(os.dup(0), "rb")
+    results = os.fdopen(os.dup(1), "wb")
+    _PROTOCOL_FDS = (tasks.fileno(), results.fileno())
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    _load_libc()
+    for line in tasks:
+        task = json.loads(line)
+        try:
+            result = _execute(task)
+        except Exception as e:
+            result = {"passed": False, "timed_out": False, "runtime_ms": 0.0, "stdout": "", "stderr": "",
+                      "error": f"sandbox error: {e}"}
+        results.write(json.dumps({"id": task["id"], "result": result}).encode() + b"\n")
+        results.flush()
+
+
+# -----------------------------
+# Server side
+# -----------------------------
+class SandboxPool:
+    def __init__(self, workers: int = SANDBOX_WORKERS, max_pending: int = SANDBOX_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._tasks: "queue_mod.Queue[Optional[Tuple[Dict[str, Any], Future]]]" = queue_mod.Queue()
+        self._procs: List[Optional[subprocess.Popen]] = []
+        self._threads: List[threading.Thread] = []
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._running = False
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._running
+
+    def start(self) -> None:
+        if self._running or self.workers <= 0 or not SUPPORTED:
+            return
+        self._procs = [None] * self.workers
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._serve, args=(slot,), name=f"sandbox-{slot}", daemon=True)
+            for slot in range(self.workers)
+        ]
+        for t in self._threads:
+            t.start()
+        # Refuse to run anything if this host can't isolate submissions.
+        probe = self.run("pass")
+        if (probe.get("error") or "").startswith(ISOLATION_ERROR):
+            print(f"Sandbox disabled: {probe['error']}")
+            self.stop()
+
+    def _spawn(self) -> subprocess.Popen:
+        # Empty environment: API keys and secrets never reach the worker.
+        return subprocess.Popen(
+            [sys.executable, "-I", os.path.abspath(__file__), "--worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env={},
+            cwd="/",
+            close_fds=True,
+            start_new_session=True,
+        )
+
+    def _serve(self, slot: int) -> None:
+        while True:
+            item = self._tasks.get()
+            if item is None:
+                break
+            task, fut = item
+            if not fut.set_running_or_notify_cancel():
+                # Cancelled while queued: the caller stopped waiting for it.
+                with self._lock:
+                    self._pending -= 1
+                continue
+            proc = self._procs[slot]
+            try:
+                if proc is None or proc.poll() is not None:
+                    proc = self._procs[slot] = self._spawn()
+                proc.stdin.write(json.dumps(task).encode() + b"\n")
+                proc.stdin.flush()
+                ready, _, _ = select.select([proc.stdout], [], [], task["wall_seconds"] * 2 + 5)
+                line = proc.stdout.readline() if ready else b""
+                if not line:
+                    raise RuntimeError("worker did not answer")
+                result = json.loads(line)["result"]
+            except Exception as e:
+                # Replace a dead or stuck worker so capacity recovers.
+                if proc is not None:
+                    proc.kill()
+                    proc.wait()
+                self._procs[slot] = None
+                result = {"passed": False, "timed_out": False, "runtime_ms": 0.0, "stdout": "", "stderr": "",
+                          "error": f"sandbox error: {e}"}
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+                if not result.get("passed"):
+                    self.failed += 1
+            if not fut.done():
+                fut.set_result(result)
+        proc = self._procs[slot]
+        if proc is not None:
+            proc.kill()
+            proc.wait()
+            self._procs[slot] = None
+
+    def stop(self) -> None:
+        if not self._running:
+            return
+        self._running = False
+        while True:
+            try:
+                item = self._tasks.get_nowait()
+            except queue_mod.Empty:
+                break
+            if item is not None and not item[1].cancelled():
+                item[1].set_exception(SandboxUnavailable("sandbox pool stopped"))
+        for _ in self._threads:
+            self._tasks.put(None)
+        for t in self._threads:
+            t.join(SANDBOX_WALL_SECONDS * 2 + 5)
+        self._threads = []
+        with self._lock:
+            self._pending = 0
+
+    def submit(
+        self,
+        code: str,
+        tests: Optional[str] = None,
+        cpu_seconds: int = SANDBOX_CPU_SECONDS,
+        wall_seconds: float = SANDBOX_WALL_SECONDS,
+        memory_mb: int = SANDBOX_MEMORY_MB,
+    ) -> Future:
+        if not self._running:
+            raise SandboxUnavailable("sandbox pool is not running")
+        fut: Future = Future()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise SandboxUnavailable("sandbox queue is full")
+            self._pending += 1
+            task_id = next(self._ids)
+        self._tasks.put(({
+            "id": task_id,
+            "code": code,
+            "tests": tests,
+            "cpu_seconds": cpu_seconds,
+            "wall_seconds": wall_seconds,
+            "memory_mb": memory_mb,
+        }, fut))
+        return fut
+
+    def run(self, code: str, tests: Optional[str] = None, **limits) -> Dict[str, Any]:
+        """Blocking helper: submit and wait (wall limit plus queueing slack)."""
+        fut = self.submit(code, tests, **limits)
+        wall = limits.get("wall_seconds", SANDBOX_WALL_SECONDS)
+        return fut.result(timeout=wall * 4 + 5)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = self._pending
+        return {
+            "enabled": self._running,
+            "workers": len(self._procs),
+            "alive": sum(1 for p in self._procs if p is not None and p.poll() is None),
+            "pending": pending,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+pool = SandboxPool()
+
+
+if __name__ == "__main__" and sys.argv[1:] == ["--worker"]:
+    _worker_main()
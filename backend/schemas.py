@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import Any, List, Optional
 from datetime import datetime
 
 # Shared Activity Properties
@@ -32,11 +32,10 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str
 
-# User returned to client
+# User returned to client (activities are paged separately via /api/users/me/activities)
 class User(UserBase):
     id: int
     created_at: datetime
-    activities: List[Activity] = []
 
     class Config:
         from_attributes = True
@@ -52,3 +51,13 @@ class TokenData(BaseModel):
 # Custom Plan Response
 class PlanResponse(BaseModel):
     plan_markdown: str
+
+# Background job status (see jobs.py)
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    status: str
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
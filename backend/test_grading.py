@@ -0,0 +1,195 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+
+import database
+import grading
+import main
+import models
+import schemas
+
+SHORT = {
+    "type": "Short Answer",
+    "scenario": "(Bachelor Level | Topic: Rate Limiting) How would you protect a public API from bursts?",
+    "keywords": ["rate limit", "rate limiting", "token bucket", "429"],
+}
+BLANK = {
+    "type": "Fill in the Blanks",
+    "scenario": "(Topic: Kubernetes) The smallest deployable unit is a ____.",
+    "answer": "pod | pods",
+}
+LONG_BLANK = {"type": "Fill in the Blanks", "scenario": "(Topic: Kubernetes) ____", "answer": "deployment"}
+CODING = {
+    "type": "Coding",
+    "scenario": "(Topic: APIs) Write fetch_user(user_id) returning the user's JSON.",
+    "language": "python",
+    "requiredTokens": ["def", "fetch_user", "user_id", "return", "json"],
+}
+MCQ = {
+    "type": "MCQ",
+    "scenario": "(Topic: Docker) Which instruction sets the base image?",
+    "options": ["FROM", "RUN", "CMD", "COPY"],
+    "correctIndex": 0,
+}
+
+
+def _compile(q):
+    return grading.CompiledQuestion(main.Question(**q).dict())
+
+
+# -- grading rules -------------------------------------------------------------
+
+def test_short_answer_keyword_coverage():
+    cq = _compile(SHORT)
+    score, passed, matched, missing = cq.grade("Put a token bucket in front and return 429.", None)
+    assert (score, passed) == (0.5, False)
+    assert matched == ["token bucket", "429"]
+    assert missing == ["rate limit", "rate limiting"]
+
+    score, passed, _, _ = cq.grade("Rate limiting with a token bucket, answering 429.", None)
+    assert passed and score == 1.0
+
+
+def test_short_answer_prefix_keyword():
+    # "rate limit" starts where the longer "rate limiting" does, which the single scan can't report.
+    cq = _compile(SHORT)
+    assert cq.prefix_keywords == ("rate limit",)
+    _, _, matched, missing = cq.grade("rate limiting", None)
+    assert matched == ["rate limit", "rate limiting"]
+    assert missing == ["token bucket", "429"]
+
+
+def test_short_answer_only_reads_first_lines():
+    cq = _compile(SHORT)
+    answer = "\n".join(["intro"] * grading.SHORT_ANSWER_MAX_LINES + ["rate limiting, token bucket, 429"])
+    assert cq.grade(answer, None)[:2] == (0.0, False)
+
+
+def test_fill_in_the_blanks_tolerance():
+    cq = _compile(BLANK)
+    assert cq.grade("Pods.", None)[1]
+    # Up to three characters must be exact.
+    assert not cq.grade("pid", None)[1]
+    cq = _compile(LONG_BLANK)
+    assert cq.grade("deploymnet", None)[1]  # two edits allowed above seven characters
+    assert not cq.grade("depolymnet", None)[1]
+    assert cq.grade("", None) == (0.0, False, [], ["deployment"])
+
+
+def test_coding_required_tokens():
+    cq = _compile(CODING)
+    full = "def fetch_user(user_id):\n    return requests.get(url).JSON()"
+    assert cq.grade(full, None)[:2] == (1.0, True)
+    score, passed, _, missing = cq.grade("def fetch_user(user_id):\n    return None", None)
+    assert (score, passed, missing) == (0.8, False, ["json"])
+
+
+def test_mcq():
+    cq = _compile(MCQ)
+    assert cq.grade(None, 0)[1] and not cq.grade(None, 1)[1] and not cq.grade(None, None)[1]
+
+
+def test_questions_without_a_key_never_pass():
+    # Nothing to grade against: the browser scores these 0, and they must not earn EXP.
+    assert _compile({**SHORT, "keywords": []}).grade("anything at all", None) == (0.0, False, [], [])
+    assert _compile({**CODING, "requiredTokens": None}).grade("def f(): pass", None) == (0.0, False, [], [])
+    assert _compile({**BLANK, "answer": ""}).grade("pod", None)[:2] == (0.0, False)
+    assert not _compile({**MCQ, "correctIndex": None}).grade(None, 0)[1]
+
+
+# -- /api/grade ------------------------------------------------------------------
+
+@pytest.fixture()
+def db():
+    models.Base.metadata.create_all(bind=database.engine)
+    session = database.SessionLocal()
+    user = models.User(email=f"grader-{os.urandom(4).hex()}@example.com", full_name="Grader", hashed_password="x", exp=0)
+    session.add(user)
+    session.commit()
+    yield session
+    session.close()
+
+
+def _user(db):
+    return db.query(models.User).order_by(models.User.id.desc()).first()
+
+
+def _request(questions, answers, difficulty="Bachelor", tamper=False, record=True):
+    payload = [main.Question(**q).dict() for q in questions]
+    token = grading.sign_question_set(payload, difficulty)
+    if tamper:
+        token = token[:-1] + ("0" if token[-1] != "0" else "1")
+    return main.GradeRequest(questions=questions, answers=answers, set_token=token, difficulty=difficulty, record=record)
+
+
+def test_signed_set_is_verified(db):
+    result = main._grade_answers(_request([MCQ], [{"question": 0, "selectedIndex": 0}], record=False), db, None)
+    assert result["verified"] and result["passed"] == 1
+
+
+def test_tampered_set_token_is_rejected(db):
+    user = _user(db)
+    req = _request([MCQ], [{"question": 0, "selectedIndex": 0}], tamper=True)
+    with pytest.raises(HTTPException) as e:
+        main._grade_answers(req, db, user)
+    assert e.value.status_code == 403
+    assert db.query(models.UserActivity).filter(models.UserActivity.user_id == user.id).count() == 0
+
+    # A set edited after signing (here: the correct answer moved) fails verification too.
+    req = _request([MCQ], [{"question": 0, "selectedIndex": 1}], record=False)
+    req.questions[0].correctIndex = 1
+    assert main._grade_answers(req, db, None)["verified"] is False
+
+
+def test_exp_granted_once_per_question(db):
+    user = _user(db)
+    per_pass = main.EXP_BY_DIFFICULTY["Master"]
+    answers = [{"question": 0, "selectedIndex": 0}]
+
+    main._grade_answers(_request([MCQ], answers, "Master"), db, user)
+    db.refresh(user)
+    assert user.exp == per_pass
+
+    # Passing the same question again, or twice in one request, pays nothing more.
+    main._grade_answers(_request([MCQ], answers * 2, "Master"), db, user)
+    db.refresh(user)
+    assert user.exp == per_pass
+    assert db.query(models.UserActivity).filter(models.UserActivity.user_id == user.id).count() == 3
+
+
+def test_exp_not_granted_for_archived_pass(db):
+    user = _user(db)
+    cq = _compile(MCQ)
+    # A pass compacted into the archive by retention.py still counts.
+    db.add(models.UserActivityArchive(
+        id=10_000_000 + user.id, user_id=user.id, topic=cq.topic, title=cq.title, status="Success",
+        timestamp=datetime.utcnow() - timedelta(days=400),
+    ))
+    db.commit()
+
+    main._grade_answers(_request([MCQ], [{"question": 0, "selectedIndex": 0}]), db, user)
+    db.refresh(user)
+    assert user.exp == 0
+    assert db.query(models.UserActivity).filter(models.UserActivity.user_id == user.id).count() == 1
+
+
+def test_failed_answer_earns_no_exp(db):
+    user = _user(db)
+    main._grade_answers(_request([MCQ], [{"question": 0, "selectedIndex": 2}]), db, user)
+    db.refresh(user)
+    assert user.exp == 0
+    activity = db.query(models.UserActivity).filter(models.UserActivity.user_id == user.id).one()
+    assert activity.status == "Failed"
+
+
+def test_client_reported_success_earns_no_exp_by_default(db):
+    user = _user(db)
+    main._create_user_activity(schemas.ActivityCreate(topic="Docker", title="t", status="Success"), db, user)
+    db.refresh(user)
+    assert main.ALLOW_UNGRADED_EXP is False
+    assert user.exp == 0
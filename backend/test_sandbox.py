@@ -0,0 +1,151 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
+
+import grading
+import main
+import sandbox
+
+# Submissions that escaped the old in-process guard; each must now fail or see nothing.
+SECRET = "sandbox-test-secret-value"
+
+
+@pytest.fixture(scope="module")
+def pool():
+    if not sandbox.SUPPORTED:
+        pytest.skip("sandbox needs Linux")
+    os.environ["SANDBOX_TEST_SECRET"] = SECRET
+    p = sandbox.SandboxPool(workers=1)
+    p.start()
+    if not p.enabled:
+        pytest.skip("namespace isolation is unavailable on this host")
+    yield p
+    p.stop()
+    os.environ.pop("SANDBOX_TEST_SECRET", None)
+
+
+def test_runs_code_and_tests(pool):
+    assert pool.run("def add(a, b):\n    return a + b", "assert add(2, 3) == 5")["passed"]
+    result = pool.run("def add(a, b):\n    return a - b", "assert add(2, 3) == 5")
+    assert not result["passed"]
+    assert result["error"].startswith("AssertionError")
+
+
+def test_environment_is_empty(pool):
+    result = pool.run("import os\nprint(dict(os.environ))")
+    assert result["passed"]
+    assert SECRET not in result["stdout"]
+    assert "GROQ_API_KEY" not in result["stdout"] and "SECRET_KEY" not in result["stdout"]
+
+
+def test_runs_unprivileged(pool):
+    result = pool.run("import os\nprint(os.getuid(), os.geteuid(), os.getgid())")
+    assert result["passed"]
+    assert result["stdout"].split() == [str(sandbox.SANDBOX_UID)] * 2 + [str(sandbox.SANDBOX_GID)]
+
+
+def test_cannot_spawn_processes(pool, tmp_path):
+    marker = tmp_path / "escaped"
+    for code in (
+        f"import subprocess\nsubprocess.run(['/bin/sh', '-c', 'touch {marker}'])",
+        f"import os\nassert os.system('touch {marker}') == 0",
+        "import os\nos.fork()",
+        "import threading\nthreading.Thread(target=print).start()",
+    ):
+        assert not pool.run(code)["passed"], code
+    assert not marker.exists()
+
+
+def test_no_network(pool):
+    result = pool.run("import socket\ns = socket.socket()\ns.settimeout(2)\ns.connect(('1.1.1.1', 80))")
+    assert not result["passed"]
+    assert "OSError" in result["error"]
+
+
+def test_host_filesystem_is_hidden_and_read_only(pool, tmp_path):
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = pool.run(f"import os\nprint(os.path.exists({here!r}), os.path.exists('/proc/1/environ'))")
+    assert result["stdout"].split() == ["False", "False"]
+    assert not pool.run("open('/usr/escaped', 'w')")["passed"]
+
+    os.chmod(tmp_path, 0o777)
+    assert not pool.run(f"open({str(tmp_path / 'written')!r}, 'w').write('x')")["passed"]
+    assert not (tmp_path / "written").exists()
+    # /tmp inside is a private tmpfs.
+    name = f"sandbox-{os.getpid()}"
+    assert pool.run(f"open('/tmp/{name}', 'w').write('x')")["passed"]
+    assert not os.path.exists(f"/tmp/{name}")
+
+
+def test_limits(pool):
+    assert pool.run("while True:\n    pass", wall_seconds=1)["passed"] is False
+    assert pool.run("x = bytearray(2 * 1024 ** 3)")["passed"] is False
+
+
+CODING = {
+    "type": "Coding",
+    "language": "python",
+    "scenario": "Write add(a, b).",
+    "answer": "def add(a, b):\n    return a + b",
+    "requiredTokens": ["def", "return"],
+    "tests": "assert add(2, 3) == 5",
+}
+
+
+class _Recorder:
+    enabled = True
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, code, tests=None, **limits):
+        self.calls.append((code, tests))
+        raise sandbox.SandboxUnavailable("recorded")
+
+
+class _Session:
+    def rollback(self):
+        pass
+
+
+def _grade(set_token, user):
+    req = main.GradeRequest(
+        questions=[CODING],
+        answers=[{"question": 0, "answer": "import os\nos.system('id')\ndef add(a, b): return a + b"}],
+        set_token=set_token,
+    )
+    return main._grade_answers(req, _Session(), user)
+
+
+def test_grade_executes_only_signed_sets_for_users(monkeypatch):
+    recorder = _Recorder()
+    monkeypatch.setattr(sandbox, "pool", recorder)
+    questions = [main.Question(**CODING).dict()]
+    token = grading.sign_question_set(questions, "Bachelor")
+    user = object()
+
+    _grade(None, None)
+    _grade(token, None)
+    _grade("0" * 64, user)
+    assert recorder.calls == []
+
+    _grade(token, user)
+    assert recorder.calls == [(recorder.calls[0][0], CODING["tests"])]
+
+
+def test_generated_tests_checked_concurrently_with_deadline(pool, monkeypatch):
+    monkeypatch.setattr(sandbox, "pool", pool)
+    monkeypatch.setattr(main, "QUESTION_CHECK_SECONDS", 3)
+    good = main.Question(**CODING)
+    wrong = main.Question(**{**CODING, "answer": "def add(a, b):\n    return a - b"})
+    slow = main.Question(**{**CODING, "answer": "while True:\n    pass"})
+
+    asyncio.run(main._drop_failing_tests([good, wrong, slow]))
+    assert good.tests == CODING["tests"]
+    assert wrong.tests is None
+    # Still running at the deadline: kept, not dropped.
+    assert slow.tests == CODING["tests"]